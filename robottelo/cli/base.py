@@ -1,11 +1,37 @@
 # -*- encoding: utf-8 -*-
 """Generic base class for cli hammer commands."""
+import copy
+import functools
 import logging
+import six
+import threading
+import time
 
+from cachetools import TTLCache
+from multiprocessing.pool import ThreadPool
 from robottelo import ssh
-from robottelo.cli import hammer
+from robottelo.cli import hammer, hammer_shell, instrumentation
 from robottelo.config import settings
 
+#: Subcommands which don't change anything on the server, running them does
+#: not invalidate the cached responses.
+READ_ONLY_SUBCOMMANDS = frozenset((
+    'dump',
+    'info',
+    'list',
+    'paths',
+    'product-content',
+    'progress',
+    'puppet-classes',
+    'sc-params',
+    'status',
+    'tasks',
+))
+
+# (command_base, command_sub) pairs whose JSON output could not be parsed,
+# they are run with text output from then on.
+_json_unsupported = set()
+
 
 class CLIError(Exception):
     """Indicates that a CLI command could not be run."""
@@ -32,6 +58,122 @@ class CLIReturnCodeError(Exception):
         return self.message
 
 
+class ResponseCache(object):
+    """Cache the responses of the read only hammer commands.
+
+    Entries expire after ``ttl`` seconds and the least recently used entries
+    are evicted when more than ``maxsize`` entries are cached. Copies of the
+    cached responses are returned so callers can change them freely.
+
+    :param int ttl: Number of seconds a response is kept.
+    :param int maxsize: Maximum number of responses kept.
+
+    """
+
+    _missing = object()
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self._cache = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    def lookup(self, key):
+        """Look for a cached response.
+
+        :return: A ``(found, response)`` tuple.
+
+        """
+        with self._lock:
+            response = self._cache.get(key, self._missing)
+            if response is self._missing:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, copy.deepcopy(response)
+
+    def store(self, key, response):
+        """Cache a response."""
+        response = copy.deepcopy(response)
+        with self._lock:
+            self._cache[key] = response
+
+    def invalidate(self, command_base):
+        """Drop the cached responses of the ``command_base`` commands."""
+        with self._lock:
+            for key in list(self._cache.keys()):
+                if key[0] == command_base:
+                    del self._cache[key]
+
+    def clear(self):
+        """Drop all the cached responses."""
+        with self._lock:
+            self._cache.clear()
+
+
+def _cached_response(method):
+    """Decorate a read only :class:`Base` method to serve its responses from
+    ``Base.response_cache``, when enabled.
+
+    The responses are keyed by the command base, the method name, the options
+    and the user running the command.
+
+    """
+    @functools.wraps(method)
+    def wrapper(cls, options=None, *args, **kwargs):
+        cache = cls.get_response_cache()
+        if cache is None:
+            return method(cls, options, *args, **kwargs)
+        key = (
+            cls.command_base,
+            method.__name__,
+            tuple(sorted(
+                (name, six.text_type(value))
+                for name, value in (options or {}).items()
+            )),
+            args,
+            tuple(sorted(kwargs.items())),
+            cls._get_username_password()[0],
+        )
+        found, response = cache.lookup(key)
+        if found:
+            return response
+        response = method(cls, options, *args, **kwargs)
+        cache.store(key, response)
+        return response
+    return wrapper
+
+
+class CLIBulkError(CLIError):
+    """Indicates that some of the commands run by
+    :meth:`Base.execute_many` failed.
+
+    :param results: The results of the commands, ``None`` for the failed
+        ones.
+    :param errors: A list of ``(index, task, exception)`` tuples for each
+        failed command.
+
+    """
+
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        super(CLIBulkError, self).__init__(
+            u'{0} of {1} commands failed:\n{2}'.format(
+                len(errors),
+                len(results),
+                u'\n'.join(
+                    u'{0}: {1}'.format(index, error)
+                    for index, _, error in errors
+                ),
+            )
+        )
+
+
 class Base(object):
     """
     @param command_base: base command of hammer.
@@ -100,6 +242,116 @@ class Base(object):
 
     logger = logging.getLogger('robottelo')
 
+    #: The cache of the ``info`` and ``list`` responses, see
+    #: :meth:`get_response_cache`.
+    response_cache = None
+    #: Whether ``create``, ``info`` and ``list`` request JSON output instead
+    #: of text output. ``None`` follows the ``cli_json_output`` setting, set
+    #: it to ``False`` on the classes whose commands don't support JSON.
+    json_output = None
+    #: The instrumentation recording the latency of the commands, see
+    #: :meth:`get_instrumentation`.
+    instrumentation = None
+    #: Fields ``create`` needs on the created object. When the output of the
+    #: create command has all of them, the object is not fetched again with
+    #: ``info``. ``None`` always fetches it.
+    create_info_fields = None
+
+    @staticmethod
+    def get_response_cache():
+        """Return the cache of the ``info`` and ``list`` responses, or ``None``
+        if it is disabled.
+
+        The cache is disabled by default, it is enabled by setting
+        ``cli_response_cache`` on the ``[robottelo]`` configuration section or
+        by setting ``Base.response_cache`` to a :class:`ResponseCache`.
+
+        Running any subcommand not in ``READ_ONLY_SUBCOMMANDS`` drops the
+        cached responses of the same command base. Changes made by a command
+        on other entities, for example ``organization add-user`` changing the
+        users organizations, do not invalidate their cached responses.
+
+        """
+        if Base.response_cache is None and settings.cli_response_cache is True:
+            Base.response_cache = ResponseCache(
+                ttl=settings.cli_response_cache_ttl,
+                maxsize=settings.cli_response_cache_size,
+            )
+        return Base.response_cache
+
+    @staticmethod
+    def get_instrumentation():
+        """Return the instrumentation recording the latency of the commands,
+        or ``None`` if it is disabled.
+
+        The instrumentation is disabled by default, it is enabled by setting
+        ``cli_instrumentation`` on the ``[robottelo]`` configuration section
+        or by setting ``Base.instrumentation`` to a
+        :class:`robottelo.cli.instrumentation.Instrumentation`. The
+        configured instrumentation keeps a
+        :class:`robottelo.cli.instrumentation.HistogramSink`, plus CSV and
+        JSON lines sinks when ``cli_instrumentation_csv`` and
+        ``cli_instrumentation_jsonl`` are set.
+
+        """
+        if (Base.instrumentation is None and
+                settings.cli_instrumentation is True):
+            sinks = [instrumentation.HistogramSink()]
+            if settings.cli_instrumentation_csv:
+                sinks.append(instrumentation.CSVSink(
+                    settings.cli_instrumentation_csv))
+            if settings.cli_instrumentation_jsonl:
+                sinks.append(instrumentation.JSONLinesSink(
+                    settings.cli_instrumentation_jsonl))
+            Base.instrumentation = instrumentation.Instrumentation(sinks)
+        return Base.instrumentation
+
+    @classmethod
+    def _record_command(cls, started, response):
+        """Send the timings of the command started at ``started`` to the
+        instrumentation sinks.
+
+        :param float started: When the command started, as ``time.time()``.
+        :param response: The ``SSHCommandResult`` of the command, ``None`` if
+            it could not be run.
+
+        """
+        cls.get_instrumentation().record(instrumentation.CommandRecord(
+            timestamp=started,
+            command_base=cls.command_base,
+            command_sub=cls.command_sub,
+            return_code=getattr(response, 'return_code', None),
+            total_time=time.time() - started,
+            connect_time=getattr(response, 'connect_time', None),
+            execute_time=getattr(response, 'execute_time', None),
+            parse_time=getattr(response, 'parse_time', None),
+            bytes_received=getattr(response, 'bytes_received', None),
+        ))
+
+    @classmethod
+    def _use_json_output(cls):
+        """Whether the running subcommand should request JSON output.
+
+        The output is converted by ``hammer.to_text_output`` so callers get
+        the same shape as the text output.
+
+        """
+        json_output = cls.json_output
+        if json_output is None:
+            json_output = settings.cli_json_output is True
+        return json_output and (
+            cls.command_base, cls.command_sub) not in _json_unsupported
+
+    @classmethod
+    def _disable_json_output(cls):
+        """Stop requesting JSON output for the running subcommand."""
+        cls.logger.warning(
+            u'Could not parse the JSON output of "%s %s", using text output',
+            cls.command_base,
+            cls.command_sub,
+        )
+        _json_unsupported.add((cls.command_base, cls.command_sub))
+
     @classmethod
     def _handle_response(cls, response, ignore_stderr=None):
         """Verify ``return_code`` of the CLI command.
@@ -157,8 +409,26 @@ class Base(object):
         if options is None:
             options = {}
 
-        result = cls.execute(
-            cls._construct_command(options), output_format='csv')
+        command = cls._construct_command(options)
+        if cls._use_json_output():
+            try:
+                result = cls.execute(command, output_format='json')
+            except ValueError:
+                # The entity may have been created, the command can't be run
+                # again with text output.
+                cls._disable_json_output()
+                raise CLIError(
+                    'Could not parse the JSON output of {0}.create'.format(
+                        cls.__name__))
+            result = hammer.to_text_output(result or [])
+            if isinstance(result, dict):
+                result = [result]
+        else:
+            result = cls.execute(command, output_format='csv')
+
+        if (len(result) > 0 and cls.create_info_fields is not None and
+                set(cls.create_info_fields).issubset(result[0])):
+            return result[0]
 
         # Extract new object ID if it was successfully created
         if len(result) > 0 and 'id' in result[0]:
@@ -242,26 +512,57 @@ class Base(object):
     @classmethod
     def execute(cls, command, user=None, password=None, output_format=None,
                 timeout=None, ignore_stderr=None, return_raw_response=None):
-        """Executes the cli ``command`` on the server via ssh"""
+        """Executes the cli ``command`` on the server via ssh
+
+        If ``hammer_backend`` is ``shell`` on the configuration, the command
+        is sent to a ``hammer shell`` process, see
+        :mod:`robottelo.cli.hammer_shell`. Commands spanning several lines or
+        timed for performance measurements always start a new hammer process.
+
+        The timings of the command are recorded when the instrumentation is
+        enabled, see :meth:`get_instrumentation`.
+
+        """
         user, password = cls._get_username_password(user, password)
         time_hammer = False
         if settings.performance:
             time_hammer = settings.performance.time_hammer
 
-        # add time to measure hammer performance
-        cmd = u'LANG={0} {1} hammer -v -u {2} -p {3} {4} {5}'.format(
-            settings.locale,
-            u'time -p' if time_hammer else '',
-            user,
-            password,
-            u'--output={0}'.format(output_format) if output_format else u'',
-            command,
-        )
-        response = ssh.command(
-            cmd.encode('utf-8'),
-            output_format=output_format,
-            timeout=timeout,
-        )
+        started = time.time()
+        response = None
+        try:
+            if (settings.hammer_backend == 'shell' and not time_hammer and
+                    u'\n' not in command):
+                response = hammer_shell.execute(
+                    command,
+                    user,
+                    password,
+                    output_format=output_format,
+                    timeout=timeout,
+                )
+            else:
+                # add time to measure hammer performance
+                cmd = u'LANG={0} {1} hammer -v -u {2} -p {3} {4} {5}'.format(
+                    settings.locale,
+                    u'time -p' if time_hammer else '',
+                    user,
+                    password,
+                    u'--output={0}'.format(output_format)
+                    if output_format else u'',
+                    command,
+                )
+                response = ssh.command(
+                    cmd.encode('utf-8'),
+                    output_format=output_format,
+                    timeout=timeout,
+                )
+        finally:
+            if cls.get_instrumentation() is not None:
+                cls._record_command(started, response)
+            cache = cls.get_response_cache()
+            if (cache is not None and
+                    cls.command_sub not in READ_ONLY_SUBCOMMANDS):
+                cache.invalidate(cls.command_base)
         if return_raw_response:
             return response
         else:
@@ -270,6 +571,86 @@ class Base(object):
                 ignore_stderr=ignore_stderr,
             )
 
+    @classmethod
+    def execute_many(cls, tasks, max_workers=None):
+        """Run several commands concurrently.
+
+        Each task is a ``(command class, method name, options)`` tuple, for
+        example ``(Product, 'create', {u'organization-id': 1})``. Dashes on
+        the method name are replaced by underscores, so subcommand names like
+        ``add-operatingsystem`` can be used.
+
+        The tasks are run on a pool of at most ``max_workers`` threads,
+        sharing the pooled ssh connection to the server. As the command
+        classes keep the subcommand being run on the class, each task runs on
+        its own subclass of the command class so concurrent tasks don't
+        overwrite each other's subcommand. With the ``shell`` hammer backend
+        the commands of each user run on at most
+        ``robottelo.cli.hammer_shell.MAX_SHELLS`` shells at the same time, see
+        :class:`robottelo.cli.hammer_shell.HammerShellPool`.
+
+        :param tasks: A list of ``(command class, method name, options)``
+            tuples.
+        :param int max_workers: Maximum number of commands running at the same
+            time. Defaults to ``robottelo.ssh.MAX_SESSIONS``.
+        :return: A list with the result of each task, in the same order as
+            ``tasks``.
+        :raises robottelo.cli.base.CLIBulkError: If any task failed, once all
+            tasks are finished.
+
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        if max_workers is None:
+            max_workers = ssh.MAX_SESSIONS
+
+        def run(task):
+            task_cls, method_name, options = task
+            isolated_cls = type(task_cls.__name__, (task_cls,), {})
+            method = getattr(isolated_cls, method_name.replace('-', '_'))
+            try:
+                return True, method(options)
+            except Exception as err:  # pylint:disable=broad-except
+                return False, err
+
+        pool = ThreadPool(min(max_workers, len(tasks)))
+        try:
+            outcomes = pool.map(run, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        results = []
+        errors = []
+        for index, (success, outcome) in enumerate(outcomes):
+            if success:
+                results.append(outcome)
+            else:
+                results.append(None)
+                errors.append((index, tasks[index], outcome))
+        if errors:
+            raise CLIBulkError(results, errors)
+        return results
+
+    @classmethod
+    def map(cls, method_name, options_list, max_workers=None):
+        """Run the ``method_name`` command of this class once for each options
+        of ``options_list`` concurrently::
+
+            products = Product.map('create', [
+                {u'name': name, u'organization-id': org['id']}
+                for name in names
+            ])
+
+        See :meth:`execute_many`.
+
+        """
+        return cls.execute_many(
+            [(cls, method_name, options) for options in options_list],
+            max_workers=max_workers,
+        )
+
     @classmethod
     def exists(cls, options=None, search=None):
         """Search for an entity using the query ``search[0]="search[1]"``
@@ -297,6 +678,7 @@ class Base(object):
         return result
 
     @classmethod
+    @_cached_response
     def info(cls, options=None, output_format=None):
         """Reads the entity information."""
         cls.command_sub = 'info'
@@ -311,8 +693,16 @@ class Base(object):
                 )
             )
 
+        command = cls._construct_command(options)
+        if output_format is None and cls._use_json_output():
+            try:
+                return hammer.to_text_output(
+                    cls.execute(command, output_format='json') or {})
+            except ValueError:
+                cls._disable_json_output()
+
         result = cls.execute(
-            command=cls._construct_command(options),
+            command=command,
             output_format=output_format
         )
         if output_format != 'json':
@@ -320,6 +710,7 @@ class Base(object):
         return result
 
     @classmethod
+    @_cached_response
     def list(cls, options=None, per_page=True):
         """
         List information.
@@ -341,11 +732,79 @@ class Base(object):
                 )
             )
 
-        result = cls.execute(
-            cls._construct_command(options), output_format='csv')
+        command = cls._construct_command(options)
+        if cls._use_json_output():
+            try:
+                return hammer.to_text_output(
+                    cls.execute(command, output_format='json') or [])
+            except ValueError:
+                cls._disable_json_output()
+
+        result = cls.execute(command, output_format='csv')
 
         return result
 
+    @classmethod
+    def iter_list(cls, options=None, per_page=1000, prefetch=True):
+        """Iterate over the listed entities, fetching them one page at a time.
+
+        Unlike :meth:`list`, which fetches every entity with a single
+        command, the entities are fetched ``per_page`` at a time with the
+        ``--page`` option and yielded as each page is read::
+
+            for host in ContentHost.iter_list({u'organization-id': org_id}):
+                if host['name'] == name:
+                    break
+
+        While the entities of a page are consumed the next page is fetched on
+        a background thread, unless ``prefetch`` is ``False``. No more pages
+        are fetched once the caller stops iterating.
+
+        Creating or deleting entities while iterating shifts the pages, so
+        entities can be skipped or yielded twice.
+
+        :param options: The ``list`` options, ``page`` and ``per-page`` are
+            overridden.
+        :param int per_page: The number of entities fetched by each command.
+        :param bool prefetch: Whether to fetch the next page while the current
+            page is consumed.
+        :return: A generator of the listed entities.
+
+        """
+        options = dict(options or {})
+        options[u'per-page'] = per_page
+        # Pages are fetched on their own subclass, so fetching a page in
+        # background doesn't change the subcommand of the commands run by the
+        # caller meanwhile.
+        isolated_cls = type(cls.__name__, (cls,), {})
+
+        def fetch(page):
+            page_options = dict(options)
+            page_options[u'page'] = page
+            return isolated_cls.list(page_options)
+
+        pool = ThreadPool(1) if prefetch else None
+        try:
+            page = 1
+            rows = fetch(page)
+            while True:
+                last_page = len(rows) < per_page
+                next_rows = None
+                if not last_page and pool is not None:
+                    next_rows = pool.apply_async(fetch, (page + 1,))
+                for row in rows:
+                    yield row
+                if last_page:
+                    return
+                page += 1
+                if next_rows is not None:
+                    rows = next_rows.get()
+                else:
+                    rows = fetch(page)
+        finally:
+            if pool is not None:
+                pool.close()
+
     @classmethod
     def puppetclasses(cls, options=None):
         """
@@ -8,6 +8,7 @@ import json
 import logging
 import os
 import random
+import threading
 
 from fauxfactory import (
     gen_alphanumeric,
@@ -17,11 +18,12 @@ from fauxfactory import (
     gen_netmask,
     gen_string,
 )
+from multiprocessing.pool import ThreadPool
 from os import chmod
-from robottelo import manifests, ssh
+from robottelo import fixture_cache, manifests, ssh
 from robottelo.cli.activationkey import ActivationKey
 from robottelo.cli.architecture import Architecture
-from robottelo.cli.base import CLIReturnCodeError
+from robottelo.cli.base import CLIError, CLIReturnCodeError
 from robottelo.cli.computeresource import ComputeResource
 from robottelo.cli.contenthost import ContentHost
 from robottelo.cli.contentview import ContentView
@@ -48,6 +50,7 @@ from robottelo.cli.role import Role
 from robottelo.cli.subnet import Subnet
 from robottelo.cli.subscription import Subscription
 from robottelo.cli.syncplan import SyncPlan
+from robottelo.cli.task import Task, get_task_ids
 from robottelo.cli.template import Template
 from robottelo.cli.user import User
 from robottelo.cli.usergroup import UserGroup, UserGroupExternal
@@ -64,6 +67,7 @@ from robottelo.decorators import bz_bug_is_open, cacheable
 from robottelo.helpers import (
     update_dictionary, default_url_on_new_port, get_available_capsule_port
 )
+from robottelo.pipeline import Pipeline
 from robottelo.ssh import upload_file
 from tempfile import mkstemp
 from time import sleep
@@ -75,10 +79,40 @@ CONTENT_VIEW_KEYS = ['content-view', 'content-view-id']
 LIFECYCLE_KEYS = ['lifecycle-environment', 'lifecycle-environment-id']
 
 
+# Attributes of the CLI classes creating the entities of the bulk creation
+# running on the current thread, see make_bulk
+_bulk_context = threading.local()
+
+
 class CLIFactoryError(Exception):
     """Indicates an error occurred while creating an entity using hammer"""
 
 
+class CLIFactoryBulkError(CLIFactoryError):
+    """Indicates that some of the entities created by :func:`make_bulk` could
+    not be created.
+
+    :param results: The created entities, ``None`` for the failed ones.
+    :param errors: A list of ``(index, exception)`` tuples for each entity
+        which could not be created.
+
+    """
+
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        super(CLIFactoryBulkError, self).__init__(
+            u'{0} of {1} entities could not be created:\n{2}'.format(
+                len(errors),
+                len(results),
+                u'\n'.join(
+                    u'{0}: {1}'.format(index, error)
+                    for index, error in errors
+                ),
+            )
+        )
+
+
 def create_object(cli_object, options, values):
     """
     Creates <object> with dictionary of arguments.
@@ -101,15 +135,20 @@ def create_object(cli_object, options, values):
                 "a typo or update default options".format(diff)
             )
     update_dictionary(options, values)
+    attributes = getattr(_bulk_context, 'cli_attributes', None)
+    if attributes is not None:
+        # Created by make_bulk, isolate the class from the other threads
+        cli_object = type(cli_object.__name__, (cli_object,), attributes)
     try:
         result = cli_object.create(options)
-    except CLIReturnCodeError as err:
+    except (CLIError, CLIReturnCodeError) as err:
         # If the object is not created, raise exception, stop the show.
+        # CLIError is raised when the JSON output of create can't be parsed.
         raise CLIFactoryError(
             u'Failed to create {0} with data:\n{1}\n{2}'.format(
                 cli_object.__name__,
                 json.dumps(options, indent=2, sort_keys=True),
-                err.msg,
+                getattr(err, 'msg', err),
             )
         )
 
@@ -121,6 +160,163 @@ def create_object(cli_object, options, values):
     return result
 
 
+def make_bulk(factory, count, options=None, max_workers=None,
+              fields=(u'id', u'name')):
+    """Create ``count`` entities with ``factory`` concurrently::
+
+        hosts = make_bulk(make_host, 1000, {
+            u'architecture-id': architecture['id'],
+            ...
+        })
+
+    Each entity is created by calling ``factory`` with its own copy of
+    ``options``, so the generated values like names differ. Each entity is
+    created by its own subclass of the CLI class, so concurrent creations
+    don't overwrite each other's subcommand, and is not fetched again with
+    ``info`` when the output of the create command already has all
+    ``fields``.
+
+    :param factory: A ``make_*`` function of this module.
+    :param int count: The number of entities to create.
+    :param options: The options given to ``factory`` for every entity, or a
+        list with the options of each entity.
+    :param int max_workers: Maximum number of entities created at the same
+        time. Defaults to ``robottelo.ssh.MAX_SESSIONS``.
+    :param fields: The fields needed on the created entities, ``None`` to
+        always fetch them with ``info``.
+    :return: A list with the created entities, in the same order as the
+        options.
+    :raises robottelo.cli.factory.CLIFactoryBulkError: If any entity could
+        not be created, once all the creations are finished.
+
+    """
+    if isinstance(options, (list, tuple)):
+        options_list = list(options)
+    else:
+        options_list = [options] * count
+    if not options_list:
+        return []
+    if max_workers is None:
+        max_workers = ssh.MAX_SESSIONS
+    cli_attributes = {
+        'create_info_fields': None if fields is None else frozenset(fields),
+    }
+
+    def create(entity_options):
+        _bulk_context.cli_attributes = cli_attributes
+        try:
+            return True, factory(
+                None if entity_options is None else dict(entity_options))
+        except Exception as err:  # pylint:disable=broad-except
+            return False, err
+        finally:
+            del _bulk_context.cli_attributes
+
+    pool = ThreadPool(min(max_workers, len(options_list)))
+    try:
+        outcomes = pool.map(create, options_list)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = []
+    errors = []
+    for index, (success, outcome) in enumerate(outcomes):
+        if success:
+            results.append(outcome)
+        else:
+            results.append(None)
+            errors.append((index, outcome))
+    if errors:
+        raise CLIFactoryBulkError(results, errors)
+    return results
+
+
+def make_host_bulk(count, options=None, **kwargs):
+    """Create ``count`` hosts concurrently, see :func:`make_bulk`."""
+    return make_bulk(make_host, count, options, **kwargs)
+
+
+def make_host_collection_bulk(count, options=None, **kwargs):
+    """Create ``count`` host collections concurrently, see
+    :func:`make_bulk`.
+
+    """
+    return make_bulk(make_host_collection, count, options, **kwargs)
+
+
+def make_subnet_bulk(count, options=None, **kwargs):
+    """Create ``count`` subnets concurrently, see :func:`make_bulk`."""
+    return make_bulk(make_subnet, count, options, **kwargs)
+
+
+def make_user_bulk(count, options=None, **kwargs):
+    """Create ``count`` users concurrently, see :func:`make_bulk`."""
+    return make_bulk(make_user, count, options, **kwargs)
+
+
+def _entity_exists(cli_object):
+    """Return a :mod:`robottelo.fixture_cache` validator checking with
+    ``cli_object.info`` that a cached entity still exists.
+
+    """
+    def validator(entity, options):
+        """Check that ``entity`` can still be read.
+
+        Entities which can't be read, like the ones cached without the
+        ``organization-id`` option their ``info`` requires, are considered
+        stale.
+
+        """
+        info_options = {u'id': entity['id']}
+        organization_id = (options or {}).get('organization-id')
+        if cli_object.command_requires_org and organization_id is not None:
+            info_options[u'organization-id'] = organization_id
+        try:
+            cli_object.info(info_options)
+        except (CLIError, CLIReturnCodeError):
+            return False
+        return True
+    return validator
+
+
+#: CLI classes of the entities built by the cacheable factories, keyed by
+#: factory name without the ``make_`` prefix.
+CACHEABLE_CLI_OBJECTS = {
+    'activation_key': ActivationKey,
+    'architecture': Architecture,
+    'compute_resource': ComputeResource,
+    'content_host': ContentHost,
+    'content_view': ContentView,
+    'domain': Domain,
+    'environment': Environment,
+    'filter': Filter,
+    'gpg_key': GPGKey,
+    'host': Host,
+    'host_collection': HostCollection,
+    'hostgroup': HostGroup,
+    'lifecycle_environment': LifecycleEnvironment,
+    'location': Location,
+    'medium': Medium,
+    'model': Model,
+    'org': Org,
+    'os': OperatingSys,
+    'partition_table': PartitionTable,
+    'product': Product,
+    'proxy': Proxy,
+    'repository': Repository,
+    'role': Role,
+    'subnet': Subnet,
+    'sync_plan': SyncPlan,
+    'template': Template,
+    'user': User,
+    'usergroup': UserGroup,
+    'usergroup_external': UserGroupExternal,
+}
+for _kind, _cli_object in CACHEABLE_CLI_OBJECTS.items():
+    fixture_cache.register_validator(_kind, _entity_exists(_cli_object))
+
+
 @cacheable
 def make_activation_key(options=None):
     """
@@ -1837,6 +2033,186 @@ def activationkey_add_subscription_to_repo(options=None):
                 )
 
 
+def _run_task(cli_object, method_name, options, error, timeout=None):
+    """Run the ``method_name`` command of ``cli_object`` with ``--async`` and
+    wait for the Foreman tasks it started.
+
+    The command runs on its own subclass of ``cli_object``, so it can run
+    alongside other commands of the same class.
+
+    :param error: The message of the :class:`CLIFactoryError` raised if the
+        command or the task fails, or if no task was started.
+    :param int timeout: Seconds to wait for the progress of the tasks.
+
+    """
+    options = dict(options)
+    options[u'async'] = True
+    isolated_object = type(cli_object.__name__, (cli_object,), {})
+    isolated_task = type(Task.__name__, (Task,), {})
+    try:
+        output = getattr(isolated_object, method_name)(options)
+        task_ids = get_task_ids(output)
+        if not task_ids:
+            raise CLIFactoryError(
+                u'{0}\nNo task found on the output: {1}'.format(error, output))
+        infos = isolated_task.wait(task_ids, timeout=timeout)
+    except CLIReturnCodeError as err:
+        raise CLIFactoryError(u'{0}\n{1}'.format(error, err.msg))
+    for task_id, info in zip(task_ids, infos):
+        if info.get(u'result') in (u'error', u'warning'):
+            raise CLIFactoryError(
+                u'{0}\nTask {1} finished with the {2} result'
+                .format(error, task_id, info[u'result'])
+            )
+
+
+def _add_org_steps(pipeline, options):
+    """Add the ``org`` and ``env`` steps to ``pipeline``, creating the
+    organization and lifecycle environment unless given on ``options``.
+
+    """
+    if options.get('organization-id') is None:
+        pipeline.add('org', lambda results: make_org()['id'])
+    else:
+        pipeline.add('org', lambda results: options['organization-id'])
+    if options.get('lifecycle-environment-id') is None:
+        pipeline.add(
+            'env',
+            lambda results: make_lifecycle_environment(
+                {u'organization-id': results['org']})['id'],
+            requires=('org',),
+        )
+    else:
+        pipeline.add(
+            'env', lambda results: options['lifecycle-environment-id'])
+
+
+def _add_content_view_steps(
+        pipeline, options, subscription, subscription_requires=()):
+    """Add the steps publishing the repository of the ``repository`` step on
+    a content view and giving an activation key access to it.
+
+    The content view is created and given the repository while the
+    repository is synchronized by the ``sync`` step, only publishing waits
+    for the synchronization.
+
+    :param subscription: A function called with the results of the steps of
+        ``subscription_requires``, returning the name of the subscription
+        added to the activation key.
+    :param subscription_requires: The names of the steps ``subscription``
+        needs the results of.
+
+    """
+    if options.get('content-view-id') is None:
+        pipeline.add(
+            'content-view',
+            lambda results: make_content_view(
+                {u'organization-id': results['org']})['id'],
+            requires=('org',),
+        )
+    else:
+        pipeline.add(
+            'content-view', lambda results: options['content-view-id'])
+
+    def add_repository(results):
+        """Add the repository to the content view."""
+        try:
+            ContentView.add_repository({
+                u'id': results['content-view'],
+                u'organization-id': results['org'],
+                u'repository-id': results['repository']['id'],
+            })
+        except CLIReturnCodeError as err:
+            raise CLIFactoryError(
+                u'Failed to add repository to content view\n{0}'
+                .format(err.msg)
+            )
+
+    pipeline.add(
+        'add-repository',
+        add_repository,
+        requires=('org', 'content-view', 'repository'),
+    )
+
+    def publish(results):
+        """Publish a new version of the content view and return its id."""
+        _run_task(
+            ContentView,
+            'publish',
+            {u'id': results['content-view']},
+            u'Failed to publish new version of content view',
+            timeout=1800,
+        )
+        try:
+            return ContentView.info(
+                {u'id': results['content-view']})['versions'][-1]['id']
+        except CLIReturnCodeError as err:
+            raise CLIFactoryError(
+                u'Failed to fetch content view info\n{0}'.format(err.msg))
+
+    pipeline.add(
+        'publish',
+        publish,
+        requires=('content-view', 'add-repository', 'sync'),
+    )
+    pipeline.add(
+        'promote',
+        lambda results: _run_task(
+            ContentView,
+            'version_promote',
+            {
+                u'id': results['publish'],
+                u'organization-id': results['org'],
+                u'to-lifecycle-environment-id': results['env'],
+            },
+            u'Failed to promote version to next environment',
+            timeout=1800,
+        ),
+        requires=('org', 'env', 'publish'),
+    )
+
+    def activation_key(results):
+        """Create the activation key if needed and associate the content view
+        with it.
+
+        """
+        if options.get('activationkey-id') is None:
+            return make_activation_key({
+                u'content-view-id': results['content-view'],
+                u'lifecycle-environment-id': results['env'],
+                u'organization-id': results['org'],
+            })['id']
+        # Given activation key may have no (or different) CV associated.
+        # Associate activation key with CV just to be sure
+        try:
+            ActivationKey.update({
+                u'content-view-id': results['content-view'],
+                u'id': options['activationkey-id'],
+                u'organization-id': results['org'],
+            })
+        except CLIReturnCodeError as err:
+            raise CLIFactoryError(
+                u'Failed to associate activation-key with CV\n{0}'
+                .format(err.msg)
+            )
+        return options['activationkey-id']
+
+    pipeline.add(
+        'activation-key',
+        activation_key,
+        requires=('org', 'env', 'content-view', 'promote'),
+    )
+    pipeline.add(
+        'subscription',
+        lambda results: activationkey_add_subscription_to_repo({
+            u'activationkey-id': results['activation-key'],
+            u'organization-id': results['org'],
+            u'subscription': subscription(results),
+        }),
+        requires=('org', 'activation-key') + tuple(subscription_requires),
+    )
+
+
 def setup_org_for_a_custom_repo(options=None):
     """Sets up Org for the given custom repo by:
 
@@ -1851,6 +2227,13 @@ def setup_org_for_a_custom_repo(options=None):
         associates it with the content view.
     5. Adds the custom repo subscription to the activation key
 
+    The independent steps run concurrently, see
+    :class:`robottelo.pipeline.Pipeline`: the lifecycle environment, the
+    product and the content view are created at the same time, and the
+    content view is given the repository while it is synchronized. The
+    synchronization, publishing and promotion wait for their Foreman task to
+    finish. The time spent on each step is logged.
+
     Options::
 
         url - URL to custom repository
@@ -1871,99 +2254,49 @@ def setup_org_for_a_custom_repo(options=None):
             not options or
             not options.get('url')):
         raise CLIFactoryError('Please provide valid custom repo URL.')
-    # Create new organization and lifecycle environment if needed
-    if options.get('organization-id') is None:
-        org_id = make_org()['id']
-    else:
-        org_id = options['organization-id']
-    if options.get('lifecycle-environment-id') is None:
-        env_id = make_lifecycle_environment({u'organization-id': org_id})['id']
-    else:
-        env_id = options['lifecycle-environment-id']
-    # Create custom product and repository
-    custom_product = make_product({u'organization-id': org_id})
-    custom_repo = make_repository({
-        u'content-type': 'yum',
-        u'product-id': custom_product['id'],
-        u'url': options.get('url'),
-    })
-    # Synchronize custom repository
-    try:
-        Repository.synchronize({'id': custom_repo['id']})
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to synchronize repository\n{0}'.format(err.msg))
-    # Create CV if needed and associate repo with it
-    if options.get('content-view-id') is None:
-        cv_id = make_content_view({u'organization-id': org_id})['id']
-    else:
-        cv_id = options['content-view-id']
-    try:
-        ContentView.add_repository({
-            u'id': cv_id,
-            u'organization-id': org_id,
-            u'repository-id': custom_repo['id'],
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to add repository to content view\n{0}'.format(err.msg))
-    # Publish a new version of CV
-    try:
-        ContentView.publish({u'id': cv_id})
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to publish new version of content view\n{0}'
-            .format(err.msg)
-        )
-    # Get the version id
-    cvv = ContentView.info({u'id': cv_id})['versions'][-1]
-    # Promote version to next env
-    try:
-        ContentView.version_promote({
-            u'id': cvv['id'],
-            u'organization-id': org_id,
-            u'to-lifecycle-environment-id': env_id,
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to promote version to next environment\n{0}'
-            .format(err.msg)
-        )
-    # Create activation key if needed and associate content view with it
-    if options.get('activationkey-id') is None:
-        activationkey_id = make_activation_key({
-            u'content-view-id': cv_id,
-            u'lifecycle-environment-id': env_id,
-            u'organization-id': org_id,
-        })['id']
-    else:
-        activationkey_id = options['activationkey-id']
-        # Given activation key may have no (or different) CV associated.
-        # Associate activation key with CV just to be sure
-        try:
-            ActivationKey.update({
-                u'content-view-id': cv_id,
-                u'id': activationkey_id,
-                u'organization-id': org_id,
-            })
-        except CLIReturnCodeError as err:
-            raise CLIFactoryError(
-                u'Failed to associate activation-key with CV\n{0}'
-                .format(err.msg)
-            )
-    # Add subscription to activation-key
-    activationkey_add_subscription_to_repo({
-        u'activationkey-id': activationkey_id,
-        u'organization-id': org_id,
-        u'subscription': custom_product['name'],
-    })
+    # Steps using the same CLI class must not run concurrently, the classes
+    # keep the subcommand being run
+    pipeline = Pipeline(u'setup_org_for_a_custom_repo')
+    _add_org_steps(pipeline, options)
+    pipeline.add(
+        'product',
+        lambda results: make_product({u'organization-id': results['org']}),
+        requires=('org',),
+    )
+    pipeline.add(
+        'repository',
+        lambda results: make_repository({
+            u'content-type': 'yum',
+            u'product-id': results['product']['id'],
+            u'url': options.get('url'),
+        }),
+        requires=('product',),
+    )
+    pipeline.add(
+        'sync',
+        lambda results: _run_task(
+            Repository,
+            'synchronize',
+            {u'id': results['repository']['id']},
+            u'Failed to synchronize repository',
+            timeout=1800,
+        ),
+        requires=('repository',),
+    )
+    _add_content_view_steps(
+        pipeline,
+        options,
+        lambda results: results['product']['name'],
+        subscription_requires=('product',),
+    )
+    results = pipeline.run()
     return {
-        u'activationkey-id': activationkey_id,
-        u'content-view-id': cv_id,
-        u'lifecycle-environment-id': env_id,
-        u'organization-id': org_id,
-        u'product-id': custom_product['id'],
-        u'repository-id': custom_repo['id'],
+        u'activationkey-id': results['activation-key'],
+        u'content-view-id': results['content-view'],
+        u'lifecycle-environment-id': results['env'],
+        u'organization-id': results['org'],
+        u'product-id': results['product']['id'],
+        u'repository-id': results['repository']['id'],
     }
 
 
@@ -1982,6 +2315,14 @@ def setup_org_for_a_rh_repo(options=None):
         associates it with the content view.
     6. Adds the RH repo subscription to the activation key
 
+    The independent steps run concurrently, see
+    :class:`robottelo.pipeline.Pipeline`: the manifest is cloned while the
+    organization is created, the lifecycle environment and the content view
+    are created while the manifest is uploaded, and the content view is given
+    the repository while it is synchronized. The synchronization, publishing
+    and promotion wait for their Foreman task to finish. The time spent on
+    each step is logged.
+
     Options::
 
         product - RH product name
@@ -2009,130 +2350,79 @@ def setup_org_for_a_rh_repo(options=None):
             not options.get('repository')):
         raise CLIFactoryError(
             'Please provide valid product, repository-set and repo.')
-    # Create new organization and lifecycle environment if needed
-    if options.get('organization-id') is None:
-        org_id = make_org()['id']
-    else:
-        org_id = options['organization-id']
-    if options.get('lifecycle-environment-id') is None:
-        env_id = make_lifecycle_environment({u'organization-id': org_id})['id']
-    else:
-        env_id = options['lifecycle-environment-id']
-    # Clone manifest and upload it
-    with manifests.clone() as manifest:
-        upload_file(manifest.content, manifest.filename)
-    try:
-        Subscription.upload({
-            u'file': manifest.filename,
-            u'organization-id': org_id,
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to upload manifest\n{0}'.format(err.msg))
-    # Enable repo from Repository Set
-    try:
-        RepositorySet.enable({
-            u'basearch': 'x86_64',
-            u'name': options['repository-set'],
-            u'organization-id': org_id,
-            u'product': options['product'],
-            u'releasever': options.get('releasever'),
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to enable repository set\n{0}'.format(err.msg))
-    # Fetch repository info
-    try:
-        rhel_repo = Repository.info({
-            u'name': options['repository'],
-            u'organization-id': org_id,
-            u'product': options['product'],
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to fetch repository info\n{0}'.format(err.msg))
-    # Synchronize the RH repository
-    try:
-        Repository.synchronize({
-            u'name': options['repository'],
-            u'organization-id': org_id,
-            u'product': options['product'],
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to synchronize repository\n{0}'.format(err.msg))
-    # Create CV if needed and associate repo with it
-    if options.get('content-view-id') is None:
-        cv_id = make_content_view({u'organization-id': org_id})['id']
-    else:
-        cv_id = options['content-view-id']
-    try:
-        ContentView.add_repository({
-            u'id': cv_id,
-            u'organization-id': org_id,
-            u'repository-id': rhel_repo['id'],
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to add repository to content view\n{0}'.format(err.msg))
-    # Publish a new version of CV
-    try:
-        ContentView.publish({u'id': cv_id})
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to publish new version of content view\n{0}'
-            .format(err.msg)
-        )
-    # Get the version id
-    try:
-        cvv = ContentView.info({u'id': cv_id})['versions'][-1]
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to fetch content view info\n{0}'.format(err.msg))
-    # Promote version1 to next env
-    try:
-        ContentView.version_promote({
-            u'id': cvv['id'],
-            u'organization-id': org_id,
-            u'to-lifecycle-environment-id': env_id,
-        })
-    except CLIReturnCodeError as err:
-        raise CLIFactoryError(
-            u'Failed to promote version to next environment\n{0}'
-            .format(err.msg)
-        )
-    # Create activation key if needed and associate content view with it
-    if options.get('activationkey-id') is None:
-        activationkey_id = make_activation_key({
-            u'content-view-id': cv_id,
-            u'lifecycle-environment-id': env_id,
-            u'organization-id': org_id,
-        })['id']
-    else:
-        activationkey_id = options['activationkey-id']
-        # Given activation key may have no (or different) CV associated.
-        # Associate activation key with CV just to be sure
+    # Steps using the same CLI class must not run concurrently, the classes
+    # keep the subcommand being run
+    pipeline = Pipeline(u'setup_org_for_a_rh_repo')
+    _add_org_steps(pipeline, options)
+
+    def clone_manifest(results):
+        """Clone a manifest, upload it to the server and return its path."""
+        with manifests.clone() as manifest:
+            upload_file(manifest.content, manifest.filename)
+        return manifest.filename
+
+    pipeline.add('manifest', clone_manifest)
+
+    def upload_manifest(results):
+        """Upload the manifest to the organization."""
         try:
-            ActivationKey.update({
-                u'id': activationkey_id,
-                u'organization-id': org_id,
-                u'content-view-id': cv_id,
+            Subscription.upload({
+                u'file': results['manifest'],
+                u'organization-id': results['org'],
             })
         except CLIReturnCodeError as err:
             raise CLIFactoryError(
-                u'Failed to associate activation-key with CV\n{0}'
-                .format(err.msg)
-            )
-    # Add subscription to activation-key
-    activationkey_add_subscription_to_repo({
-        u'organization-id': org_id,
-        u'activationkey-id': activationkey_id,
-        u'subscription': DEFAULT_SUBSCRIPTION_NAME,
-    })
+                u'Failed to upload manifest\n{0}'.format(err.msg))
+
+    pipeline.add(
+        'upload-manifest', upload_manifest, requires=('org', 'manifest'))
+
+    def enable_repository(results):
+        """Enable the repository from its repository set and return its
+        info.
+
+        """
+        try:
+            RepositorySet.enable({
+                u'basearch': 'x86_64',
+                u'name': options['repository-set'],
+                u'organization-id': results['org'],
+                u'product': options['product'],
+                u'releasever': options.get('releasever'),
+            })
+        except CLIReturnCodeError as err:
+            raise CLIFactoryError(
+                u'Failed to enable repository set\n{0}'.format(err.msg))
+        try:
+            return Repository.info({
+                u'name': options['repository'],
+                u'organization-id': results['org'],
+                u'product': options['product'],
+            })
+        except CLIReturnCodeError as err:
+            raise CLIFactoryError(
+                u'Failed to fetch repository info\n{0}'.format(err.msg))
+
+    pipeline.add(
+        'repository', enable_repository, requires=('org', 'upload-manifest'))
+    pipeline.add(
+        'sync',
+        lambda results: _run_task(
+            Repository,
+            'synchronize',
+            {u'id': results['repository']['id']},
+            u'Failed to synchronize repository',
+            timeout=1800,
+        ),
+        requires=('repository',),
+    )
+    _add_content_view_steps(
+        pipeline, options, lambda results: DEFAULT_SUBSCRIPTION_NAME)
+    results = pipeline.run()
     return {
-        u'activationkey-id': activationkey_id,
-        u'content-view-id': cv_id,
-        u'lifecycle-environment-id': env_id,
-        u'organization-id': org_id,
-        u'repository-id': rhel_repo['id'],
+        u'activationkey-id': results['activation-key'],
+        u'content-view-id': results['content-view'],
+        u'lifecycle-environment-id': results['env'],
+        u'organization-id': results['org'],
+        u'repository-id': results['repository']['id'],
     }
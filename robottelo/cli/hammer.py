@@ -5,9 +5,15 @@ import json
 import re
 import six
 from six import text_type
-from six.moves import cStringIO as StringIO
 from six.moves import zip
 
+# functools.lru_cache is Python 3 only. This mirrors the conditional of
+# robottelo.helpers, which can't be imported here as it imports robottelo.cli.
+if six.PY3:  # pragma: no cover
+    from functools import lru_cache
+else:  # pragma: no cover
+    from cachetools import lru_cache
+
 
 def _csv_reader(output):
     """An unicode CSV reader which processes unicode strings and return unicode
@@ -23,58 +29,142 @@ def _csv_reader(output):
     On Python 3 this generator is not needed because the default string type is
     unicode.
 
+    The lines are consumed lazily, so ``output`` can be a generator of lines
+    still being received.
+
     :param output: can be any object which supports the iterator protocol and
     returns a unicode string each time its next() method is called.
     :return: generator that will yield a list of unicode string values.
 
     """
-    data = '\n'.join(output)
+    # Restore the line breaks so quoted values spanning several lines are
+    # kept as they are.
+    lines = (line + u'\n' for line in output)
     if six.PY2:
-        data = data.encode('utf8')
-    handler = StringIO(data)
+        lines = (line.encode('utf8') for line in lines)
 
-    for row in csv.reader(handler):
+    for row in csv.reader(lines):
         if six.PY2:
             yield [value.decode('utf8') for value in row]
         else:
             yield row
 
 
+@lru_cache(maxsize=4096)
 def _normalize(header):
     """Replace empty spaces with '-' and lower all chars
+
+    The same headers show up on every entity, so the results are memoized.
     """
     return header.replace(' ', '-').lower()
 
 
+def _normalize_pairs(pairs):
+    """Build a dict from the JSON object ``pairs`` normalizing its keys."""
+    return {_normalize(key): value for key, value in pairs}
+
+
 def parse_json(stdout):
     """Parse JSON output from Hammer CLI and convert it to python dictionary
     while normalizing keys.
+
+    Keys are normalized and integers converted to strings, to conform to the
+    CSV parser, while the JSON is decoded, so the output is walked only once.
     """
-    parsed = json.loads(stdout)
-    return _normalize_obj(parsed)
+    return json.loads(
+        stdout,
+        object_pairs_hook=_normalize_pairs,
+        parse_int=text_type,
+    )
+
+
+def to_text_output(obj):
+    """Convert parsed JSON output to the shape of the text outputs.
+
+    Make the output of :func:`parse_json` look like the output of
+    :func:`parse_info` and :func:`parse_csv`:
 
+    * objects with numbered keys, like ``{"1": {...}, "2": {...}}``, become
+      lists ordered by number;
+    * booleans become ``yes`` or ``no``;
+    * ``null`` becomes an empty string.
 
-def _normalize_obj(obj):
-    """Normalize all dict's keys replacing empty spaces with "-" and lowering
-    chars
     """
     if isinstance(obj, dict):
-        return {_normalize(k): _normalize_obj(v) for k, v in obj.items()}
+        if obj and all(key.isdigit() for key in obj):
+            return [
+                to_text_output(obj[key]) for key in sorted(obj, key=int)]
+        return {key: to_text_output(value) for key, value in obj.items()}
     elif isinstance(obj, list):
-        return [_normalize_obj(v) for v in obj]
-    # doing this to conform to csv parser
-    elif isinstance(obj, int) and not isinstance(obj, bool):
-        return text_type(obj)
+        return [to_text_output(value) for value in obj]
+    elif isinstance(obj, bool):
+        return u'yes' if obj else u'no'
+    elif obj is None:
+        return u''
     return obj
 
 
-def parse_csv(output):
-    """Parse CSV output from Hammer CLI and convert it to python dictionary."""
+def iter_csv(output):
+    """Parse CSV output from Hammer CLI and yield a python dictionary for each
+    entry.
+
+    Unlike :func:`parse_csv` the entries are parsed as the lines are consumed
+    from ``output``, which can be a generator like
+    ``robottelo.ssh.SSHCommandStream``.
+
+    """
     reader = _csv_reader(output)
     # Generate the key names, spaces will be converted to dashes "-"
-    keys = [_normalize(header) for header in next(reader)]
+    try:
+        keys = [_normalize(header) for header in next(reader)]
+    except StopIteration:
+        return
     # For each entry, create a dict mapping each key with each value
-    return [dict(zip(keys, values)) for values in reader if len(values) > 0]
+    for values in reader:
+        if len(values) > 0:
+            yield dict(zip(keys, values))
+
+
+def parse_csv(output):
+    """Parse CSV output from Hammer CLI and convert it to python dictionary."""
+    return list(iter_csv(output))
+
+
+#: Matches an option line of the help output, the ``name`` group is
+#: ``None`` for the lines continuing the help of the previous option.
+_HELP_OPTION_REGEX = re.compile(
+    r'^ (-(?P<shortname>\w), )?(--(?P<name>[\w-]+))?'
+    r'(, --(?P<deprecation_name>[\w-]+))?( (?P<value>\w+))?\s+(?P<help>.*)$'
+)
+#: Matches a subcommand line of the help output, the ``name`` group is
+#: ``None`` for the lines continuing the description of the previous
+#: subcommand.
+_HELP_SUBCOMMAND_REGEX = re.compile(
+    r'^ (?P<name>[\w-]+)?\s+(?P<description>.*)$'
+)
+#: Sections of the help output, mapping each section heading to the
+#: ``parse_help`` contents key, the regex matching the section lines, the
+#: fields taken from each match and the field extended by continuation lines.
+_HELP_SECTIONS = (
+    (
+        'Subcommands:',
+        'subcommands',
+        _HELP_SUBCOMMAND_REGEX,
+        (u'name', u'description'),
+        u'description',
+    ),
+    (
+        'Options:',
+        'options',
+        _HELP_OPTION_REGEX,
+        (u'name', u'shortname', u'value', u'help'),
+        u'help',
+    ),
+)
+#: Matches the number of a numbered item in the info output, like ``1)``.
+_INFO_NUMBER_REGEX = re.compile(r'(\d+)\)')
+#: Matches a numbered single value in the info output, like ``1) value``.
+_INFO_NUMBERED_VALUE_REGEX = re.compile(r'\d+\)\s+(.+)$')
 
 
 def parse_help(output):
@@ -82,61 +172,34 @@ def parse_help(output):
     mapping the subcommands and options accepted by that command.
 
     """
-    # Parsing states
-    state = 0
-    subcommands_section_state = 1
-    options_section_state = 2
-
     contents = {
         'subcommands': [],
         'options': [],
     }
-    option_regex = re.compile(
-        r'^ (-(?P<shortname>\w), )?(--(?P<name>[\w-]+))?'
-        '(, --(?P<deprecation_name>[\w-]+))?( (?P<value>\w+))?\s+(?P<help>.*)$'
-    )
-    subcommand_regex = re.compile(
-        r'^ (?P<name>[\w-]+)?\s+(?P<description>.*)$'
-    )
+    # The section being parsed, one of ``_HELP_SECTIONS``
+    section = None
 
     for line in output:
         if len(line.strip()) == 0:
             continue
-        if line.startswith('Subcommands:'):
-            state = subcommands_section_state
-            continue
-        if line.startswith('Options:'):
-            state = options_section_state
-            continue
-
-        if state == subcommands_section_state:
-            match = subcommand_regex.search(line)
-            if match is None:
+        for heading_section in _HELP_SECTIONS:
+            if line.startswith(heading_section[0]):
+                section = heading_section
+                break
+        else:
+            if section is None:
                 continue
-            if match.group('name') is None:
-                contents['subcommands'][-1]['description'] += (
-                    u' {0}'.format(match.group('description'))
-                )
-            else:
-                contents['subcommands'].append({
-                    u'name': match.group('name'),
-                    u'description': match.group('description'),
-                })
-        if state == options_section_state:
-            match = option_regex.search(line)
+            _, key, regex, fields, continued_field = section
+            match = regex.search(line)
             if match is None:
                 continue
             if match.group('name') is None:
-                contents['options'][-1]['help'] += (
-                    u' {0}'.format(match.group('help'))
+                contents[key][-1][continued_field] += (
+                    u' {0}'.format(match.group(continued_field))
                 )
             else:
-                contents['options'].append({
-                    u'name': match.group('name'),
-                    u'shortname': match.group('shortname'),
-                    u'value': match.group('value'),
-                    u'help': match.group('help'),
-                })
+                contents[key].append(
+                    {field: match.group(field) for field in fields})
 
     return contents
 
@@ -153,16 +216,14 @@ def parse_info(output):
         if line == '':
             continue
         if line.startswith(' '):  # sub-properties are indented
+            stripped = line.lstrip()
             # values are separated by ':' or '=>', but not by '::' which can be
             # entity name like 'test::params::keys'
-            if line.find(':') != -1 and not line.find('::') != -1:
-                key, value = line.lstrip().split(":", 1)
-            elif line.find('=>') != -1:
-                key, value = line.lstrip().split(" =>", 1)
+            if ':' in line and '::' not in line:
+                key, value = stripped.split(':', 1)
+            elif '=>' in line:
+                key, value = stripped.split(' =>', 1)
             else:
-                key = value = None
-
-            if key is None and value is None:
                 # Parse single attribute collection properties
                 # Template
                 #  1) template1
@@ -172,47 +233,44 @@ def parse_info(output):
                 # Template
                 #  template1
                 #  template2
-                match = re.match(r'\d+\)\s+(.+)$', line.lstrip())
-
-                if match is None:
-                    match = re.match(r'(.*)$', line.lstrip())
-
-                value = match.group(1)
+                match = _INFO_NUMBERED_VALUE_REGEX.match(stripped)
+                value = stripped if match is None else match.group(1)
 
                 if isinstance(contents[sub_prop], dict):
                     contents[sub_prop] = []
 
                 contents[sub_prop].append(value)
+                continue
+
+            # some properties have many numbered values
+            # Example:
+            # Content:
+            #  1) Repo Name: repo1
+            #     URL:       /custom/4f84fc90-9ffa-...
+            #  2) Repo Name: puppet1
+            #     URL:       /custom/4f84fc90-9ffa-...
+            starts_with_number = _INFO_NUMBER_REGEX.match(key)
+            if starts_with_number:
+                sub_num = int(starts_with_number.group(1))
+                # no. 1) we need to change dict() to list()
+                if sub_num == 1:
+                    contents[sub_prop] = []
+                # remove number from key
+                key = _INFO_NUMBER_REGEX.sub('', key)
+                # append empty dict to array
+                contents[sub_prop].append({})
+
+            key = _normalize(key.lstrip())
+
+            # add value to dictionary
+            if sub_num is not None:
+                contents[sub_prop][-1][key] = value.lstrip()
             else:
-                # some properties have many numbered values
-                # Example:
-                # Content:
-                #  1) Repo Name: repo1
-                #     URL:       /custom/4f84fc90-9ffa-...
-                #  2) Repo Name: puppet1
-                #     URL:       /custom/4f84fc90-9ffa-...
-                starts_with_number = re.match(r'(\d+)\)', key)
-                if starts_with_number:
-                    sub_num = int(starts_with_number.group(1))
-                    # no. 1) we need to change dict() to list()
-                    if sub_num == 1:
-                        contents[sub_prop] = []
-                    # remove number from key
-                    key = re.sub(r'\d+\)', '', key)
-                    # append empty dict to array
-                    contents[sub_prop].append({})
-
-                key = key.lstrip().replace(' ', '-').lower()
-
-                # add value to dictionary
-                if sub_num is not None:
-                    contents[sub_prop][-1][key] = value.lstrip()
-                else:
-                    contents[sub_prop][key] = value.lstrip()
+                contents[sub_prop][key] = value.lstrip()
         else:
             sub_num = None  # new property implies no sub property
             key, value = line.lstrip().split(":", 1)
-            key = key.lstrip().replace(' ', '-').lower()
+            key = _normalize(key.lstrip())
             if value.lstrip() == '':  # 'key:' no value, new sub-property
                 sub_prop = key
                 contents[sub_prop] = {}
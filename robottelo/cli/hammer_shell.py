@@ -0,0 +1,313 @@
+# -*- encoding: utf-8 -*-
+"""Run hammer commands on long lived ``hammer shell`` processes.
+
+Starting hammer takes several seconds (loading gems, fetching the API
+documentation), which is paid by every CLI command run through
+``robottelo.ssh.command``. This module keeps ``hammer shell`` processes open
+over SSH for each user and password pair and writes the commands to their
+standard input instead. It is used by :meth:`robottelo.cli.base.Base.execute`
+when ``hammer_backend=shell`` is set on the ``[robottelo]`` configuration
+section. A shell runs one command at a time, so up to ``MAX_SHELLS`` shells
+are started for each pair to run concurrent commands, like the ones of
+:meth:`robottelo.cli.base.Base.execute_many`.
+
+``hammer shell`` prints a prompt before reading each command, the output of a
+command is everything printed until the next prompt. The shell does not report
+the commands return code, a command is considered failed if it printed to
+stderr anything other than warnings. If the shell process crashes or a command
+does not finish on time, the command gets the ``255`` return code and a new
+shell process is started for the next command.
+
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from robottelo import ssh
+from robottelo.config import settings
+
+logger = logging.getLogger(__name__)
+
+#: Prompt printed by ``hammer shell`` when waiting for a command.
+PROMPT = b'hammer> '
+#: Return code of commands which could not be run by the shell.
+SHELL_ERROR_RETURN_CODE = 255
+#: Seconds to wait for a new shell to print its first prompt when no timeout
+#: is given.
+START_TIMEOUT = 300
+#: Maximum number of shells running for each user and password pair.
+MAX_SHELLS = 4
+
+
+class HammerShellError(Exception):
+    """Indicates that the ``hammer shell`` process crashed or hung."""
+
+
+def guess_return_code(stderr):
+    """Guess the return code of a command from its standard error, as
+    ``hammer shell`` does not report it.
+
+    :param stderr: The decoded standard error of the command.
+    :return: ``0`` if ``stderr`` only contains warnings, ``1`` otherwise.
+
+    """
+    for line in (stderr or u'').splitlines():
+        line = line.strip()
+        if line and not line.lower().startswith(u'warning'):
+            return 1
+    return 0
+
+
+class HammerShell(object):
+    """A ``hammer shell`` process running on the server.
+
+    Commands are run one at a time, concurrent callers wait for the running
+    command to finish.
+
+    :param str user: The hammer username.
+    :param str password: The hammer password.
+    :param str hostname: The server hostname. Defaults to the configuration
+        ``server.hostname``.
+
+    """
+
+    def __init__(self, user, password, hostname=None):
+        self.user = user
+        self.password = password
+        self.hostname = hostname
+        self.channel = None
+        self.lock = threading.Lock()
+        self._connection_context = None
+
+    @property
+    def running(self):
+        """Whether the shell process is up."""
+        return self.channel is not None and not self.channel.closed
+
+    def start(self, timeout=START_TIMEOUT):
+        """Start the shell process and wait for its first prompt.
+
+        The shell runs on its own ssh connection, not on a pooled one, so
+        running shells do not take the sessions of
+        ``robottelo.ssh.command``.
+
+        :raises robottelo.cli.hammer_shell.HammerShellError: If the shell
+            exits or does not print its prompt within ``timeout`` seconds.
+
+        """
+        self._connection_context = ssh.get_connection(hostname=self.hostname)
+        connection = self._connection_context.__enter__()
+        try:
+            self.channel = connection.get_transport().open_session()
+            self.channel.exec_command(
+                u'LANG={0} hammer -v -u {1} -p {2} shell'.format(
+                    settings.locale, self.user, self.password)
+                .encode('utf-8')
+            )
+            self._read_until_prompt(timeout)
+        except Exception:
+            self.close()
+            raise
+        logger.debug('Started hammer shell for user %s', self.user)
+
+    def close(self):
+        """Stop the shell process and close its connection."""
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+        if self._connection_context is not None:
+            self._connection_context.__exit__(None, None, None)
+            self._connection_context = None
+
+    def _read_until_prompt(self, timeout):
+        """Read both outputs until the shell prints its prompt.
+
+        :param int timeout: Seconds to wait for the prompt, ``None`` waits
+            forever.
+        :return: A ``(stdout, stderr)`` tuple of bytes, without the prompt.
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        stdout = []
+        stderr = []
+        # End of the output received so far, to look for the prompt
+        tail = b''
+        while True:
+            chunks = len(stdout)
+            if ssh.read_channel(self.channel, stdout, stderr):
+                tail = (tail + b''.join(stdout[chunks:]))[-len(PROMPT):]
+                if tail == PROMPT:
+                    break
+                continue
+            if self.channel.exit_status_ready():
+                raise HammerShellError(
+                    'hammer shell exited with return code {0}'.format(
+                        self.channel.recv_exit_status()))
+            if deadline is not None and time.time() > deadline:
+                raise HammerShellError(
+                    'hammer shell did not answer within {0} seconds'.format(
+                        timeout))
+            time.sleep(ssh.CHANNEL_POLL_INTERVAL)
+        # The output of the command may be written to stderr right before the
+        # prompt is written to stdout.
+        ssh.read_channel(self.channel, [], stderr)
+        return b''.join(stdout)[:-len(PROMPT)], b''.join(stderr)
+
+    def execute(self, command, output_format=None, timeout=None):
+        """Run a hammer command on the shell.
+
+        :param str command: The hammer command, without ``hammer`` and the
+            global options.
+        :param output_format: plain|json|csv
+        :param int timeout: Seconds to wait for the command to finish, it is
+            also used to start the shell when given. If it is ``None`` the
+            command is waited for as long as it runs.
+        :return: ``robottelo.ssh.SSHCommandResult``
+
+        """
+        line = u'{0}{1}'.format(
+            u'--output={0} '.format(output_format) if output_format else u'',
+            command,
+        )
+        with self.lock:
+            started = time.time()
+            try:
+                if not self.running:
+                    self.start(
+                        START_TIMEOUT if timeout is None else timeout)
+                connected = time.time()
+                logger.debug('>>> hammer shell: %s', line)
+                self.channel.sendall(u'{0}\n'.format(line).encode('utf-8'))
+                stdout, stderr = self._read_until_prompt(timeout)
+                finished = time.time()
+            except (HammerShellError,) + ssh.CONNECTION_ERRORS as err:
+                logger.warning('Restarting hammer shell: %s', err)
+                self.close()
+                return ssh.SSHCommandResult(
+                    [] if output_format != 'plain' else u'',
+                    u'{0}'.format(err),
+                    SHELL_ERROR_RETURN_CODE,
+                )
+        # Some readline versions echo the command when stdin is not a tty
+        echo = u'{0}\n'.format(line).encode('utf-8')
+        if stdout.startswith(echo):
+            stdout = stdout[len(echo):]
+        return_code = guess_return_code(
+            ssh.COLOR_CODE_REGEX.sub('', ssh.decode_to_utf8(stderr)))
+        result = ssh.build_result(stdout, stderr, return_code, output_format)
+        # Starting the shell is counted as connecting
+        result.connect_time = connected - started
+        result.execute_time = finished - connected
+        result.bytes_received = len(stdout) + len(stderr)
+        return result
+
+
+class HammerShellPool(object):
+    """Keep up to ``max_shells`` :class:`HammerShell` for each user and
+    password pair.
+
+    Each command runs on an idle shell of its pair, a new shell is started if
+    none is idle and the pair has less than ``max_shells``, otherwise the
+    command waits for a shell to be idle.
+
+    Like ``robottelo.ssh.SSHConnectionPool`` the pool is bound to the process
+    which created it, the shells inherited after a fork are dropped.
+
+    :param int max_shells: Maximum number of shells of each pair. Defaults to
+        ``MAX_SHELLS``.
+
+    """
+
+    def __init__(self, max_shells=None):
+        self.max_shells = max_shells or MAX_SHELLS
+        self._reset()
+
+    def _reset(self):
+        """Forget all the shells."""
+        # All the shells and the idle ones of each user and password pair
+        self._shells = {}
+        self._idle = {}
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        """Forget the shells inherited from a parent process."""
+        if self._pid != os.getpid():
+            self._reset()
+
+    def acquire(self, user, password):
+        """Return an idle shell of the user and password pair, a new one is
+        created if needed. It must be given back with :meth:`release`.
+
+        """
+        self._check_pid()
+        key = (user, password)
+        with self._condition:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    return idle.pop()
+                shells = self._shells.setdefault(key, [])
+                if len(shells) < self.max_shells:
+                    shell = HammerShell(user, password)
+                    shells.append(shell)
+                    return shell
+                self._condition.wait()
+
+    def release(self, shell):
+        """Give back a shell returned by :meth:`acquire`."""
+        with self._condition:
+            key = (shell.user, shell.password)
+            if shell in self._shells.get(key, ()):
+                self._idle.setdefault(key, []).append(shell)
+                self._condition.notify()
+
+    def execute(self, command, user, password, output_format=None,
+                timeout=None):
+        """Run a hammer command on an idle shell of the user and password
+        pair, see :meth:`HammerShell.execute`.
+
+        """
+        shell = self.acquire(user, password)
+        try:
+            return shell.execute(
+                command, output_format=output_format, timeout=timeout)
+        finally:
+            self.release(shell)
+
+    def close_all(self):
+        """Stop all the shells."""
+        self._check_pid()
+        with self._condition:
+            shells = [
+                shell
+                for pair_shells in self._shells.values()
+                for shell in pair_shells
+            ]
+            self._shells = {}
+            self._idle = {}
+            self._condition.notify_all()
+        for shell in shells:
+            with shell.lock:
+                shell.close()
+
+
+_shell_pool = HammerShellPool()
+atexit.register(_shell_pool.close_all)
+
+
+def execute(command, user, password, output_format=None, timeout=None):
+    """Run a hammer command on a shell of the user and password pair.
+
+    See :meth:`HammerShellPool.execute`.
+
+    """
+    return _shell_pool.execute(
+        command, user, password, output_format=output_format, timeout=timeout)
+
+
+def close_shells():
+    """Stop all the shells."""
+    _shell_pool.close_all()
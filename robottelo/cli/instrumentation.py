@@ -0,0 +1,214 @@
+# -*- encoding: utf-8 -*-
+"""Record the latency of the hammer commands.
+
+:meth:`robottelo.cli.base.Base.execute` builds a :class:`CommandRecord` for
+each command it runs and hands it to the sinks of the active
+:class:`Instrumentation`, see
+:meth:`robottelo.cli.base.Base.get_instrumentation`. Each record tells how
+long it took to get a connection to the server, to run the command and to
+parse its output, and how many bytes the command wrote.
+
+The sinks are objects with a ``record(record)`` method and an optional
+``close()`` method. Three sinks are provided: :class:`HistogramSink` keeps
+the latency distribution of each command in memory, :class:`CSVSink` and
+:class:`JSONLinesSink` append the records to a file.
+
+"""
+import collections
+import csv
+import io
+import json
+import logging
+import threading
+
+import six
+
+from robottelo.performance.stat import Histogram
+
+logger = logging.getLogger(__name__)
+
+#: Fields of a :class:`CommandRecord`, in the order they are written by the
+#: file sinks.
+RECORD_FIELDS = (
+    'timestamp',
+    'command_base',
+    'command_sub',
+    'return_code',
+    'total_time',
+    'connect_time',
+    'execute_time',
+    'parse_time',
+    'bytes_received',
+)
+
+
+class CommandRecord(collections.namedtuple('CommandRecord', RECORD_FIELDS)):
+    """The timings of a hammer command.
+
+    The times are in seconds. ``connect_time``, ``execute_time``,
+    ``parse_time`` and ``bytes_received`` are ``None`` when the backend
+    running the command could not measure them, ``return_code`` is ``None``
+    when the command could not be run.
+
+    """
+    __slots__ = ()
+
+
+class Instrumentation(object):
+    """Dispatch the command records to a set of sinks.
+
+    :param sinks: The initial sinks.
+
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        """Start sending the records to ``sink``."""
+        with self._lock:
+            self.sinks = self.sinks + [sink]
+
+    def remove_sink(self, sink):
+        """Stop sending the records to ``sink`` and close it."""
+        with self._lock:
+            self.sinks = [other for other in self.sinks if other is not sink]
+        _close_sink(sink)
+
+    def record(self, record):
+        """Send ``record`` to every sink.
+
+        A failing sink is logged and does not fail the command.
+
+        """
+        for sink in self.sinks:
+            try:
+                sink.record(record)
+            except Exception as err:  # pylint:disable=broad-except
+                logger.warning('Could not record hammer command: %s', err)
+
+    def close(self):
+        """Close every sink."""
+        with self._lock:
+            sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            _close_sink(sink)
+
+
+def _close_sink(sink):
+    """Close ``sink`` if it can be closed."""
+    close = getattr(sink, 'close', None)
+    if close is not None:
+        close()
+
+
+class HistogramSink(object):
+    """Keep a :class:`robottelo.performance.stat.Histogram` of each timing for
+    each command.
+
+    The histograms are keyed by ``(command_base, command_sub)`` and then by
+    the timing name: ``total_time``, ``connect_time``, ``execute_time`` and
+    ``parse_time``.
+
+    """
+    timings = ('total_time', 'connect_time', 'execute_time', 'parse_time')
+
+    def __init__(self):
+        self.histograms = collections.defaultdict(
+            lambda: collections.defaultdict(Histogram))
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        """Count the timings of ``record``."""
+        with self._lock:
+            histograms = self.histograms[
+                (record.command_base, record.command_sub)]
+            for timing in self.timings:
+                value = getattr(record, timing)
+                if value is not None:
+                    histograms[timing].add(value)
+
+    def summary(self):
+        """Return the summary of every histogram, keyed like
+        ``histograms``.
+
+        """
+        with self._lock:
+            return {
+                command: {
+                    timing: histogram.summary()
+                    for timing, histogram in histograms.items()
+                }
+                for command, histograms in self.histograms.items()
+            }
+
+
+class _FileSink(object):
+    """Base class of the sinks appending the records to a file.
+
+    The file is opened on the first record.
+
+    :param str path: The path of the file.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._handler = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """Open the file, write its header if needed and return it."""
+        raise NotImplementedError()
+
+    def _write(self, handler, record):
+        """Write ``record`` to the file."""
+        raise NotImplementedError()
+
+    def record(self, record):
+        """Append ``record`` to the file."""
+        with self._lock:
+            if self._handler is None:
+                self._handler = self._open()
+            self._write(self._handler, record)
+            self._handler.flush()
+
+    def close(self):
+        """Close the file."""
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
+
+
+class CSVSink(_FileSink):
+    """Append the records to a CSV file, with a header line if the file is
+    empty.
+
+    """
+
+    def _open(self):
+        if six.PY2:
+            handler = open(self.path, 'ab')
+        else:
+            handler = io.open(self.path, 'a', newline='')
+        self._writer = csv.writer(handler)
+        if handler.tell() == 0:
+            self._writer.writerow(RECORD_FIELDS)
+        return handler
+
+    def _write(self, handler, record):
+        self._writer.writerow(record)
+
+
+class JSONLinesSink(_FileSink):
+    """Append the records to a file as JSON objects, one per line."""
+
+    def _open(self):
+        return io.open(self.path, 'ab')
+
+    def _write(self, handler, record):
+        handler.write(
+            json.dumps(record._asdict(), sort_keys=True).encode('utf-8'))
+        handler.write(b'\n')
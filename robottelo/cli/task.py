@@ -11,12 +11,48 @@ Parameters::
 
 Subcommands::
 
+    info                          Show info about the task
     list                          List tasks
     progress                      Show the progress of the task
     resume                        Resume all tasks paused in error state
 """
+import re
 
 from robottelo.cli.base import Base
+from six import string_types
+
+#: Matches the UUID of the tasks started by the commands run with ``--async``
+TASK_ID_REGEX = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def _iter_text(output):
+    """Yield the strings found on ``output``, walking lists and dicts."""
+    if isinstance(output, string_types):
+        yield output
+    elif isinstance(output, dict):
+        for value in output.values():
+            for text in _iter_text(value):
+                yield text
+    elif isinstance(output, (list, tuple)):
+        for value in output:
+            for text in _iter_text(value):
+                yield text
+
+
+def get_task_ids(output):
+    """Return the UUIDs of the tasks found on ``output``, in order.
+
+    :param output: The output of a command run with ``--async``, either text,
+        a list of lines or parsed CSV.
+
+    """
+    task_ids = []
+    for text in _iter_text(output):
+        for task_id in TASK_ID_REGEX.findall(text):
+            if task_id not in task_ids:
+                task_ids.append(task_id)
+    return task_ids
 
 
 class Task(Base):
@@ -26,7 +62,7 @@ class Task(Base):
     command_base = 'task'
 
     @classmethod
-    def progress(cls, options=None):
+    def progress(cls, options=None, timeout=None):
         """Shows a task progress
 
         Usage::
@@ -37,7 +73,27 @@ class Task(Base):
             --name NAME                   Name to search by
         """
         cls.command_sub = 'progress'
-        return cls.execute(cls._construct_command(options))
+        return cls.execute(cls._construct_command(options), timeout=timeout)
+
+    @classmethod
+    def wait(cls, task_ids, timeout=None):
+        """Wait for the tasks with ``task_ids`` to finish.
+
+        ``hammer task progress`` returns once the task is finished, so
+        nothing is polled on the client side. It does not fail when the task
+        does, so the finished tasks are looked up to tell their result.
+
+        :param task_ids: UUIDs of the tasks, see :func:`get_task_ids`.
+        :param int timeout: Seconds to wait for the progress of each task.
+        :return: The information of each finished task, in order, its
+            ``result`` being one of ``success``, ``warning`` or ``error``.
+
+        """
+        infos = []
+        for task_id in task_ids:
+            cls.progress({u'id': task_id}, timeout=timeout)
+            infos.append(cls.info({u'id': task_id}))
+        return infos
 
     @classmethod
     def resume(cls, options=None):
@@ -225,6 +225,8 @@ class ClientsSettings(FeatureSettings):
         super(ClientsSettings, self).__init__(*args, **kwargs)
         self.image_dir = None
         self.provisioning_server = None
+        self.vm_pool_distros = None
+        self.vm_pool_size = None
 
     def read(self, reader):
         """Read clients settings."""
@@ -232,6 +234,9 @@ class ClientsSettings(FeatureSettings):
             'clients', 'image_dir', '/opt/robottelo/images')
         self.provisioning_server = reader.get(
             'clients', 'provisioning_server')
+        self.vm_pool_distros = reader.get(
+            'clients', 'vm_pool_distros', None, list)
+        self.vm_pool_size = reader.get('clients', 'vm_pool_size', 0, int)
 
     def validate(self):
         """Validate clients settings."""
@@ -535,6 +540,7 @@ class PerformanceSettings(FeatureSettings):
         self.sync_count = None
         self.sync_type = None
         self.repos = None
+        self.load_agents = None
 
     def read(self, reader):
         """Read performance settings."""
@@ -556,6 +562,8 @@ class PerformanceSettings(FeatureSettings):
             'performance', 'sync_type', 'sync')
         self.repos = reader.get(
             'performance', 'repos', cast=list)
+        self.load_agents = reader.get(
+            'performance', 'load_agents', [], list)
 
     def validate(self):
         """Validate performance settings."""
@@ -664,6 +672,15 @@ class Settings(object):
         self._configured = False
         self._validation_errors = []
         self.browser = None
+        self.cli_instrumentation = None
+        self.cli_instrumentation_csv = None
+        self.cli_instrumentation_jsonl = None
+        self.cli_json_output = None
+        self.cli_response_cache = None
+        self.cli_response_cache_size = None
+        self.cli_response_cache_ttl = None
+        self.fixture_cache = None
+        self.hammer_backend = None
         self.locale = None
         self.project = None
         self.reader = None
@@ -792,6 +809,23 @@ class Settings(object):
         )
         self.browser = self.reader.get(
             'robottelo', 'browser', 'selenium')
+        self.cli_instrumentation = self.reader.get(
+            'robottelo', 'cli_instrumentation', False, bool)
+        self.cli_instrumentation_csv = self.reader.get(
+            'robottelo', 'cli_instrumentation_csv')
+        self.cli_instrumentation_jsonl = self.reader.get(
+            'robottelo', 'cli_instrumentation_jsonl')
+        self.cli_json_output = self.reader.get(
+            'robottelo', 'cli_json_output', False, bool)
+        self.cli_response_cache = self.reader.get(
+            'robottelo', 'cli_response_cache', False, bool)
+        self.cli_response_cache_size = self.reader.get(
+            'robottelo', 'cli_response_cache_size', 1024, int)
+        self.cli_response_cache_ttl = self.reader.get(
+            'robottelo', 'cli_response_cache_ttl', 60, int)
+        self.fixture_cache = self.reader.get('robottelo', 'fixture_cache')
+        self.hammer_backend = self.reader.get(
+            'robottelo', 'hammer_backend', 'ssh')
         self.locale = self.reader.get('robottelo', 'locale', 'en_US.UTF-8')
         self.project = self.reader.get('robottelo', 'project', 'sat')
         self.rhel6_repo = self.reader.get('robottelo', 'rhel6_repo', None)
@@ -829,12 +863,18 @@ class Settings(object):
         """Validate Robottelo's general settings."""
         validation_errors = []
         browsers = ('selenium', 'docker', 'saucelabs')
+        hammer_backends = ('ssh', 'shell')
         webdrivers = ('chrome', 'firefox', 'ie', 'phantomjs', 'remote')
         if self.browser not in browsers:
             validation_errors.append(
                 '[robottelo] browser should be one of {0}.'
                 .format(', '.join(browsers))
             )
+        if self.hammer_backend not in hammer_backends:
+            validation_errors.append(
+                '[robottelo] hammer_backend should be one of {0}.'
+                .format(', '.join(hammer_backends))
+            )
         if self.webdriver not in webdrivers:
             validation_errors.append(
                 '[robottelo] webdriver should be one of {0}.'
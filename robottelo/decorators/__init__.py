@@ -1,12 +1,14 @@
 # -*- encoding: utf-8 -*-
 """Implements various decorators"""
 import bugzilla
+import json
 import logging
 import pytest
 import requests
 import unittest2
 
 from functools import wraps
+from robottelo import fixture_cache
 from robottelo.config import settings
 from robottelo.constants import BZ_OPEN_STATUSES, NOT_IMPLEMENTED
 from six.moves.xmlrpc_client import Fault
@@ -151,7 +153,14 @@ def stubbed(reason=None):
 
 
 def cacheable(func):
-    """Decorator that makes an optional object cache available"""
+    """Decorator that makes an optional object cache available
+
+    When called with ``cached=True`` the decorated factory returns the object
+    it built for the same options earlier in the process. When
+    ``fixture_cache`` is configured, the objects are also shared with the
+    other processes through :mod:`robottelo.fixture_cache`.
+
+    """
 
     @wraps(func)
     def cacheable_function(options=None, cached=False):
@@ -159,12 +168,24 @@ def cacheable(func):
         This is the function being returned.
         Requires input function's name start with 'make_'
         """
-        object_key = func.__name__.replace('make_', '')
-        if cached is True and object_key in OBJECT_CACHE:
+        if cached is not True:
+            return func(options)
+        kind = func.__name__.replace('make_', '')
+        object_key = kind
+        if options:
+            object_key = u'{0}:{1}'.format(
+                kind, json.dumps(options, sort_keys=True, default=str))
+        if object_key in OBJECT_CACHE:
             return OBJECT_CACHE[object_key]
-        new_object = func(options)
-        if cached is True:
-            OBJECT_CACHE[object_key] = new_object
+        store = fixture_cache.get_fixture_cache()
+        new_object = None
+        if store is not None:
+            new_object = store.get(kind, options)
+        if new_object is None:
+            new_object = func(options)
+            if store is not None:
+                store.put(kind, options, new_object)
+        OBJECT_CACHE[object_key] = new_object
         return new_object
 
     return cacheable_function
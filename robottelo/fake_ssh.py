@@ -0,0 +1,463 @@
+# -*- encoding: utf-8 -*-
+"""A local SSH server answering commands with canned responses.
+
+:class:`FakeSSHServer` runs a paramiko SSH server on localhost which answers
+each command with the first canned response whose pattern matches it. It
+lets the client side of :mod:`robottelo.ssh` and :mod:`robottelo.cli` be
+exercised and benchmarked without a Satellite server: connection pooling,
+batches, output parsing and the CLI classes all go through a real SSH
+transport, while the server time is fully controlled by a
+:class:`LatencyProfile`::
+
+    responses = fake_ssh.load_responses('tests/data/hammer.json')
+    with fake_ssh.FakeSSHServer(responses, profile='lan') as server:
+        with server.patch_ssh():
+            Org.list()
+
+Batches sent by :func:`robottelo.ssh.execute_batch` are understood, each
+command of the batch gets its own canned response. Other shell constructs,
+SFTP and ``hammer shell`` are not supported.
+
+"""
+import collections
+import io
+import json
+import logging
+import random
+import re
+import socket
+import struct
+import threading
+import time
+
+import paramiko
+import six
+from contextlib import contextmanager
+from paramiko.common import cMSG_CHANNEL_FAILURE, cMSG_CHANNEL_SUCCESS
+from robottelo import ssh
+
+logger = logging.getLogger(__name__)
+
+#: Return code of the commands matching no canned response, as ``sh`` does
+#: for unknown commands.
+UNKNOWN_COMMAND_RETURN_CODE = 127
+#: Size of the chunks the output is sent by, the bandwidth is throttled
+#: between chunks.
+CHUNK_SIZE = 32768
+
+#: A canned response: commands searched by the ``pattern`` regex get the
+#: ``stdout`` and ``stderr`` bytes and the ``return_code``.
+Response = collections.namedtuple(
+    'Response', ('pattern', 'stdout', 'stderr', 'return_code'))
+
+
+class LatencyProfile(collections.namedtuple('LatencyProfile', (
+        'connect_time', 'latency', 'command_time', 'bandwidth', 'jitter'))):
+    """How long the server takes to answer.
+
+    :param float connect_time: Seconds spent authenticating a connection.
+    :param float latency: Seconds before answering each channel, the round
+        trip time.
+    :param float command_time: Seconds spent running each command, a batch
+        takes this time for each of its commands.
+    :param float bandwidth: Bytes per second the output is sent at, ``None``
+        for no limit.
+    :param float jitter: Maximum fraction randomly added to or removed from
+        each wait. The random generator is seeded by the server, so runs are
+        reproducible.
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, connect_time=0.0, latency=0.0, command_time=0.0,
+                bandwidth=None, jitter=0.0):
+        return super(LatencyProfile, cls).__new__(
+            cls, connect_time, latency, command_time, bandwidth, jitter)
+
+
+#: Named latency profiles.
+PROFILES = {
+    'instant': LatencyProfile(),
+    'lan': LatencyProfile(
+        connect_time=0.05,
+        latency=0.001,
+        command_time=0.005,
+        bandwidth=100 * 1024 ** 2,
+    ),
+    'wan': LatencyProfile(
+        connect_time=0.3,
+        latency=0.05,
+        command_time=0.005,
+        bandwidth=1024 ** 2,
+    ),
+    'hammer': LatencyProfile(
+        connect_time=0.05,
+        latency=0.001,
+        command_time=1.5,
+        bandwidth=100 * 1024 ** 2,
+    ),
+}
+
+#: Matches the commands of a batch sent by ``robottelo.ssh.execute_batch``.
+_BATCH_COMMAND_REGEX = re.compile(
+    r"\( (?P<command>.*?)\n\)\n"
+    r"printf '\\n(?P<sentinel>robottelo-batch-\w+) %d\\n' \$\?\n"
+    r"printf '\\n(?P=sentinel)\\n' >&2",
+    re.DOTALL,
+)
+
+
+def _to_bytes(output):
+    """Encode a canned output, lists of lines are joined."""
+    if isinstance(output, (list, tuple)):
+        output = u''.join(u'{0}\n'.format(line) for line in output)
+    if isinstance(output, six.text_type):
+        output = output.encode('utf-8')
+    return output or b''
+
+
+def make_response(pattern, stdout=b'', stderr=b'', return_code=0):
+    """Build a :data:`Response`.
+
+    :param str pattern: The regex searched in the commands.
+    :param stdout: The standard output, text, bytes or a list of lines.
+    :param stderr: The standard error, text, bytes or a list of lines.
+    :param int return_code: The return code.
+
+    """
+    return Response(
+        re.compile(pattern), _to_bytes(stdout), _to_bytes(stderr), return_code)
+
+
+def load_responses(path):
+    """Load canned responses recorded on a JSON file.
+
+    The file holds a list of objects with a ``command`` regex and optional
+    ``stdout``, ``stderr`` and ``return_code``, the outputs being strings or
+    lists of lines::
+
+        [
+            {
+                "command": "hammer .*organization list",
+                "stdout": ["ID,Name", "1,Default Organization"]
+            }
+        ]
+
+    :return: A list of :data:`Response`.
+
+    """
+    with io.open(path, encoding='utf-8') as handler:
+        return [
+            make_response(
+                item['command'],
+                item.get('stdout', b''),
+                item.get('stderr', b''),
+                item.get('return_code', 0),
+            )
+            for item in json.load(handler)
+        ]
+
+
+class _Transport(paramiko.Transport):
+    """A server transport telling when a channel request has been answered.
+
+    The command of a channel can only be answered once paramiko has replied
+    to the exec request, otherwise the client could see the channel closed
+    before its request was accepted.
+
+    """
+
+    def __init__(self, sock):
+        super(_Transport, self).__init__(sock)
+        self._replies = collections.defaultdict(threading.Event)
+        self._replies_lock = threading.Lock()
+
+    def _reply_event(self, chanid):
+        with self._replies_lock:
+            return self._replies[chanid]
+
+    def _send_user_message(self, data):
+        super(_Transport, self)._send_user_message(data)
+        message = data.asbytes()
+        if message[:1] in (cMSG_CHANNEL_SUCCESS, cMSG_CHANNEL_FAILURE):
+            self._reply_event(struct.unpack('>I', message[1:5])[0]).set()
+
+    def wait_reply(self, channel, timeout=10):
+        """Wait until the request of ``channel`` is answered."""
+        event = self._reply_event(channel.remote_chanid)
+        event.wait(timeout)
+        with self._replies_lock:
+            self._replies.pop(channel.remote_chanid, None)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """Authenticate the clients and run their commands on the server."""
+
+    def __init__(self, server, transport):
+        self.server = server
+        self.transport = transport
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        self.server.wait(self.server.profile.connect_time)
+        if (username == self.server.username and
+                password == self.server.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        self.server.wait(self.server.profile.connect_time)
+        if username == self.server.username:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        thread = threading.Thread(
+            target=self.server.serve_command,
+            args=(self.transport, channel, ssh.decode_to_utf8(command)),
+        )
+        thread.daemon = True
+        thread.start()
+        return True
+
+
+class _FakeServerClient(paramiko.SSHClient):
+    """A ``paramiko.SSHClient`` connecting to a :class:`FakeSSHServer`
+    whatever the hostname and credentials are.
+
+    """
+
+    def __init__(self, server):
+        super(_FakeServerClient, self).__init__()
+        self.server = server
+
+    def connect(self, hostname, **kwargs):
+        sock = socket.create_connection(
+            (self.server.host, self.server.port), kwargs.get('timeout'))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super(_FakeServerClient, self).connect(
+            self.server.host,
+            port=self.server.port,
+            sock=sock,
+            username=self.server.username,
+            password=self.server.password,
+            timeout=kwargs.get('timeout'),
+            allow_agent=False,
+            look_for_keys=False,
+        )
+
+
+class FakeSSHServer(object):
+    """An SSH server on localhost answering commands with canned responses.
+
+    :param responses: A list of :data:`Response`, see :func:`make_response`
+        and :func:`load_responses`.
+    :param profile: A :class:`LatencyProfile` or the name of one of
+        ``PROFILES``. Defaults to no latency at all.
+    :param str username: The username accepted by the server.
+    :param str password: The password accepted by the server.
+    :param host_key: The server ``paramiko.PKey``. Defaults to a RSA key
+        generated once per process.
+    :param int seed: The seed of the jitter random generator.
+
+    """
+
+    _generated_host_key = None
+
+    def __init__(self, responses=(), profile=None, username='root',
+                 password='changeme', host_key=None, seed=0):
+        self.responses = list(responses)
+        if profile is None:
+            profile = PROFILES['instant']
+        elif isinstance(profile, six.string_types):
+            profile = PROFILES[profile]
+        self.profile = profile
+        self.username = username
+        self.password = password
+        self.host_key = host_key
+        self.host = '127.0.0.1'
+        self.port = None
+        #: The commands received, batches are split in their commands.
+        self.commands = []
+        #: The number of connections accepted.
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._socket = None
+        self._transports = []
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Listen on a free localhost port and serve in background."""
+        if self.host_key is None:
+            if FakeSSHServer._generated_host_key is None:
+                FakeSSHServer._generated_host_key = paramiko.RSAKey.generate(
+                    2048)
+            self.host_key = FakeSSHServer._generated_host_key
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, 0))
+        self._socket.listen(100)
+        # Wake up regularly to notice the server was stopped
+        self._socket.settimeout(0.1)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept_connections)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.debug('Fake SSH server listening on port %s', self.port)
+
+    def stop(self):
+        """Stop listening and close the connections."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+
+    def _accept_connections(self):
+        """Start a transport for each incoming connection."""
+        while True:
+            listening = self._socket
+            if listening is None:
+                return
+            try:
+                sock, _ = listening.accept()
+            except socket.timeout:
+                continue
+            except (socket.error, OSError):
+                return
+            sock.settimeout(None)
+            # Small packets are the norm, don't wait for delayed ACKs
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = _Transport(sock)
+            transport.add_server_key(self.host_key)
+            with self._lock:
+                self._transports.append(transport)
+                self.connections += 1
+            try:
+                transport.start_server(
+                    event=threading.Event(),
+                    server=_ServerInterface(self, transport),
+                )
+            except paramiko.SSHException as err:
+                logger.debug('Fake SSH server negotiation failed: %s', err)
+
+    def wait(self, seconds):
+        """Sleep for ``seconds`` plus or minus the profile jitter."""
+        if seconds <= 0:
+            return
+        if self.profile.jitter:
+            with self._lock:
+                seconds *= 1 + self._random.uniform(
+                    -self.profile.jitter, self.profile.jitter)
+        time.sleep(seconds)
+
+    def find_response(self, command):
+        """Return the ``(stdout, stderr, return_code)`` answering
+        ``command``.
+
+        """
+        with self._lock:
+            self.commands.append(command)
+        for response in self.responses:
+            if response.pattern.search(command):
+                return response.stdout, response.stderr, response.return_code
+        return (
+            b'',
+            u'sh: {0}: command not found\n'.format(command).encode('utf-8'),
+            UNKNOWN_COMMAND_RETURN_CODE,
+        )
+
+    def run_command(self, command):
+        """Answer ``command``, splitting the ``robottelo.ssh`` batches.
+
+        :return: A ``(stdout, stderr, return_code)`` tuple.
+
+        """
+        if command.startswith(u'sh -c '):
+            commands = list(_BATCH_COMMAND_REGEX.finditer(
+                _unquote(command[len(u'sh -c '):])))
+            if commands:
+                stdout = []
+                stderr = []
+                return_code = 0
+                for match in commands:
+                    self.wait(self.profile.command_time)
+                    out, err, return_code = self.find_response(
+                        match.group('command'))
+                    sentinel = match.group('sentinel').encode('utf-8')
+                    stdout.append(out)
+                    stdout.append(b'\n' + sentinel + u' {0}\n'.format(
+                        return_code).encode('utf-8'))
+                    stderr.append(err)
+                    stderr.append(b'\n' + sentinel + b'\n')
+                return b''.join(stdout), b''.join(stderr), 0
+        self.wait(self.profile.command_time)
+        return self.find_response(command)
+
+    def _send(self, send, data):
+        """Send ``data`` with ``send`` throttled to the profile bandwidth."""
+        for index in range(0, len(data), CHUNK_SIZE):
+            chunk = data[index:index + CHUNK_SIZE]
+            send(chunk)
+            if self.profile.bandwidth:
+                self.wait(len(chunk) / float(self.profile.bandwidth))
+
+    def serve_command(self, transport, channel, command):
+        """Answer the command of ``channel`` and close it."""
+        try:
+            transport.wait_reply(channel)
+            self.wait(self.profile.latency)
+            stdout, stderr, return_code = self.run_command(command)
+            self._send(channel.sendall_stderr, stderr)
+            self._send(channel.sendall, stdout)
+            channel.send_exit_status(return_code)
+        except ssh.CONNECTION_ERRORS as err:
+            logger.debug('Fake SSH server could not answer: %s', err)
+        finally:
+            channel.close()
+
+    @contextmanager
+    def patch_ssh(self):
+        """Make :mod:`robottelo.ssh` connect to this server.
+
+        Every connection opened by ``robottelo.ssh`` within the ``with``
+        block goes to this server, whatever the hostname and credentials.
+        The pooled connections are closed when entering and leaving the
+        block.
+
+        """
+        original = ssh._call_paramiko_sshclient
+        ssh.close_pooled_connections()
+        ssh._call_paramiko_sshclient = lambda: _FakeServerClient(self)
+        try:
+            yield self
+        finally:
+            ssh._call_paramiko_sshclient = original
+            ssh.close_pooled_connections()
+
+
+def _unquote(script):
+    """Undo the ``shlex_quote`` of a ``sh -c`` script."""
+    if script.startswith(u"'") and script.endswith(u"'"):
+        return script[1:-1].replace(u"'\"'\"'", u"'")
+    return script
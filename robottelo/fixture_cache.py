@@ -0,0 +1,292 @@
+# -*- encoding: utf-8 -*-
+"""Share the entities built by the ``make_*`` factories across test runs.
+
+Building some entities, like organizations with a manifest or synced
+repositories, is the most expensive part of setting up the tests. When
+``fixture_cache`` is set on the ``[robottelo]`` configuration section to the
+path of a sqlite database, the entities built by the factories decorated by
+:func:`robottelo.decorators.cacheable` and called with ``cached=True`` are
+stored on that database. They are then reused by the other test modules,
+pytest-xdist workers and test runs against the same server.
+
+The entities are keyed by the server hostname, the factory and the options
+given by the caller, so ``make_product({'organization-id': 1}, cached=True)``
+and ``make_product({'organization-id': 2}, cached=True)`` build two
+products. The options referencing other entities, like ``organization-id``
+or ``content-view-id``, are recorded as dependencies.
+
+Before being reused, a stored entity is checked to still exist on the server
+by the validator registered for its kind, see :func:`register_validator`.
+Entities which don't exist anymore are evicted along with every entity
+depending on them, and built again.
+
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from contextlib import closing
+from robottelo.config import settings
+
+LOGGER = logging.getLogger(__name__)
+
+#: Kinds of the entities referenced by the options not named after the
+#: factory building them, like ``organization-id`` for ``make_org``.
+DEPENDENCY_KINDS = {
+    'operatingsystem': 'os',
+    'organization': 'org',
+    'ptable': 'partition_table',
+}
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS fixtures ('
+    ' key TEXT PRIMARY KEY,'
+    ' kind TEXT NOT NULL,'
+    ' entity_id TEXT NOT NULL,'
+    ' entity TEXT NOT NULL,'
+    ' created REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS dependencies ('
+    ' key TEXT NOT NULL,'
+    ' kind TEXT NOT NULL,'
+    ' entity_id TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS dependencies_entity'
+    ' ON dependencies (kind, entity_id)',
+)
+
+# Validators of each entity kind, see register_validator
+_validators = {}
+# The cache configured by the fixture_cache setting, see get_fixture_cache
+_fixture_cache = None
+_fixture_cache_lock = threading.Lock()
+
+
+def register_validator(kind, validator):
+    """Register the function checking whether a stored entity still exists.
+
+    :param str kind: The entity kind, the name of its factory without the
+        ``make_`` prefix.
+    :param validator: A function called with the stored entity and the
+        options it was built with, returning whether it still exists.
+
+    """
+    _validators[kind] = validator
+
+
+def get_dependencies(options):
+    """Return the ``(kind, entity_id)`` of the entities referenced by
+    ``options``.
+
+    Options named ``<kind>-id`` or ``<kind>-ids`` reference entities of the
+    ``<kind>`` factory, with the dashes replaced by underscores and the
+    ``DEPENDENCY_KINDS`` aliases applied.
+
+    """
+    dependencies = set()
+    for name, value in (options or {}).items():
+        if value is None:
+            continue
+        if name.endswith('-ids'):
+            if isinstance(value, (list, tuple)):
+                entity_ids = value
+            else:
+                entity_ids = u'{0}'.format(value).split(',')
+            name = name[:-len('-ids')]
+        elif name.endswith('-id'):
+            entity_ids = [value]
+            name = name[:-len('-id')]
+        else:
+            continue
+        kind = DEPENDENCY_KINDS.get(name, name.replace('-', '_'))
+        for entity_id in entity_ids:
+            dependencies.add((kind, u'{0}'.format(entity_id).strip()))
+    return sorted(dependencies)
+
+
+class FixtureCache(object):
+    """Store the entities built by the factories on a sqlite database.
+
+    The database can be shared by several processes, sqlite takes care of
+    the locking.
+
+    :param str path: The path of the sqlite database, created if needed.
+    :param str server: The hostname of the server the entities live on.
+        Defaults to the configuration ``server.hostname``.
+
+    """
+
+    def __init__(self, path, server=None):
+        self.path = path
+        self.server = server or settings.server.hostname
+        # Keys validated by this process, they are not checked again
+        self._validated = set()
+        with self._connect() as connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+    def _connect(self):
+        """Return a new connection to the database, usable as a context
+        manager committing the changes made within it.
+
+        """
+        connection = sqlite3.connect(self.path, timeout=60)
+        return _Transaction(connection)
+
+    def key(self, kind, options):
+        """Return the key of the entity of ``kind`` built with
+        ``options``.
+
+        """
+        return json.dumps(
+            [self.server, kind, options or {}], sort_keys=True, default=str)
+
+    def get(self, kind, options):
+        """Return the stored entity of ``kind`` built with ``options``, or
+        ``None``.
+
+        The entity is checked to still exist by the validator of its kind the
+        first time it is returned by this process, if it doesn't it is
+        evicted and ``None`` is returned.
+
+        """
+        key = self.key(kind, options)
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT entity_id, entity FROM fixtures WHERE key = ?',
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        entity_id, entity = row[0], json.loads(row[1])
+        validator = _validators.get(kind)
+        if key not in self._validated and validator is not None:
+            if not validator(entity, options):
+                LOGGER.info(
+                    'Cached %s %s does not exist anymore', kind, entity_id)
+                self.evict(kind, entity_id)
+                return None
+            self._validated.add(key)
+        return entity
+
+    def put(self, kind, options, entity):
+        """Store the entity of ``kind`` built with ``options``.
+
+        Entities without ``id`` are not stored.
+
+        """
+        if not isinstance(entity, dict) or entity.get('id') is None:
+            return
+        key = self.key(kind, options)
+        with self._connect() as connection:
+            connection.execute(
+                'DELETE FROM dependencies WHERE key = ?', (key,))
+            connection.execute(
+                'INSERT OR REPLACE INTO fixtures VALUES (?, ?, ?, ?, ?)',
+                (
+                    key,
+                    kind,
+                    u'{0}'.format(entity['id']),
+                    json.dumps(entity),
+                    time.time(),
+                ),
+            )
+            connection.executemany(
+                'INSERT INTO dependencies VALUES (?, ?, ?)',
+                [
+                    (key, dependency_kind, dependency_id)
+                    for dependency_kind, dependency_id
+                    in get_dependencies(options)
+                ],
+            )
+        self._validated.add(key)
+
+    def evict(self, kind, entity_id):
+        """Drop the stored entity of ``kind`` with ``entity_id`` and every
+        entity depending on it, directly or not.
+
+        :return: The number of entities dropped.
+
+        """
+        evicted = 0
+        pending = [(kind, u'{0}'.format(entity_id))]
+        seen = set()
+        with self._connect() as connection:
+            while pending:
+                entity = pending.pop()
+                if entity in seen:
+                    continue
+                seen.add(entity)
+                keys = [
+                    row[0] for row in connection.execute(
+                        'SELECT key FROM fixtures'
+                        ' WHERE kind = ? AND entity_id = ?',
+                        entity,
+                    )
+                ]
+                keys.extend(
+                    row[0] for row in connection.execute(
+                        'SELECT key FROM dependencies'
+                        ' WHERE kind = ? AND entity_id = ?',
+                        entity,
+                    )
+                )
+                for key in set(keys):
+                    row = connection.execute(
+                        'SELECT kind, entity_id FROM fixtures WHERE key = ?',
+                        (key,),
+                    ).fetchone()
+                    if row is not None:
+                        pending.append((row[0], row[1]))
+                        evicted += 1
+                    connection.execute(
+                        'DELETE FROM fixtures WHERE key = ?', (key,))
+                    connection.execute(
+                        'DELETE FROM dependencies WHERE key = ?', (key,))
+                    self._validated.discard(key)
+        return evicted
+
+    def clear(self):
+        """Drop every stored entity."""
+        with self._connect() as connection:
+            connection.execute('DELETE FROM fixtures')
+            connection.execute('DELETE FROM dependencies')
+        self._validated.clear()
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT COUNT(*) FROM fixtures').fetchone()[0]
+
+
+class _Transaction(object):
+    """Commit the changes made on ``connection`` when leaving the ``with``
+    block, or roll them back on error, and close it.
+
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, *exc_info):
+        with closing(self.connection):
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+
+
+def get_fixture_cache():
+    """Return the fixture cache configured by the ``fixture_cache`` setting,
+    or ``None`` if it is not set.
+
+    """
+    global _fixture_cache  # pylint:disable=global-statement
+    if _fixture_cache is None and settings.fixture_cache:
+        with _fixture_cache_lock:
+            if _fixture_cache is None:
+                _fixture_cache = FixtureCache(settings.fixture_cache)
+    return _fixture_cache
@@ -7,6 +7,7 @@ import random
 import re
 import requests
 import six
+import time
 
 from tempfile import mkstemp
 from nailgun.config import ServerConfig
@@ -171,6 +172,33 @@ def update_dictionary(default, updates):
     return default
 
 
+def wait_for(condition, timeout, delay=1, max_delay=30, backoff=2,
+             jitter=0.25):
+    """Call ``condition`` until it returns a true value or ``timeout``
+    seconds elapsed.
+
+    The waits between the calls start at ``delay`` seconds and are multiplied
+    by ``backoff`` after each call, up to ``max_delay`` seconds. Each wait is
+    moved randomly by up to ``jitter`` times its length, so several callers
+    don't poll at the same time.
+
+    :return: The first true value returned by ``condition``, or ``None`` if
+        ``timeout`` elapsed before.
+
+    """
+    deadline = time.time() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        wait = delay * random.uniform(1 - jitter, 1 + jitter)
+        time.sleep(max(0, min(wait, remaining)))
+        delay = min(delay * backoff, max_delay)
+
+
 def get_data_file(filename):
     """Returns correct path of file from data folder."""
     path = os.path.realpath(
@@ -192,6 +220,19 @@ def read_data_file(filename):
         return file_contents.read()
 
 
+def get_katello_ca_commands():
+    """Return the commands installing the katello-ca rpm
+
+    :return: A tuple with the command downloading and installing the rpm
+        and the command checking it is installed.
+
+    """
+    return (
+        u'rpm -Uvh {0}'.format(settings.server.get_cert_rpm_url()),
+        u'rpm -q katello-ca-consumer-{0}'.format(settings.server.hostname),
+    )
+
+
 def install_katello_ca(hostname=None):
         """Downloads and installs katello-ca rpm
 
@@ -201,17 +242,11 @@ def install_katello_ca(hostname=None):
         :raises: AssertionError: If katello-ca wasn't installed.
 
         """
-        ssh.command(
-            u'rpm -Uvh {0}'.format(settings.server.get_cert_rpm_url()),
-            hostname
-        )
+        install_command, check_command = get_katello_ca_commands()
         # Not checking the return_code here, as rpm could be installed before
         # and installation may fail
-        result = ssh.command(
-            u'rpm -q katello-ca-consumer-{0}'
-            .format(settings.server.hostname),
-            hostname
-        )
+        ssh.command(install_command, hostname)
+        result = ssh.command(check_command, hostname)
         # Checking the return_code here to verify katello-ca rpm is actually
         # present in the system
         if result.return_code != 0:
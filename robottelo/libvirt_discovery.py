@@ -143,17 +143,13 @@ class LibvirtGuest(object):
         if not self._created:
             return
 
-        ssh.command(
-            u'virsh destroy {0}'.format(self.hostname),
-            hostname=self.libvirt_server
-        )
-        ssh.command(
-            u'virsh undefine {0}'.format(self.hostname),
-            hostname=self.libvirt_server
-        )
         image_name = u'{0}.img'.format(self.hostname)
-        ssh.command(
-            u'rm {0}'.format(os.path.join(self.image_dir, image_name)),
+        ssh.command_batch(
+            [
+                u'virsh destroy {0}'.format(self.hostname),
+                u'virsh undefine {0}'.format(self.hostname),
+                u'rm {0}'.format(os.path.join(self.image_dir, image_name)),
+            ],
             hostname=self.libvirt_server
         )
 
@@ -4,6 +4,13 @@ Part of functionalities of Candlepin are defined in this module
 and have utilities of single register by activation-key, single
 register and attach, single subscription deletion.
 
+The registrations can also be started at a fixed rate on a set of clients,
+see :meth:`Candlepin.open_loop_register_activation_key`, to measure the
+queueing delay a closed loop hides and find the rate Candlepin stops keeping
+up with, see :func:`robottelo.performance.load.find_saturation`. Failed
+registrations raise :class:`CandlepinError` there, so they are counted as
+errors instead of as successful calls.
+
 """
 import logging
 import requests
@@ -11,11 +18,36 @@ import time
 
 from robottelo import ssh
 from robottelo.config import settings
+from robottelo.performance.load import LoadEngine
+from six.moves import queue
 from six.moves.urllib.parse import urljoin
 
 LOGGER = logging.getLogger(__name__)
 
 
+class CandlepinError(Exception):
+    """Indicates that a subscription-manager command failed."""
+
+
+def _check_result(result, message, vm_ip, check):
+    """Log the outcome of a subscription-manager command.
+
+    :param result: The :class:`robottelo.ssh.SSHCommandResult` of the command.
+    :param str message: What failed, formatted with ``vm_ip``.
+    :param bool check: Whether to raise :class:`CandlepinError` on failure
+        instead of only logging it.
+    :return: Whether the command succeeded.
+
+    """
+    if result.return_code == 0:
+        return True
+    message = message.format(vm_ip)
+    LOGGER.error(message)
+    if check:
+        raise CandlepinError(u'{0}\n{1}'.format(message, result.stderr))
+    return False
+
+
 class Candlepin(object):
     """Measures performance of RH Satellite 6
 
@@ -37,8 +69,14 @@ class Candlepin(object):
         return float(real_time[0].split(' ')[1])
 
     @classmethod
-    def single_register_activation_key(cls, ak_name, default_org, vm_ip):
-        """Subscribe VM to Satellite by Register + ActivationKey"""
+    def single_register_activation_key(cls, ak_name, default_org, vm_ip,
+                                       check=False):
+        """Subscribe VM to Satellite by Register + ActivationKey
+
+        :param bool check: Whether to raise :class:`CandlepinError` if the
+            registration fails instead of returning its timing.
+
+        """
 
         # note: must create ssh keys for vm if running on local
         result = ssh.command('subscription-manager clean', hostname=vm_ip)
@@ -48,25 +86,98 @@ class Candlepin(object):
             hostname=vm_ip
         )
 
-        if result.return_code != 0:
-            LOGGER.error('Fail to subscribe {0} by ak!'.format(vm_ip))
-        else:
+        if _check_result(
+                result, 'Fail to subscribe {0} by ak!', vm_ip, check):
             LOGGER.info('Subscribe client {0} successfully'.format(vm_ip))
         return cls.get_real_time(result.stderr)
 
     @classmethod
-    def single_register_attach(cls, sub_id, default_org, environment, vm_ip):
-        """Subscribe VM to Satellite by Register + Attach"""
+    def open_loop_register_activation_key(
+            cls, ak_name, default_org, vm_ips, rate, count=None,
+            duration=None, ramp_up=0):
+        """Register clients by activation key ``rate`` times per second
+
+        See :meth:`open_loop` for the parameters.
+
+        """
+        return cls.open_loop(
+            lambda vm_ip: cls.single_register_activation_key(
+                ak_name, default_org, vm_ip, check=True),
+            vm_ips, rate, count, duration, ramp_up
+        )
+
+    @classmethod
+    def open_loop_register_attach(
+            cls, sub_id, default_org, environment, vm_ips, rate,
+            count=None, duration=None, ramp_up=0):
+        """Register and attach clients ``rate`` times per second
+
+        The value recorded for each call is the ``(register, attach)`` tuple
+        of timings. See :meth:`open_loop` for the parameters.
+
+        """
+        return cls.open_loop(
+            lambda vm_ip: cls.single_register_attach(
+                sub_id, default_org, environment, vm_ip, check=True),
+            vm_ips, rate, count, duration, ramp_up
+        )
+
+    @staticmethod
+    def open_loop(register, vm_ips, rate, count=None, duration=None,
+                  ramp_up=0):
+        """Run ``register`` on the clients ``rate`` times per second
+
+        Each registration is scheduled at a fixed rate, whether the previous
+        ones are finished or not, and runs on the next free client. A client
+        runs a single registration at a time, so when they are all busy the
+        next registration waits and the wait is recorded as its delay.
+
+        :param register: A function called with the client IP, raising if
+            the registration fails.
+        :param list vm_ips: The IPs of the clients.
+        :param rate: The number of registrations started each second.
+        :param int count: The number of registrations.
+        :param duration: Seconds during which the registrations are started.
+        :param ramp_up: Seconds over which the rate grows up to ``rate``.
+        :return: The :class:`robottelo.performance.load.LoadResults` of the
+            registrations.
+
+        """
+        clients = queue.Queue()
+        for vm_ip in vm_ips:
+            clients.put(vm_ip)
+
+        def scenario(worker, iteration):
+            vm_ip = clients.get()
+            try:
+                return register(vm_ip)
+            finally:
+                clients.put(vm_ip)
+
+        return LoadEngine(scenario, max_workers=len(vm_ips)).run_open(
+            rate, count, duration, ramp_up)
+
+    @classmethod
+    def single_register_attach(cls, sub_id, default_org, environment, vm_ip,
+                               check=False):
+        """Subscribe VM to Satellite by Register + Attach
+
+        :param bool check: Whether to raise :class:`CandlepinError` if the
+            registration or the attach fails instead of returning their
+            timings.
+
+        """
         ssh.command('subscription-manager clean', hostname=vm_ip)
 
         time_reg = cls.sub_mgr_register_authentication(
-            default_org, environment, vm_ip)
+            default_org, environment, vm_ip, check)
 
-        time_att = cls.sub_mgr_attach(sub_id, vm_ip)
+        time_att = cls.sub_mgr_attach(sub_id, vm_ip, check)
         return (time_reg, time_att)
 
     @classmethod
-    def sub_mgr_register_authentication(cls, default_org, environment, vm_ip):
+    def sub_mgr_register_authentication(cls, default_org, environment, vm_ip,
+                                        check=False):
         """subscription-manager register -u -p --org --environment"""
         result = ssh.command(
             'time -p subscription-manager register --username={0} '
@@ -82,25 +193,21 @@ class Candlepin(object):
             hostname=vm_ip
         )
 
-        if result.return_code != 0:
-            LOGGER.error(
-                'Fail to register client {0} by sub-mgr!'.format(vm_ip)
-            )
-        else:
+        if _check_result(
+                result, 'Fail to register client {0} by sub-mgr!', vm_ip,
+                check):
             LOGGER.info('Register client {0} successfully'.format(vm_ip))
         return cls.get_real_time(result.stderr)
 
     @classmethod
-    def sub_mgr_attach(cls, pool_id, vm_ip):
+    def sub_mgr_attach(cls, pool_id, vm_ip, check=False):
         """subscription-manager attach --pool=pool_id"""
         result = ssh.command(
             'time -p subscription-manager attach --pool={0}'.format(pool_id),
             hostname=vm_ip
         )
 
-        if result.return_code != 0:
-            LOGGER.error('Fail to attach client {0}'.format(vm_ip))
-        else:
+        if _check_result(result, 'Fail to attach client {0}', vm_ip, check):
             LOGGER.info('Attach client {0} successfully'.format(vm_ip))
         return cls.get_real_time(result.stderr)
 
@@ -129,3 +236,34 @@ class Candlepin(object):
         end = time.time()
         LOGGER.info('real  {0}s'.format(end-start))
         return end - start
+
+
+def _client(vm_ips, worker, iteration):
+    """Return the client of ``worker``, or of ``iteration`` on an open loop.
+    """
+    return vm_ips[(iteration if worker is None else worker) % len(vm_ips)]
+
+
+def register_activation_key_scenario(
+        worker, iteration, ak_name, default_org, vm_ips):
+    """Register a client by activation key, as a load scenario
+
+    Each worker registers its own client, see
+    :mod:`robottelo.performance.distributed`. The load generator host must be
+    able to reach the clients by ssh.
+
+    """
+    return Candlepin.single_register_activation_key(
+        ak_name, default_org, _client(vm_ips, worker, iteration))
+
+
+def register_attach_scenario(
+        worker, iteration, sub_id, default_org, environment, vm_ips):
+    """Register and attach a client, as a load scenario
+
+    See :func:`register_activation_key_scenario`.
+
+    """
+    return Candlepin.single_register_attach(
+        sub_id, default_org, environment,
+        _client(vm_ips, worker, iteration))
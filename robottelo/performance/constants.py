@@ -31,3 +31,8 @@ STAT_SYNC_FILE_NAME = 'perf-statistics-sync.csv'
 
 # parameters for number of threads/clients
 NUM_THREADS = '1,2,4,6,8,10'
+
+# parameters for open loop registrations: registrations per second to try
+# and seconds each rate is run
+OPEN_LOOP_RATES = (1, 2, 4, 6, 8, 12, 16, 24, 32)
+OPEN_LOOP_DURATION = 300
@@ -0,0 +1,579 @@
+"""Spread the load of a scenario over several load generator hosts.
+
+A :class:`LoadAgent` runs on each load generator host, listening on a TCP
+port, for instance with ``scripts/load_agent.py``. The
+:class:`LoadCoordinator`, running along with the tests, connects to every
+agent and:
+
+1. sends each one its share of the load: the scenario to run, as the import
+   path of a function, and its share of the workers or of the rate, see
+   :func:`split_load`;
+2. estimates the offset of each agent clock from its own, so the agents can
+   be given the same start time whatever their clock says;
+3. once every agent is ready, sends them the shared start time;
+4. merges the calls streamed back by the agents while they run, on a single
+   :class:`robottelo.performance.load.LoadResults` using the coordinator
+   clock and the global worker and request numbers.
+
+The messages are JSON objects, one per line. The agents only run the
+scenarios listed on ``SCENARIOS``, or the ones they are given, anything else
+is rejected before being imported. They must still only listen on trusted
+networks.
+
+Agents can be started on localhost to test a scenario::
+
+    agents = [LoadAgent(), LoadAgent()]
+    for agent in agents:
+        agent.start()
+    coordinator = LoadCoordinator([agent.address for agent in agents])
+    results = coordinator.run_closed(
+        'robottelo.performance.candlepin:register_activation_key_scenario',
+        workers=10, iterations=500,
+        args={'ak_name': 'ak', 'default_org': 'org', 'vm_ips': vm_list},
+    )
+
+"""
+import functools
+import importlib
+import json
+import logging
+import socket
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+from robottelo.performance.load import (
+    LoadEngine,
+    LoadResults,
+    open_loop_arrivals,
+)
+from six.moves import socketserver
+
+LOGGER = logging.getLogger(__name__)
+
+#: Import paths of the scenarios the agents run by default.
+SCENARIOS = frozenset((
+    'robottelo.performance.candlepin:register_activation_key_scenario',
+    'robottelo.performance.candlepin:register_attach_scenario',
+))
+
+#: Seconds between two batches of calls streamed by an agent.
+STREAM_INTERVAL = 0.5
+
+
+class DistributedLoadError(Exception):
+    """Indicates an agent could not run its share of the load."""
+
+
+def split_load(total, parts):
+    """Split ``total`` in ``parts`` integers as even as possible, the first
+    ones being the largest.
+
+    """
+    share, remainder = divmod(total, parts)
+    return [share + (1 if part < remainder else 0) for part in range(parts)]
+
+
+def load_scenario(path, args=None, scenarios=SCENARIOS):
+    """Return the scenario function at ``path``.
+
+    :param str path: The import path of the function, as ``module:function``.
+    :param dict args: The keyword arguments the function is called with,
+        besides the worker and the iteration.
+    :param scenarios: The import paths of the functions which can be run.
+    :raises DistributedLoadError: If the function is not one of
+        ``scenarios`` or can't be imported.
+
+    """
+    if path not in scenarios:
+        raise DistributedLoadError(
+            u'Scenario {0} is not one of the allowed scenarios'.format(path))
+    module_name, _, name = path.partition(':')
+    try:
+        function = getattr(importlib.import_module(module_name), name)
+    except (AttributeError, ImportError, ValueError) as err:
+        raise DistributedLoadError(
+            u'Cannot import scenario {0}: {1}'.format(path, err))
+    if args:
+        function = functools.partial(function, **args)
+    return function
+
+
+def _send(writer, message, lock=None):
+    """Write ``message`` as a JSON line and flush it."""
+    line = (json.dumps(message, default=repr) + '\n').encode('utf-8')
+    if lock is None:
+        writer.write(line)
+        writer.flush()
+        return
+    with lock:
+        writer.write(line)
+        writer.flush()
+
+
+def _receive(reader):
+    """Read a JSON line, ``None`` once the connection is closed."""
+    line = reader.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+class _StreamingResults(LoadResults):
+    """Record the calls of an agent and stream them to the coordinator.
+
+    The worker and request numbers are translated to the global ones before
+    being sent, see :meth:`LoadAgent.run`.
+
+    """
+
+    def __init__(self, capacity, stream):
+        super(_StreamingResults, self).__init__(capacity)
+        self.stream = stream
+
+    def record(self, worker, iteration, scheduled, started, duration,
+               value=None, error=None):
+        index = super(_StreamingResults, self).record(
+            worker, iteration, scheduled, started, duration, value, error)
+        self.stream.add(
+            [worker, iteration, scheduled, started, duration, value, error])
+        return index
+
+
+class _Stream(object):
+    """Send the recorded calls in batches, every ``STREAM_INTERVAL``."""
+
+    def __init__(self, writer, lock, worker_offset, iteration_offset,
+                 iteration_step):
+        self.writer = writer
+        self.lock = lock
+        self.worker_offset = worker_offset
+        self.iteration_offset = iteration_offset
+        self.iteration_step = iteration_step
+        self._records = []
+        self._records_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def add(self, record):
+        """Queue a call, given as the :meth:`LoadResults.record` arguments."""
+        if record[0] is not None:
+            record[0] += self.worker_offset
+        record[1] = self.iteration_offset + record[1] * self.iteration_step
+        with self._records_lock:
+            self._records.append(record)
+
+    def flush(self):
+        """Send the queued calls."""
+        with self._records_lock:
+            records, self._records = self._records, []
+        if records:
+            _send(
+                self.writer, {'type': 'records', 'records': records},
+                self.lock)
+
+    def _run(self):
+        while not self._stopped.wait(STREAM_INTERVAL):
+            self.flush()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    """Run the load asked by a coordinator connection."""
+
+    def handle(self):
+        lock = threading.Lock()
+        plan = scenario = None
+        while True:
+            try:
+                message = _receive(self.rfile)
+            except ValueError as err:
+                _send(self.wfile, {'type': 'error', 'message': str(err)}, lock)
+                return
+            if message is None:
+                return
+            kind = message.get('type')
+            if kind == 'ping':
+                _send(self.wfile, {'type': 'pong', 'time': time.time()}, lock)
+            elif kind == 'prepare':
+                try:
+                    scenario = load_scenario(
+                        message['scenario'],
+                        message.get('args'),
+                        self.server.scenarios,
+                    )
+                except DistributedLoadError as err:
+                    _send(
+                        self.wfile,
+                        {'type': 'error', 'message': u'{0}'.format(err)},
+                        lock,
+                    )
+                    continue
+                plan = message
+                _send(self.wfile, {'type': 'ready'}, lock)
+            elif kind == 'start' and scenario is not None:
+                try:
+                    self.server.agent.run(
+                        scenario, plan, message['at'], self.wfile, lock)
+                except Exception as err:  # pylint:disable=broad-except
+                    LOGGER.exception(u'Agent failed to run %s', plan)
+                    _send(
+                        self.wfile,
+                        {'type': 'error',
+                         'message': u'{0}: {1}'.format(
+                             type(err).__name__, err)},
+                        lock,
+                    )
+                plan = scenario = None
+            else:
+                _send(
+                    self.wfile,
+                    {'type': 'error',
+                     'message': u'Unexpected message {0}'.format(kind)},
+                    lock,
+                )
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """The TCP server of a :class:`LoadAgent`."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class LoadAgent(object):
+    """Run the share of the load a :class:`LoadCoordinator` sends.
+
+    :param str host: The address to listen on.
+    :param int port: The port to listen on, a free one by default.
+    :param scenarios: The import paths of the scenarios the agent runs.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0,
+                 scenarios=SCENARIOS):
+        self.server = _AgentServer((host, port), _AgentHandler)
+        self.server.agent = self
+        self.server.scenarios = frozenset(scenarios)
+        self._thread = None
+
+    @property
+    def address(self):
+        """The ``host:port`` the agent listens on."""
+        host, port = self.server.server_address[:2]
+        return u'{0}:{1}'.format(host, port)
+
+    def run(self, scenario, plan, start_at, writer, lock):
+        """Run ``scenario`` following ``plan`` from the ``start_at``
+        timestamp, streaming the calls to ``writer``.
+
+        The plan is the ``prepare`` message sent by the coordinator, see
+        :meth:`LoadCoordinator.run_closed` and
+        :meth:`LoadCoordinator.run_open`.
+
+        """
+        stream = _Stream(
+            writer,
+            lock,
+            plan.get('worker_offset', 0),
+            plan.get('iteration_offset', 0),
+            plan.get('iteration_step', 1),
+        )
+        engine = LoadEngine(
+            scenario,
+            executor=plan.get('executor', 'thread'),
+            max_workers=plan.get('max_workers'),
+            results_class=lambda capacity: _StreamingResults(
+                capacity, stream),
+        )
+        LOGGER.info(u'Agent %s starting %s', self.address, plan['scenario'])
+        # Wait for the shared start time, which is set in the agent clock
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        with stream:
+            if plan['mode'] == 'open':
+                results = engine.run_open(
+                    plan['rate'], plan.get('requests'), plan.get('duration'),
+                    plan.get('ramp_up', 0))
+            else:
+                results = engine.run_closed(
+                    plan['workers'], plan['iterations'],
+                    plan.get('ramp_up', 0))
+        _send(writer, {'type': 'done', 'summary': results.summary()}, lock)
+
+    def serve_forever(self):
+        """Handle the coordinators connections until :meth:`close` is
+        called.
+
+        """
+        LOGGER.info(u'Load agent listening on %s', self.address)
+        self.server.serve_forever()
+
+    def start(self):
+        """Handle the coordinators connections on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop handling connections."""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+
+class _AgentConnection(object):
+    """A coordinator connection to an agent."""
+
+    def __init__(self, address, timeout):
+        self.address = address
+        host, _, port = address.rpartition(':')
+        self.socket = socket.create_connection((host, int(port)), timeout)
+        self.reader = self.socket.makefile('rb')
+        self.writer = self.socket.makefile('wb')
+        self.offset = 0
+
+    def send(self, message):
+        """Send ``message`` to the agent."""
+        _send(self.writer, message)
+
+    def receive(self, expected):
+        """Return the next message, which must be of the ``expected`` type.
+
+        :raises DistributedLoadError: If the agent reports an error or
+            closes the connection.
+
+        """
+        try:
+            message = _receive(self.reader)
+        except (socket.error, ValueError) as err:
+            raise DistributedLoadError(
+                u'Agent {0} failed: {1}'.format(self.address, err))
+        if message is None:
+            raise DistributedLoadError(
+                u'Agent {0} closed the connection'.format(self.address))
+        if message.get('type') == 'error':
+            raise DistributedLoadError(
+                u'Agent {0} failed: {1}'
+                .format(self.address, message.get('message')))
+        if message.get('type') not in expected:
+            raise DistributedLoadError(
+                u'Agent {0} sent an unexpected {1} message'
+                .format(self.address, message.get('type')))
+        return message
+
+    def synchronize(self, pings=5):
+        """Estimate the offset of the agent clock from the coordinator one.
+
+        The offset is taken from the ping with the shortest round trip,
+        assuming the agent read its clock halfway.
+
+        """
+        best = None
+        for _ in range(pings):
+            sent = time.time()
+            self.send({'type': 'ping'})
+            agent_time = self.receive(('pong',))['time']
+            received = time.time()
+            if best is None or received - sent < best[0]:
+                best = (received - sent, agent_time - (sent + received) / 2)
+        self.offset = best[1]
+        return self.offset
+
+    def prepare(self, plan):
+        """Send the agent its plan and wait for it to be ready."""
+        self.synchronize()
+        self.send(dict(plan, type='prepare'))
+        self.receive(('ready',))
+
+    def collect(self, results):
+        """Record the calls streamed by the agent until it is done, in the
+        coordinator clock.
+
+        :return: The summary of the agent calls.
+
+        """
+        while True:
+            message = self.receive(('records', 'done'))
+            if message['type'] == 'done':
+                return message['summary']
+            for (worker, iteration, scheduled, started, duration, value,
+                 error) in message['records']:
+                results.record(
+                    worker, iteration, scheduled - self.offset,
+                    started - self.offset, duration, value, error)
+
+    def close(self):
+        """Close the connection."""
+        for handle in (self.reader, self.writer, self.socket):
+            try:
+                handle.close()
+            except socket.error:
+                pass
+
+
+class LoadCoordinator(object):
+    """Split the load of a scenario between :class:`LoadAgent` instances and
+    merge the calls they record.
+
+    :param agents: The ``host:port`` of the agents.
+    :param timeout: Seconds to wait for an agent to answer, ``None`` to wait
+        forever. The agents send the calls they recorded every
+        ``STREAM_INTERVAL``, so it only has to cover the longest call when
+        the load is running.
+    :param start_delay: Seconds between the time every agent is ready and the
+        shared start time, it has to cover the time to send the start time to
+        every agent.
+
+    """
+
+    def __init__(self, agents, timeout=None, start_delay=1):
+        if not agents:
+            raise ValueError(u'At least one agent is needed')
+        self.agents = list(agents)
+        self.timeout = timeout
+        self.start_delay = start_delay
+        #: The summary of the calls of each agent on the last run.
+        self.agent_summaries = {}
+
+    def _run(self, scenario, plans, capacity, staggers):
+        """Run ``plans`` on the agents, starting each one ``staggers``
+        seconds after the shared start time, and merge their calls.
+
+        """
+        pool = ThreadPool(len(self.agents))
+        connections = []
+        try:
+            connections = pool.map(
+                lambda address: _AgentConnection(address, self.timeout),
+                self.agents,
+            )
+            pool.map(
+                lambda args: args[0].prepare(dict(args[1], scenario=scenario)),
+                zip(connections, plans),
+            )
+            # Every agent is ready: they all start at the same time, set in
+            # their own clock
+            start_at = time.time() + self.start_delay
+            for connection, stagger in zip(connections, staggers):
+                connection.send({
+                    'type': 'start',
+                    'at': start_at + stagger + connection.offset,
+                })
+            results = LoadResults(capacity)
+            summaries = pool.map(
+                lambda connection: connection.collect(results), connections)
+        except socket.error as err:
+            raise DistributedLoadError(
+                u'Cannot reach an agent: {0}'.format(err))
+        finally:
+            for connection in connections:
+                connection.close()
+            pool.close()
+            pool.join()
+        self.agent_summaries = dict(zip(self.agents, summaries))
+        LOGGER.info(u'Distributed load results: %s', results.summary())
+        return results
+
+    def run_closed(self, scenario, workers, iterations, args=None,
+                   ramp_up=0, executor='thread'):
+        """Run a closed loop of ``workers`` workers, spread over the agents.
+
+        The workers are numbered globally: the first agent runs the workers
+        0 to N, the second one N + 1 to 2N...
+
+        :param str scenario: The import path of the scenario function, as
+            ``module:function``, one of the agents scenarios. It is called
+            with the worker number, the iteration number and ``args`` as
+            keyword arguments.
+        :param int workers: The total number of workers.
+        :param int iterations: The number of calls of each worker.
+        :param dict args: The JSON serializable keyword arguments of the
+            scenario.
+        :param ramp_up: Seconds over which each agent starts its workers.
+        :param str executor: The executor the agents run the scenario on.
+        :return: The :class:`robottelo.performance.load.LoadResults` of all
+            the calls, in the coordinator clock.
+        :raises DistributedLoadError: If any agent failed.
+
+        """
+        plans = []
+        worker_offset = 0
+        for agent_workers in split_load(workers, len(self.agents)):
+            plans.append({
+                'mode': 'closed',
+                'workers': agent_workers,
+                'iterations': iterations,
+                'ramp_up': ramp_up,
+                'executor': executor,
+                'args': args,
+                'worker_offset': worker_offset,
+            })
+            worker_offset += agent_workers
+        return self._run(
+            scenario, plans, workers * iterations, [0] * len(self.agents))
+
+    def run_open(self, scenario, rate, requests=None, duration=None,
+                 args=None, ramp_up=0, executor='thread', max_workers=None):
+        """Start the scenario ``rate`` times per second, spread over the
+        agents.
+
+        Each agent starts ``rate / agents`` calls per second, shifted so the
+        calls of the agents interleave. The requests are numbered globally,
+        in the order they are scheduled.
+
+        :param str scenario: The import path of the scenario function, as
+            ``module:function``, one of the agents scenarios. It is called
+            with ``None`` as worker, the request number and ``args`` as
+            keyword arguments.
+        :param rate: The total number of calls started each second.
+        :param int requests: The total number of calls to start.
+        :param duration: Seconds during which the calls are started.
+        :param dict args: The JSON serializable keyword arguments of the
+            scenario.
+        :param ramp_up: Seconds over which the rate grows up to ``rate``.
+        :param str executor: The executor the agents run the scenario on.
+        :param int max_workers: Maximum number of concurrent calls on each
+            agent.
+        :return: The :class:`robottelo.performance.load.LoadResults` of all
+            the calls, in the coordinator clock.
+        :raises DistributedLoadError: If any agent failed.
+        :raises ValueError: If neither ``requests`` nor ``duration`` is given,
+            or the rate is not positive.
+
+        """
+        count = len(self.agents)
+        shares = split_load(
+            len(open_loop_arrivals(rate, requests, duration, ramp_up)), count)
+        plans = [
+            {
+                'mode': 'open',
+                'rate': rate / float(count),
+                'requests': share,
+                'ramp_up': ramp_up,
+                'executor': executor,
+                'max_workers': max_workers,
+                'args': args,
+                'iteration_offset': agent,
+                'iteration_step': count,
+            }
+            for agent, share in enumerate(shares)
+        ]
+        return self._run(
+            scenario,
+            plans,
+            sum(shares),
+            [agent / float(rate) for agent in range(count)],
+        )
@@ -0,0 +1,734 @@
+"""Generate load against the server by running a scenario concurrently.
+
+A scenario is any callable taking the worker number and the iteration number,
+like ``Candlepin.single_register_activation_key`` wrapped on a ``lambda``.
+The :class:`LoadEngine` calls it following one of two models:
+
+closed loop
+    ``workers`` workers run the scenario ``iterations`` times each, one call
+    after the other. The load depends on how fast the server answers.
+
+open loop
+    The scenario is started ``rate`` times per second, whether the previous
+    calls are finished or not. The load doesn't depend on the server, and the
+    time a call waited for a free worker is recorded along with its duration.
+
+Both models can ramp the load up: the closed loop workers are started one
+after the other over ``ramp_up`` seconds, and the open loop rate grows
+linearly from zero to ``rate`` over ``ramp_up`` seconds.
+
+The scenario can run on threads, processes or an asyncio event loop, see
+``EXECUTORS``, and every call is recorded on :class:`LoadResults`::
+
+    engine = LoadEngine(
+        lambda worker, iteration: Candlepin.single_register_activation_key(
+            ak_name, org, vm_list[worker]),
+    )
+    results = engine.run_closed(workers=10, iterations=500, ramp_up=5)
+    time_result_dict = results.by_worker()
+
+:class:`LoadResults` keeps every call, which grows with the number of calls.
+Soak tests running millions of calls can count them on histograms instead,
+using constant memory, with ``LoadEngine(scenario,
+results_class=HistogramResults)``.
+
+"""
+import logging
+import math
+import multiprocessing
+import numbers
+import threading
+import time
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from robottelo.performance.stat import HdrHistogram
+from robottelo.ssh import _create_future, _ensure_future
+
+try:
+    import asyncio
+except ImportError:
+    # Python 2 has no asyncio, only the thread and process executors are
+    # available there.
+    asyncio = None
+
+LOGGER = logging.getLogger(__name__)
+
+#: Default number of concurrent calls of the open loop model.
+DEFAULT_OPEN_LOOP_WORKERS = 32
+
+
+class LoadResults(object):
+    """Store the outcome of every call of a scenario.
+
+    The slots are allocated up front, one for each planned call, and each
+    call takes the next free one, so the results can be recorded from many
+    threads at the same time without growing shared lists.
+
+    :param int capacity: The number of calls planned.
+
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        #: Worker of each call, ``None`` on the open loop model.
+        self.workers = [None] * capacity
+        #: Iteration of each call, the request number on the open loop model.
+        self.iterations = [None] * capacity
+        #: Time each call was planned to start at.
+        self.scheduled = [None] * capacity
+        #: Time each call actually started at.
+        self.started = [None] * capacity
+        #: Seconds spent on each call.
+        self.durations = [None] * capacity
+        #: Value returned by the scenario on each call.
+        self.values = [None] * capacity
+        #: Error raised by the scenario on each call, as text.
+        self.errors = [None] * capacity
+        self.first_started = None
+        self.last_finished = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, worker, iteration, scheduled, started, duration,
+               value=None, error=None):
+        """Record a call on the next free slot and return its index.
+
+        :raises IndexError: If every slot is taken.
+
+        """
+        finished = started + duration
+        with self._lock:
+            index = self._count
+            if index >= self.capacity:
+                raise IndexError(
+                    u'All the {0} slots are taken'.format(self.capacity))
+            self._count += 1
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            if self.last_finished is None or finished > self.last_finished:
+                self.last_finished = finished
+        self.workers[index] = worker
+        self.iterations[index] = iteration
+        self.scheduled[index] = scheduled
+        self.started[index] = started
+        self.durations[index] = duration
+        self.values[index] = value
+        self.errors[index] = error
+        return index
+
+    def add(self, record):
+        """Record a call given as a tuple of the :meth:`record` arguments."""
+        return self.record(*record)
+
+    def __len__(self):
+        return self._count
+
+    def latency(self, index):
+        """Return the latency of the call at ``index``.
+
+        That is the value returned by the scenario if it is a number, like
+        the ``real`` time measured by ``time -p`` on a client, otherwise the
+        seconds the call took.
+
+        """
+        return _latency(self.values[index], self.durations[index])
+
+    def failures(self):
+        """Return the indexes of the failed calls."""
+        return [
+            index for index in range(len(self))
+            if self.errors[index] is not None
+        ]
+
+    def latencies(self):
+        """Return the latencies of the successful calls, in the order they
+        were recorded.
+
+        """
+        return [
+            self.latency(index) for index in range(len(self))
+            if self.errors[index] is None
+        ]
+
+    def delays(self):
+        """Return the seconds each call started after it was scheduled to,
+        in the order they were recorded.
+
+        On the open loop model, that is the time a call queued waiting for a
+        free worker, which a closed loop hides.
+
+        """
+        return [
+            self.started[index] - self.scheduled[index]
+            for index in range(len(self))
+        ]
+
+    def response_times(self):
+        """Return the seconds between the scheduled start and the end of
+        each successful call, in the order they were recorded.
+
+        Unlike :meth:`latencies`, they count the time spent waiting for a free
+        worker, so they are not subject to coordinated omission.
+
+        """
+        return [
+            self.started[index] - self.scheduled[index]
+            + self.durations[index]
+            for index in range(len(self))
+            if self.errors[index] is None
+        ]
+
+    def by_worker(self, value=None):
+        """Return the latencies of the successful calls of each worker,
+        ordered by iteration.
+
+        The dictionary is keyed by ``thread-<worker>``, like the time result
+        dictionaries taken by the ``ConcurrentTestCase`` statistics helpers.
+
+        :param value: A function called with the value returned by the
+            scenario, returning what to keep instead of the latency.
+
+        """
+        calls = sorted(
+            (self.workers[index], self.iterations[index], index)
+            for index in range(len(self))
+            if self.errors[index] is None and self.workers[index] is not None
+        )
+        grouped = OrderedDict()
+        for worker in sorted(set(
+                worker for worker in self.workers[:len(self)]
+                if worker is not None)):
+            grouped['thread-{0}'.format(worker)] = []
+        for worker, _, index in calls:
+            grouped['thread-{0}'.format(worker)].append(
+                self.latency(index) if value is None
+                else value(self.values[index])
+            )
+        return grouped
+
+    def summary(self):
+        """Return a dict with the number of calls and errors, the throughput
+        of successful calls, the min, mean, p50, p90, p99 and max latencies,
+        and the p50, p99 and max delays and response times.
+
+        The elapsed time starts when the first call was scheduled to start,
+        so a server falling behind an open loop lowers the throughput.
+
+        """
+        latencies = sorted(self.latencies())
+        elapsed = None
+        if len(self):
+            first = min(
+                min(self.scheduled[:len(self)]), self.first_started)
+            elapsed = self.last_finished - first
+        summary = {
+            'count': len(self),
+            'errors': len(self.failures()),
+            'elapsed': elapsed,
+            'throughput': (
+                len(latencies) / elapsed if elapsed else None),
+        }
+        for name, values in (
+                ('', latencies),
+                ('delay_', sorted(self.delays())),
+                ('response_', sorted(self.response_times()))):
+            for key in ('min', 'mean', 'p50', 'p90', 'p99', 'max'):
+                summary[name + key] = None
+            if values:
+                summary.update({
+                    name + 'min': values[0],
+                    name + 'mean': sum(values) / float(len(values)),
+                    name + 'p50': _percentile(values, 50),
+                    name + 'p90': _percentile(values, 90),
+                    name + 'p99': _percentile(values, 99),
+                    name + 'max': values[-1],
+                })
+        return summary
+
+
+class HistogramResults(object):
+    """Count the outcome of the calls of a scenario on histograms.
+
+    Works like :class:`LoadResults` but only the latency, delay and response
+    time of the calls are kept, counted on :class:`HdrHistogram`, so the
+    memory used does not depend on the number of calls. The values returned
+    by the scenario are dropped and the errors are counted by message.
+
+    :param int capacity: The number of calls planned.
+
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        #: The latencies of the successful calls of each worker, keyed by
+        #: ``thread-<worker>``.
+        self.worker_histograms = OrderedDict()
+        self.latency_histogram = HdrHistogram()
+        self.delay_histogram = HdrHistogram()
+        self.response_histogram = HdrHistogram()
+        #: The number of failed calls for each error.
+        self.errors = {}
+        self.first_scheduled = None
+        self.first_started = None
+        self.last_finished = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, worker, iteration, scheduled, started, duration,
+               value=None, error=None):
+        """Count a call, see :meth:`LoadResults.record`.
+
+        :raises IndexError: If every planned call is already counted.
+
+        """
+        finished = started + duration
+        delay = max(started - scheduled, 0)
+        name = None if worker is None else 'thread-{0}'.format(worker)
+        with self._lock:
+            if self._count >= self.capacity:
+                raise IndexError(
+                    u'All the {0} calls are counted'.format(self.capacity))
+            self._count += 1
+            if (self.first_scheduled is None or
+                    scheduled < self.first_scheduled):
+                self.first_scheduled = scheduled
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            if self.last_finished is None or finished > self.last_finished:
+                self.last_finished = finished
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            elif name is not None:
+                if name not in self.worker_histograms:
+                    self.worker_histograms[name] = HdrHistogram()
+        self.delay_histogram.record(delay)
+        if error is None:
+            latency = _latency(value, duration)
+            self.latency_histogram.record(latency)
+            self.response_histogram.record(delay + duration)
+            if name is not None:
+                self.worker_histograms[name].record(latency)
+        return self._count - 1
+
+    def add(self, record):
+        """Count a call given as a tuple of the :meth:`record` arguments."""
+        return self.record(*record)
+
+    def __len__(self):
+        return self._count
+
+    def summary(self):
+        """Return the same dict as :meth:`LoadResults.summary`, the
+        percentiles being accurate to 3 significant digits.
+
+        """
+        errors = sum(self.errors.values())
+        elapsed = None
+        if len(self):
+            elapsed = self.last_finished - min(
+                self.first_scheduled, self.first_started)
+        summary = {
+            'count': len(self),
+            'errors': errors,
+            'elapsed': elapsed,
+            'throughput': (
+                (len(self) - errors) / elapsed if elapsed else None),
+        }
+        for name, histogram in (
+                ('', self.latency_histogram),
+                ('delay_', self.delay_histogram),
+                ('response_', self.response_histogram)):
+            histogram_summary = histogram.summary()
+            for key in ('min', 'mean', 'p50', 'p90', 'p99', 'max'):
+                summary[name + key] = histogram_summary[key]
+        return summary
+
+
+def _latency(value, duration):
+    """Return the value returned by the scenario if it is a number,
+    otherwise the ``duration`` of the call, see :meth:`LoadResults.latency`.
+
+    """
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return value
+    return duration
+
+
+def _percentile(values, percent):
+    """Return the ``percent`` percentile of the sorted ``values``, using the
+    nearest rank.
+
+    """
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def closed_loop_starts(workers, ramp_up=0):
+    """Return the offset, in seconds, each of the ``workers`` starts at when
+    they are started one after the other over ``ramp_up`` seconds.
+
+    """
+    return [ramp_up * worker / float(workers) for worker in range(workers)]
+
+
+def open_loop_arrivals(rate, requests=None, duration=None, ramp_up=0):
+    """Return the offset, in seconds, each request starts at when they are
+    started ``rate`` times per second.
+
+    The rate grows linearly from zero to ``rate`` over the first ``ramp_up``
+    seconds. At least one of ``requests`` or ``duration`` must be given,
+    the arrivals stop at whichever limit comes first.
+
+    :raises ValueError: If neither ``requests`` nor ``duration`` is given, or
+        the rate is not positive.
+
+    """
+    if rate <= 0:
+        raise ValueError(u'The rate must be positive, got {0}'.format(rate))
+    if requests is None and duration is None:
+        raise ValueError(u'Either requests or duration must be given')
+    # Number of requests started during the ramp up
+    ramp_requests = rate * ramp_up / 2.0
+    arrivals = []
+    while requests is None or len(arrivals) < requests:
+        number = len(arrivals)
+        if number < ramp_requests:
+            # The ramp up starts rate * t ** 2 / (2 * ramp_up) requests by t
+            offset = math.sqrt(2.0 * ramp_up * number / rate)
+        else:
+            offset = ramp_up + (number - ramp_requests) / float(rate)
+        if duration is not None and offset >= duration:
+            break
+        arrivals.append(offset)
+    return arrivals
+
+
+def find_saturation(run, rates, tolerance=0.9):
+    """Find the lowest rate the server can't keep up with.
+
+    ``run`` is called with each of the ``rates``, in increasing order, and
+    must run an open loop at that rate, like
+    ``lambda rate: engine.run_open(rate, duration=60)``. The server is
+    saturated when the throughput of successful calls falls under
+    ``tolerance`` times the rate. No higher rate is run after that.
+
+    :return: A tuple with the saturation rate, ``None`` if the server kept up
+        with every rate, and an ``OrderedDict`` with the
+        :meth:`LoadResults.summary` of each rate run.
+
+    """
+    summaries = OrderedDict()
+    for rate in sorted(rates):
+        summary = run(rate).summary()
+        summaries[rate] = summary
+        LOGGER.info(
+            u'%s calls per second: %s per second succeeded, p99 response '
+            u'time %ss',
+            rate, summary['throughput'], summary['response_p99'],
+        )
+        if (summary['throughput'] or 0) < tolerance * rate:
+            LOGGER.info(u'Saturated at %s calls per second', rate)
+            return rate, summaries
+    return None, summaries
+
+
+def _sleep_until(moment):
+    """Sleep until the ``moment`` given as a timestamp, if it is ahead."""
+    delay = moment - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _call(scenario, worker, iteration, scheduled):
+    """Call the scenario and return the arguments of
+    :meth:`LoadResults.record`.
+
+    """
+    started = time.time()
+    try:
+        value = scenario(worker, iteration)
+    except Exception as err:  # pylint:disable=broad-except
+        LOGGER.debug(
+            u'Worker %s iteration %s failed: %s', worker, iteration, err)
+        return (worker, iteration, scheduled, started, time.time() - started,
+                None, u'{0}: {1}'.format(type(err).__name__, err))
+    return (worker, iteration, scheduled, started, time.time() - started,
+            value, None)
+
+
+def _run_worker(scenario, worker, iterations, start_at, record=None):
+    """Run the ``iterations`` of a closed loop worker, one after the other.
+
+    Each call is given to ``record`` if set, otherwise they are all returned.
+
+    """
+    _sleep_until(start_at)
+    records = []
+    for iteration in range(iterations):
+        outcome = _call(scenario, worker, iteration, time.time())
+        if record is None:
+            records.append(outcome)
+        else:
+            record(outcome)
+    return records
+
+
+def _record_call(scenario, worker, iteration, scheduled, record):
+    """Call the scenario and give the call to ``record``."""
+    record(_call(scenario, worker, iteration, scheduled))
+
+
+class ThreadExecutor(object):
+    """Run the scenario on threads.
+
+    Errors raised while running a worker or recording a call, not by the
+    scenario itself, are raised once every call is finished.
+
+    """
+
+    pool_class = staticmethod(ThreadPool)
+
+    def run_closed(self, scenario, starts, iterations, results):
+        """Run a closed loop worker for each of the ``starts`` timestamps."""
+        pool = self.pool_class(len(starts))
+        pending = []
+        try:
+            for worker, start_at in enumerate(starts):
+                pending.append(self._apply_worker(
+                    pool, scenario, worker, iterations, start_at, results))
+        finally:
+            pool.close()
+            pool.join()
+        for async_result in pending:
+            async_result.get()
+
+    def _apply_worker(self, pool, scenario, worker, iterations, start_at,
+                      results):
+        """Run a closed loop worker recording straight to ``results``."""
+        return pool.apply_async(
+            _run_worker,
+            (scenario, worker, iterations, start_at, results.add),
+        )
+
+    def run_open(self, scenario, arrivals, results, max_workers):
+        """Start a call at each of the ``arrivals`` timestamps."""
+        pool = self.pool_class(max_workers)
+        pending = []
+        try:
+            for iteration, scheduled in enumerate(arrivals):
+                _sleep_until(scheduled)
+                pending.append(self._apply_call(
+                    pool, scenario, iteration, scheduled, results))
+        finally:
+            pool.close()
+            pool.join()
+        for async_result in pending:
+            async_result.get()
+
+    def _apply_call(self, pool, scenario, iteration, scheduled, results):
+        """Run an open loop call recording straight to ``results``."""
+        return pool.apply_async(
+            _record_call,
+            (scenario, None, iteration, scheduled, results.add),
+        )
+
+
+class ProcessExecutor(ThreadExecutor):
+    """Run the scenario on processes.
+
+    The scenario and its return values must be picklable, so it has to be a
+    module level function.
+
+    """
+
+    pool_class = staticmethod(multiprocessing.Pool)
+
+    def _apply_worker(self, pool, scenario, worker, iterations, start_at,
+                      results):
+        """Run a closed loop worker recording its calls once it is done."""
+        return pool.apply_async(
+            _run_worker,
+            (scenario, worker, iterations, start_at),
+            callback=lambda records: [
+                results.add(outcome) for outcome in records],
+        )
+
+    def _apply_call(self, pool, scenario, iteration, scheduled, results):
+        """Run an open loop call recording it once it is done."""
+        return pool.apply_async(
+            _call,
+            (scenario, None, iteration, scheduled),
+            callback=results.add,
+        )
+
+
+class AsyncioExecutor(object):
+    """Run the scenario on an asyncio event loop.
+
+    The scenario must return an awaitable, like a coroutine function does.
+    The calls of the open loop model are not limited by ``max_workers``,
+    they all run on the event loop as soon as they arrive.
+
+    """
+
+    def __init__(self):
+        if asyncio is None:
+            raise ValueError(u'The asyncio executor requires Python 3')
+
+    def _run(self, scenario, results, schedule):
+        """Run an event loop until ``results`` is full, calling ``schedule``
+        with the loop and a function starting a call of ``scenario``.
+
+        """
+        loop = asyncio.new_event_loop()
+        done = _create_future(loop)
+
+        def start(worker, iteration, scheduled, then=None):
+            """Start a call and record it once finished."""
+            started = time.time()
+            try:
+                future = _ensure_future(scenario(worker, iteration), loop)
+            except Exception as err:  # pylint:disable=broad-except
+                finish(worker, iteration, scheduled, started, None, err, then)
+                return
+
+            def finished(future):
+                error = future.exception()
+                finish(
+                    worker, iteration, scheduled, started,
+                    None if error else future.result(), error, then,
+                )
+            future.add_done_callback(finished)
+
+        def finish(worker, iteration, scheduled, started, value, error, then):
+            """Record a call, then run the next one of its worker."""
+            results.record(
+                worker, iteration, scheduled, started,
+                time.time() - started, value,
+                None if error is None
+                else u'{0}: {1}'.format(type(error).__name__, error),
+            )
+            if len(results) >= results.capacity and not done.done():
+                done.set_result(None)
+            elif then is not None:
+                then()
+
+        try:
+            schedule(loop, start)
+            loop.run_until_complete(done)
+        finally:
+            loop.close()
+
+    def run_closed(self, scenario, starts, iterations, results):
+        """Run a closed loop worker for each of the ``starts`` timestamps."""
+        def schedule(loop, start):
+            offset = loop.time() - time.time()
+
+            def run_worker(worker, iteration=0):
+                start(
+                    worker, iteration, time.time(),
+                    None if iteration + 1 >= iterations
+                    else lambda: run_worker(worker, iteration + 1),
+                )
+
+            for worker, start_at in enumerate(starts):
+                loop.call_at(start_at + offset, run_worker, worker)
+
+        self._run(scenario, results, schedule)
+
+    def run_open(self, scenario, arrivals, results, max_workers):
+        """Start a call at each of the ``arrivals`` timestamps."""
+        def schedule(loop, start):
+            offset = loop.time() - time.time()
+            for iteration, scheduled in enumerate(arrivals):
+                loop.call_at(
+                    scheduled + offset, start, None, iteration, scheduled)
+
+        self._run(scenario, results, schedule)
+
+
+#: The executors available to :class:`LoadEngine`, by name.
+EXECUTORS = {
+    'asyncio': AsyncioExecutor,
+    'process': ProcessExecutor,
+    'thread': ThreadExecutor,
+}
+
+
+class LoadEngine(object):
+    """Run a scenario concurrently and record the outcome of every call.
+
+    :param scenario: The callable to run, called with the worker number and
+        the iteration number. On the open loop model the worker is ``None``
+        and the iteration is the request number. The value it returns is
+        recorded, see :meth:`LoadResults.latency`. An exception marks the call
+        as failed, it doesn't stop the run.
+    :param str executor: The name of the executor running the scenario, see
+        ``EXECUTORS``.
+    :param int max_workers: Maximum number of concurrent calls on the open
+        loop model, ``DEFAULT_OPEN_LOOP_WORKERS`` by default.
+    :param results_class: The class storing the calls, called with the number
+        of calls planned. Defaults to :class:`LoadResults`, use
+        :class:`HistogramResults` to count long runs in constant memory.
+
+    """
+
+    def __init__(self, scenario, executor='thread', max_workers=None,
+                 results_class=None):
+        if executor not in EXECUTORS:
+            raise ValueError(
+                u'Unknown executor {0}, choose one of {1}'
+                .format(executor, u', '.join(sorted(EXECUTORS)))
+            )
+        self.scenario = scenario
+        self.executor = EXECUTORS[executor]()
+        self.max_workers = max_workers or DEFAULT_OPEN_LOOP_WORKERS
+        self.results_class = results_class or LoadResults
+
+    def run_closed(self, workers, iterations, ramp_up=0):
+        """Run the scenario ``iterations`` times on each of the ``workers``.
+
+        :param int workers: The number of workers.
+        :param int iterations: The number of calls of each worker.
+        :param ramp_up: Seconds over which the workers are started.
+        :return: The :class:`LoadResults` of the calls.
+
+        """
+        results = self.results_class(workers * iterations)
+        if not results.capacity:
+            return results
+        now = time.time()
+        starts = [now + offset
+                  for offset in closed_loop_starts(workers, ramp_up)]
+        LOGGER.info(
+            u'Running %s workers for %s iterations', workers, iterations)
+        self.executor.run_closed(self.scenario, starts, iterations, results)
+        LOGGER.info(u'Load results: %s', results.summary())
+        return results
+
+    def run_open(self, rate, requests=None, duration=None, ramp_up=0):
+        """Start the scenario ``rate`` times per second.
+
+        :param rate: The number of calls started each second.
+        :param int requests: The number of calls to start.
+        :param duration: Seconds during which the calls are started.
+        :param ramp_up: Seconds over which the rate grows up to ``rate``.
+        :return: The :class:`LoadResults` of the calls.
+
+        """
+        offsets = open_loop_arrivals(rate, requests, duration, ramp_up)
+        results = self.results_class(len(offsets))
+        if not offsets:
+            return results
+        now = time.time()
+        LOGGER.info(
+            u'Starting %s requests at %s per second', len(offsets), rate)
+        self.executor.run_open(
+            self.scenario,
+            [now + offset for offset in offsets],
+            results,
+            self.max_workers,
+        )
+        LOGGER.info(u'Load results: %s', results.summary())
+        return results
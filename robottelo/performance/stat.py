@@ -1,6 +1,37 @@
-"""Test utilities for writing csv files"""
+"""Test utilities for writing csv files
+
+The per-bucket statistics of the concurrent tests are computed at once for
+every bucket: the timings of the clients are laid out as a matrix, see
+:func:`timing_matrix`, reshaped so each bucket is a row, and each statistic is
+computed by a single numpy call over the rows, see :func:`bucket_statistics`.
+
+This module also has the recorders using constant memory however many
+timings they count: :class:`Histogram`, counting on a few fixed buckets, and
+:class:`HdrHistogram`, precise enough for the soak tests running millions of
+requests.
+
+"""
+import base64
+import binascii
+import bisect
 import csv
+import json
+import math
 import numpy
+import struct
+import threading
+import warnings
+import zlib
+
+from array import array
+from collections import OrderedDict
+
+#: The statistics computed by :func:`bucket_statistics`, in the order of the
+#: csv columns.
+STAT_COLUMNS = ('min', 'median', 'mean', 'max', 'std', '90%', '95%', '99%')
+#: Default upper bounds, in seconds, of the buckets of :class:`Histogram`.
+HISTOGRAM_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
 
 
 def generate_stat_for_concurrent_thread(
@@ -14,7 +45,7 @@ def generate_stat_for_concurrent_thread(
     if bucket_size == 0:
         return
     else:
-        num_buckets = len(time_list)/bucket_size
+        num_buckets = len(time_list) // bucket_size
 
     return_stat = {}
 
@@ -65,6 +96,108 @@ def generate_stat_for_concurrent_thread(
         return return_stat
 
 
+def timing_matrix(time_result_dict, num_threads=None):
+    """Return the timings of each client as the rows of a 2-D array.
+
+    :param dict time_result_dict: The timings of each client, keyed by
+        ``thread-<i>``.
+    :param int num_threads: The number of clients, the number of keys by
+        default.
+    :return: An array of ``num_threads`` rows, the shorter ones padded with
+        NaN.
+
+    """
+    if num_threads is None:
+        num_threads = len(time_result_dict)
+    rows = [
+        time_result_dict.get('thread-{0}'.format(i)) or []
+        for i in range(num_threads)
+    ]
+    matrix = numpy.full(
+        (num_threads, max([len(row) for row in rows] + [0])), numpy.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def bucket_statistics(samples):
+    """Return the statistics of each bucket of ``samples``.
+
+    Each statistic is computed by a single numpy call over the last axis, so
+    an array of ``clients x buckets x bucket_size`` timings gives arrays of
+    ``clients x buckets`` statistics. NaN are ignored, a bucket with only NaN
+    has NaN statistics.
+
+    :return: An ``OrderedDict`` with an array for each of the
+        ``STAT_COLUMNS``.
+
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    if numpy.isnan(samples).any():
+        functions = (numpy.nanmin, numpy.nanmean, numpy.nanmax, numpy.nanstd,
+                     numpy.nanpercentile)
+    else:
+        functions = (numpy.amin, numpy.mean, numpy.amax, numpy.std,
+                     numpy.percentile)
+    amin, mean, amax, std, percentile = functions
+    with warnings.catch_warnings():
+        # Buckets with only NaN are expected when the clients did not all
+        # record the same number of timings
+        warnings.simplefilter('ignore', RuntimeWarning)
+        percentiles = percentile(samples, [50, 90, 95, 99], axis=-1)
+        return OrderedDict([
+            ('min', amin(samples, axis=-1)),
+            ('median', percentiles[0]),
+            ('mean', mean(samples, axis=-1)),
+            ('max', amax(samples, axis=-1)),
+            ('std', std(samples, axis=-1)),
+            ('90%', percentiles[1]),
+            ('95%', percentiles[2]),
+            ('99%', percentiles[3]),
+        ])
+
+
+def write_bucket_statistics(stat_file_name, sections, stats):
+    """Write the statistics of each bucket to csv file
+
+    The rows have the same layout as the ones of
+    :func:`generate_stat_for_concurrent_thread`.
+
+    :param str stat_file_name: The csv file the rows are appended to.
+    :param sections: A list with the name and bucket names of each section,
+        as a tuple.
+    :param stats: The :func:`bucket_statistics` of an array of ``sections x
+        buckets x bucket_size`` timings.
+    :return: A list with a dictionary for each section, holding the ``(min,
+        median, max, std)`` of each bucket.
+
+    """
+    # One array of sections x buckets x columns
+    table = numpy.stack(
+        [stats[column] for column in STAT_COLUMNS], axis=-1).tolist()
+    return_stats = []
+    with open(stat_file_name, 'a') as handler:
+        writer = csv.writer(handler)
+        for (name, buckets), rows in zip(sections, table):
+            writer.writerow([])
+            writer.writerow(['{0}'.format(name)])
+            writer.writerow(['bucket'] + list(STAT_COLUMNS))
+            return_stat = {}
+            for i, (bucket, row) in enumerate(zip(buckets, rows)):
+                writer.writerow([bucket] + row)
+                return_stat[i] = (row[0], row[1], row[3], row[4])
+            return_stats.append(return_stat)
+    return return_stats
+
+
+def bucket_names(bucket_size, num_buckets):
+    """Return the names of the buckets, like ``1-50``, ``51-100``..."""
+    return [
+        '{0}-{1}'.format(bucket_size * i + 1, bucket_size * (i + 1))
+        for i in range(num_buckets)
+    ]
+
+
 def generate_stat_for_pulp_sync(index, time_list, stat_file_name):
     """statistics computing utility for Pulp synchronization tests"""
     with open(stat_file_name, 'a') as handler:
@@ -83,3 +216,443 @@ def generate_stat_for_pulp_sync(index, time_list, stat_file_name):
             sync_std,
         ])
     return (sync_min, sync_median, sync_max, sync_std)
+
+
+class Histogram(object):
+    """Count values on buckets, ``HISTOGRAM_BUCKETS`` by default.
+
+    The percentiles are estimated as the upper bound of the bucket holding
+    them, the exact minimum, maximum and mean are kept.
+
+    :param buckets: The sorted upper bounds of the buckets, defaults to
+        ``HISTOGRAM_BUCKETS``.
+
+    """
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last bucket counts the values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Count ``value``."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        """The mean of the values, ``None`` if there are none."""
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent):
+        """Estimate the ``percent`` percentile of the values.
+
+        :return: The upper bound of the bucket holding the percentile, or the
+            maximum value when it is lower. ``None`` if there are no values.
+
+        """
+        if not self.count:
+            return None
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """Return a dict with the count, min, max, mean, p50, p90 and p99 of
+        the values.
+
+        """
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class HdrHistogram(object):
+    """Count timings on log-bucketed ranges, using constant memory.
+
+    The timings are counted on the ranges of a High Dynamic Range histogram:
+    the values between 0 and ``highest`` are covered by buckets whose width
+    doubles from one bucket to the next, each split in sub-buckets fine
+    enough to keep ``significant_digits`` digits of any value. The memory
+    used depends only on these settings, about 190KB by default.
+
+    The histograms can be merged, see :meth:`merge`, so each thread, process
+    or run can record its own one. They can be pickled, and serialized to
+    JSON, see :meth:`to_dict`, or to a compact text, see :meth:`encode`.
+
+    :param highest: The highest timing to count, in seconds. Higher timings
+        are counted as ``highest``, but :attr:`max` is kept exact.
+    :param int significant_digits: The number of significant digits kept,
+        from 1 to 5.
+    :param resolution: The smallest timing told apart from zero, in seconds.
+
+    """
+
+    # Header of the encoded histograms: magic, significant digits, highest
+    # and total count as integer units, resolution, min, max, sum and sum of
+    # squares
+    _header = struct.Struct('>4sBQQddddd')
+    _magic = b'HDR1'
+
+    def __init__(self, highest=3600, significant_digits=3,
+                 resolution=1e-6):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError(
+                u'significant_digits must be between 1 and 5, got {0}'
+                .format(significant_digits))
+        if highest <= resolution:
+            raise ValueError(u'highest must be higher than the resolution')
+        self.highest = highest
+        self.significant_digits = significant_digits
+        self.resolution = resolution
+        self._highest_units = int(math.ceil(highest / resolution))
+        # Each bucket is split in enough sub-buckets to tell apart values
+        # differing on the last significant digit
+        magnitude = int(math.ceil(math.log(2 * 10 ** significant_digits, 2)))
+        self._half_magnitude = magnitude - 1
+        self._sub_bucket_count = 1 << magnitude
+        self._sub_bucket_half_count = self._sub_bucket_count // 2
+        self._sub_bucket_mask = self._sub_bucket_count - 1
+        bucket_count = 1
+        while (self._sub_bucket_count << (bucket_count - 1)
+               <= self._highest_units):
+            bucket_count += 1
+        self.counts = array(
+            'L', [0]) * ((bucket_count + 1) * self._sub_bucket_half_count)
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.sum_of_squares = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, units):
+        """Return the index of the counter of ``units``."""
+        bucket = (
+            (units | self._sub_bucket_mask).bit_length()
+            - self._half_magnitude - 1
+        )
+        sub_bucket = units >> bucket
+        return (
+            ((bucket + 1) << self._half_magnitude)
+            + sub_bucket - self._sub_bucket_half_count
+        )
+
+    def _highest_value(self, index):
+        """Return the highest value, in seconds, counted at ``index``."""
+        bucket = (index >> self._half_magnitude) - 1
+        sub_bucket = (
+            (index & (self._sub_bucket_half_count - 1))
+            + self._sub_bucket_half_count
+        )
+        if bucket < 0:
+            sub_bucket -= self._sub_bucket_half_count
+            bucket = 0
+        lowest = sub_bucket << bucket
+        return (lowest + (1 << bucket) - 1) * self.resolution
+
+    def record(self, value, count=1):
+        """Count the timing ``value``, in seconds, ``count`` times.
+
+        :raises ValueError: If ``value`` is negative.
+
+        """
+        if value < 0:
+            raise ValueError(u'Cannot record negative timing {0}'
+                             .format(value))
+        units = min(int(value / self.resolution), self._highest_units)
+        index = self._index(units)
+        with self._lock:
+            self.counts[index] += count
+            self.count += count
+            self.sum += value * count
+            self.sum_of_squares += value * value * count
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def _check_compatible(self, other):
+        """Raise ``ValueError`` unless ``other`` has the same ranges."""
+        if (other.significant_digits != self.significant_digits or
+                other.resolution != self.resolution or
+                len(other.counts) != len(self.counts)):
+            raise ValueError(
+                u'Cannot merge histograms with different ranges')
+
+    def merge(self, other):
+        """Add the timings counted by the ``other`` histogram to this one.
+
+        :raises ValueError: If the histograms don't have the same ranges.
+
+        """
+        self._check_compatible(other)
+        with self._lock:
+            for index, count in enumerate(other.counts):
+                if count:
+                    self.counts[index] += count
+            self.count += other.count
+            self.sum += other.sum
+            self.sum_of_squares += other.sum_of_squares
+            if other.min is not None and (
+                    self.min is None or other.min < self.min):
+                self.min = other.min
+            if other.max is not None and (
+                    self.max is None or other.max > self.max):
+                self.max = other.max
+        return self
+
+    @property
+    def mean(self):
+        """The mean of the timings, ``None`` if none was counted."""
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    @property
+    def std(self):
+        """The standard deviation of the timings, ``None`` if none was
+        counted.
+
+        """
+        if not self.count:
+            return None
+        variance = self.sum_of_squares / self.count - self.mean ** 2
+        return math.sqrt(max(variance, 0))
+
+    def percentile(self, percent):
+        """Return the timing under which ``percent`` percent of the timings
+        are, ``None`` if none was counted.
+
+        The value is the highest one counted on the same sub-bucket, so it is
+        accurate to the significant digits, and never higher than
+        :attr:`max`.
+
+        """
+        if not self.count:
+            return None
+        rank = max(int(percent / 100.0 * self.count + 0.5), 1)
+        index = int(numpy.searchsorted(numpy.cumsum(self.counts), rank))
+        if index >= len(self.counts):
+            return self.max
+        return min(self._highest_value(index), self.max)
+
+    def summary(self):
+        """Return a dict with the count, min, mean, std, p50, p90, p95,
+        p99, p99.9 and max of the timings.
+
+        """
+        return {
+            'count': self.count,
+            'min': self.min,
+            'mean': self.mean,
+            'std': self.std,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'p99.9': self.percentile(99.9),
+            'max': self.max,
+        }
+
+    def to_dict(self):
+        """Return the histogram as a JSON serializable dict.
+
+        Only the non-zero counters are kept, as ``[index, count]`` pairs.
+
+        """
+        return {
+            'highest': self.highest,
+            'significant_digits': self.significant_digits,
+            'resolution': self.resolution,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'sum': self.sum,
+            'sum_of_squares': self.sum_of_squares,
+            'counts': [
+                [index, count]
+                for index, count in enumerate(self.counts) if count
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return the histogram serialized by :meth:`to_dict`."""
+        histogram = cls(
+            data['highest'], data['significant_digits'], data['resolution'])
+        for index, count in data['counts']:
+            histogram.counts[index] = count
+        for name in ('count', 'min', 'max', 'sum', 'sum_of_squares'):
+            setattr(histogram, name, data[name])
+        return histogram
+
+    def to_json(self):
+        """Return the histogram serialized as JSON text."""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text):
+        """Return the histogram serialized by :meth:`to_json`."""
+        return cls.from_dict(json.loads(text))
+
+    def encode(self):
+        """Return the histogram as compact, compressed base64 text.
+
+        The counters are written as ZigZag LEB128 variable length integers,
+        each run of empty counters as a single negative number, then
+        compressed.
+
+        """
+        payload = bytearray()
+        zeros = 0
+        for count in self.counts:
+            if not count:
+                zeros += 1
+                continue
+            if zeros:
+                _write_varint(payload, -zeros)
+                zeros = 0
+            _write_varint(payload, count)
+        nan = float('nan')
+        header = self._header.pack(
+            self._magic,
+            self.significant_digits,
+            self._highest_units,
+            self.count,
+            self.resolution,
+            nan if self.min is None else self.min,
+            nan if self.max is None else self.max,
+            self.sum,
+            self.sum_of_squares,
+        )
+        return base64.b64encode(
+            zlib.compress(header + bytes(payload))).decode('ascii')
+
+    @classmethod
+    def decode(cls, text):
+        """Return the histogram encoded by :meth:`encode`.
+
+        :raises ValueError: If ``text`` is not an encoded histogram.
+
+        """
+        try:
+            data = zlib.decompress(base64.b64decode(text))
+            (magic, significant_digits, highest_units, count, resolution,
+             minimum, maximum, total, sum_of_squares) = (
+                 cls._header.unpack_from(data))
+        except (binascii.Error, struct.error, zlib.error):
+            magic = None
+        if magic != cls._magic:
+            raise ValueError(u'Not an encoded histogram')
+        histogram = cls(
+            highest_units * resolution, significant_digits, resolution)
+        index = 0
+        for value in _read_varints(bytearray(data[cls._header.size:])):
+            if value < 0:
+                index -= value
+            else:
+                histogram.counts[index] = value
+                index += 1
+        histogram.count = count
+        histogram.min = None if math.isnan(minimum) else minimum
+        histogram.max = None if math.isnan(maximum) else maximum
+        histogram.sum = total
+        histogram.sum_of_squares = sum_of_squares
+        return histogram
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _write_varint(payload, value):
+    """Append ``value`` to ``payload`` as a ZigZag LEB128 integer."""
+    value = (value << 1) if value >= 0 else ((-value << 1) - 1)
+    while value > 0x7f:
+        payload.append((value & 0x7f) | 0x80)
+        value >>= 7
+    payload.append(value)
+
+
+def _read_varints(payload):
+    """Yield the ZigZag LEB128 integers of ``payload``."""
+    value = shift = 0
+    for byte in payload:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield (value >> 1) if not value & 1 else -((value + 1) >> 1)
+        value = shift = 0
+
+
+def generate_stat_for_histograms(histograms, stat_file_name):
+    """statistics computing utility for recorded histograms
+
+    :param histograms: A dict of :class:`HdrHistogram` by row name, like
+        the bucket or the client the timings were recorded for.
+    :param str stat_file_name: The csv file the rows are appended to.
+    :return: A dict with the ``(min, median, max, std)`` of each row name.
+
+    """
+    return_stat = {}
+    with open(stat_file_name, 'a') as handler:
+        writer = csv.writer(handler)
+        writer.writerow([])
+        writer.writerow([
+            'name',
+            'count',
+            'min',
+            'median',
+            'mean',
+            'max',
+            'std',
+            '90%',
+            '95%',
+            '99%',
+            '99.9%'
+        ])
+        for name, histogram in histograms.items():
+            summary = histogram.summary()
+            writer.writerow([
+                name,
+                summary['count'],
+                summary['min'],
+                summary['p50'],
+                summary['mean'],
+                summary['max'],
+                summary['std'],
+                summary['p90'],
+                summary['p95'],
+                summary['p99'],
+                summary['p99.9'],
+            ])
+            return_stat[name] = (
+                summary['min'], summary['p50'], summary['max'],
+                summary['std'])
+    return return_stat
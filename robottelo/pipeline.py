@@ -0,0 +1,209 @@
+# -*- encoding: utf-8 -*-
+"""Run the steps of a setup concurrently, following their dependencies.
+
+A :class:`Pipeline` is a directed acyclic graph of named steps. Each step
+starts as soon as the steps it requires are finished, so independent
+branches, like creating a product and creating a lifecycle environment on the
+same organization, run at the same time::
+
+    pipeline = Pipeline('custom repo')
+    pipeline.add('org', lambda results: make_org()['id'])
+    pipeline.add(
+        'product',
+        lambda results: make_product({u'organization-id': results['org']}),
+        requires=('org',),
+    )
+    pipeline.add(
+        'env',
+        lambda results: make_lifecycle_environment(
+            {u'organization-id': results['org']}),
+        requires=('org',),
+    )
+    results = pipeline.run()
+
+The time spent on each step is logged once the pipeline is finished, see
+:meth:`Pipeline.report`.
+
+"""
+import logging
+import six
+import sys
+import time
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from six.moves import queue
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PipelineStep(object):
+    """A step of a :class:`Pipeline`.
+
+    :param str name: The name of the step, used as the key of its result.
+    :param function: The function run by the step. It is called with a
+        dictionary holding the result of each required step and its return
+        value is the result of the step.
+    :param requires: The names of the steps which must be finished before
+        this one starts.
+
+    """
+
+    def __init__(self, name, function, requires=()):
+        self.name = name
+        self.function = function
+        self.requires = tuple(requires)
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        """Seconds spent running the step, ``None`` if it did not finish."""
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def __repr__(self):
+        return u'PipelineStep({0!r}, requires={1!r})'.format(
+            self.name, self.requires)
+
+
+class Pipeline(object):
+    """Run steps concurrently, each one once its dependencies are finished.
+
+    If a step fails, no other step is started, the running ones are waited
+    for and the exception raised by the failed step is raised again.
+
+    :param str name: The name of the pipeline, used on the log messages.
+    :param int max_workers: Maximum number of steps running at the same time.
+        Defaults to the number of steps.
+
+    """
+
+    def __init__(self, name=None, max_workers=None):
+        self.name = name or u'pipeline'
+        self.max_workers = max_workers
+        self.steps = OrderedDict()
+        self.started = None
+        self.finished = None
+
+    def add(self, name, function, requires=()):
+        """Add a step to the pipeline.
+
+        The required steps must be added first, so the steps can't depend on
+        each other in a cycle.
+
+        :return: The new :class:`PipelineStep`.
+        :raises ValueError: If a step with the same name was already added or
+            any required step was not.
+
+        """
+        if name in self.steps:
+            raise ValueError(u'Step {0} was already added'.format(name))
+        for required in requires:
+            if required not in self.steps:
+                raise ValueError(
+                    u'Step {0} requires the unknown step {1}'
+                    .format(name, required)
+                )
+        step = PipelineStep(name, function, requires)
+        self.steps[name] = step
+        return step
+
+    def run(self):
+        """Run the steps and return a dictionary with the result of each one.
+
+        The time spent on each step is logged once the pipeline is finished,
+        successfully or not.
+
+        """
+        results = {}
+        pending = list(self.steps.values())
+        if not pending:
+            return results
+        finished = queue.Queue()
+        running = 0
+        failure = None
+        self.started = time.time()
+        pool = ThreadPool(min(self.max_workers or len(pending), len(pending)))
+        try:
+            while True:
+                if failure is None:
+                    for step in [
+                            step for step in pending
+                            if all(name in results for name in step.requires)
+                    ]:
+                        pending.remove(step)
+                        running += 1
+                        pool.apply_async(
+                            _run_step,
+                            (
+                                step,
+                                dict(
+                                    (name, results[name])
+                                    for name in step.requires
+                                ),
+                                finished,
+                            ),
+                        )
+                if not running:
+                    break
+                step, result, exc_info = finished.get()
+                running -= 1
+                if exc_info is None:
+                    results[step.name] = result
+                elif failure is None:
+                    LOGGER.error(
+                        u'Step %s of %s failed: %s',
+                        step.name, self.name, exc_info[1]
+                    )
+                    failure = exc_info
+        finally:
+            self.finished = time.time()
+            pool.close()
+            pool.join()
+            LOGGER.info(self.report())
+        if failure is not None:
+            six.reraise(*failure)
+        return results
+
+    def report(self):
+        """Return the time spent on each step, as text.
+
+        Each line has the name of the step, the seconds elapsed between the
+        start of the pipeline and the start of the step, and the seconds
+        spent running the step.
+
+        """
+        lines = [u'{0} timings:'.format(self.name)]
+        width = max([len(name) for name in self.steps] + [len(u'total')])
+        for step in self.steps.values():
+            if step.started is None:
+                lines.append(u'  {0:<{1}}  not run'.format(step.name, width))
+                continue
+            lines.append(u'  {0:<{1}}  +{2:8.3f}s  {3}'.format(
+                step.name,
+                width,
+                step.started - self.started,
+                u'failed' if step.finished is None
+                else u'{0:8.3f}s'.format(step.duration),
+            ))
+        if self.started is not None and self.finished is not None:
+            lines.append(u'  {0:<{1}}  {2:>10}  {3:8.3f}s'.format(
+                u'total', width, u'', self.finished - self.started))
+        return u'\n'.join(lines)
+
+
+def _run_step(step, results, finished):
+    """Run ``step`` and put it on the ``finished`` queue along with its
+    result or the information of the exception it raised.
+
+    """
+    step.started = time.time()
+    try:
+        result = step.function(results)
+    except Exception:  # pylint:disable=broad-except
+        finished.put((step, None, sys.exc_info()))
+    else:
+        step.finished = time.time()
+        finished.put((step, result, None))
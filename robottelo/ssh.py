@@ -1,27 +1,67 @@
 """Utility module to handle the shared ssh connection."""
+import atexit
 import base64
+import codecs
+import collections
 import logging
 import os
 import paramiko
 import re
 import six
+import socket
+import threading
+import time
+import uuid
 
 from contextlib import contextmanager
 from robottelo.cli import hammer
 from robottelo.config import settings
+from six.moves import shlex_quote
+
+try:
+    import asyncio
+except ImportError:
+    # Only available on Python 3.4 or newer, the asynchronous helpers fail if
+    # it is not available.
+    asyncio = None
 
 logger = logging.getLogger(__name__)
 
+# Default value of the sshd ``MaxSessions`` option: the number of channels
+# which can be opened at the same time on a single connection.
+MAX_SESSIONS = 10
+# Number of bytes read at once from a channel.
+CHANNEL_CHUNK_SIZE = 32768
+# Seconds to wait before polling channels with nothing to read again.
+CHANNEL_POLL_INTERVAL = 0.005
+# Upper bound of the polling interval of silent channels run by the
+# asynchronous helpers.
+CHANNEL_MAX_POLL_INTERVAL = 0.1
+# Errors which may leave a connection broken.
+CONNECTION_ERRORS = (paramiko.SSHException, socket.error, EOFError)
+# Escape codes for colors displayed in the output
+COLOR_CODE_REGEX = re.compile(r'\x1b\[\d\d?m')
+
 
-def decode_to_utf8(text):  # pragma: no cover
-    """In python 3 all strings are already unicode, no need to decode"""
-    if six.PY2:
+def decode_to_utf8(text):
+    """Paramiko returns bytes, decode them to an unicode string on both python
+    2 and 3. Strings which are already unicode are returned unchanged.
+    """
+    if isinstance(text, six.binary_type):
         return text.decode('utf-8')
     return text
 
 
 class SSHCommandResult(object):
-    """Structure that returns in all ssh commands results."""
+    """Structure that returns in all ssh commands results.
+
+    The functions running the commands also fill the seconds spent getting a
+    connection (``connect_time``) and running the command
+    (``execute_time``), and the number of bytes written by the command
+    (``bytes_received``), when they know them. ``parse_time`` is the seconds
+    spent parsing the output.
+
+    """
 
     def __init__(
             self, stdout=None, stderr=None, return_code=0, output_format=None):
@@ -29,12 +69,17 @@ class SSHCommandResult(object):
         self.stderr = stderr
         self.return_code = return_code
         self.output_format = output_format
+        self.connect_time = None
+        self.execute_time = None
+        self.bytes_received = None
+        started = time.time()
         #  Does not make sense to return suspicious output if ($? <> 0)
         if output_format and self.return_code == 0:
             if output_format == 'csv':
                 self.stdout = hammer.parse_csv(stdout) if stdout else {}
             if output_format == 'json':
                 self.stdout = hammer.parse_json(stdout) if stdout else None
+        self.parse_time = time.time() - started
 
     def __repr__(self):
         tmpl = u'SSHCommandResult(stdout={stdout!r}, stderr={stderr!r}, ' + \
@@ -42,6 +87,86 @@ class SSHCommandResult(object):
         return tmpl.format(**self.__dict__)
 
 
+class SSHCommandStream(object):
+    """Iterate over the standard output lines of a running command as they
+    are received.
+
+    Both the standard output and error of the channel are drained while
+    iterating, so the remote command never stalls on a full channel window,
+    and only the lines not consumed yet are kept in memory. Unless
+    ``output_format`` is ``json`` or ``plain``, color codes and Rails log
+    lines are stripped from each line as :func:`execute_command` does, so the
+    stream can be passed to ``hammer.iter_csv``::
+
+        with ssh.stream_command('hammer --output csv host list') as stream:
+            for host in hammer.iter_csv(stream):
+                ...
+
+    ``stderr`` and ``return_code`` are set once all lines were consumed.
+
+    :param channel: The paramiko channel running the command.
+    :param output_format: plain|json|csv valid only for hammer commands
+
+    """
+
+    def __init__(self, channel, output_format=None):
+        self.channel = channel
+        self.output_format = output_format
+        self.stderr = None
+        self.return_code = None
+        lines = self._read_lines()
+        if output_format not in ('json', 'plain'):
+            lines = _clean_lines(lines)
+        self._lines = lines
+
+    def __iter__(self):
+        return self._lines
+
+    def _read_lines(self):
+        """Yield the decoded standard output lines, without the line break,
+        as they are received.
+
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        stderr = []
+        partial = u''
+        finished = False
+        while not finished:
+            stdout = []
+            progress = read_channel(self.channel, stdout, stderr)
+            if self.channel.exit_status_ready():
+                read_channel(self.channel, stdout, stderr)
+                self.return_code = self.channel.recv_exit_status()
+                self.stderr = COLOR_CODE_REGEX.sub(
+                    '', decode_to_utf8(b''.join(stderr)))
+                finished = True
+            lines = (partial + decoder.decode(
+                b''.join(stdout), finished)).split(u'\n')
+            partial = lines.pop()
+            for line in lines:
+                yield line
+            if not progress and not finished:
+                time.sleep(CHANNEL_POLL_INTERVAL)
+        if partial:
+            yield partial
+
+    def close(self):
+        """Close the channel, the command is terminated if still running."""
+        self.channel.close()
+
+
+def _clean_lines(lines):
+    """Strip the color codes and the Rails log lines from hammer output
+    lines.
+
+    """
+    for line in lines:
+        # Empty fields are returned as "" which gives us u'""'
+        line = line.replace('""', '')
+        if not line.startswith('['):
+            yield COLOR_CODE_REGEX.sub('', line)
+
+
 def _call_paramiko_sshclient():  # pragma: no cover
     """Call ``paramiko.SSHClient``.
 
@@ -53,6 +178,40 @@ def _call_paramiko_sshclient():  # pragma: no cover
     return paramiko.SSHClient()
 
 
+def _get_connection_params(hostname=None, username=None, password=None,
+                           key_filename=None):
+    """Fill the connection parameters which are ``None`` with the values from
+    the configuration's ``server`` section.
+
+    :return: A ``(hostname, username, password, key_filename)`` tuple.
+    :rtype: tuple
+
+    """
+    if hostname is None:
+        hostname = settings.server.hostname
+    if username is None:
+        username = settings.server.ssh_username
+    if key_filename is None:
+        key_filename = settings.server.ssh_key
+    if password is None:
+        password = settings.server.ssh_password
+    return (hostname, username, password, key_filename)
+
+
+def _connect(hostname, username, password, key_filename, timeout):
+    """Create a new ``paramiko.SSHClient`` and connect it to ``hostname``."""
+    client = _call_paramiko_sshclient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        hostname=hostname,
+        username=username,
+        key_filename=key_filename,
+        password=password,
+        timeout=timeout
+    )
+    return client
+
+
 @contextmanager
 def get_connection(hostname=None, username=None, password=None,
                    key_filename=None, timeout=10):
@@ -85,24 +244,9 @@ def get_connection(hostname=None, username=None, password=None,
     :rtype: ``paramiko.SSHClient``
 
     """
-    if hostname is None:
-        hostname = settings.server.hostname
-    if username is None:
-        username = settings.server.ssh_username
-    if key_filename is None:
-        key_filename = settings.server.ssh_key
-    if password is None:
-        password = settings.server.ssh_password
-
-    client = _call_paramiko_sshclient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(
-        hostname=hostname,
-        username=username,
-        key_filename=key_filename,
-        password=password,
-        timeout=timeout
-    )
+    hostname, username, password, key_filename = _get_connection_params(
+        hostname, username, password, key_filename)
+    client = _connect(hostname, username, password, key_filename, timeout)
     client_id = hex(id(client))
     try:
         logger.info('Instantiated Paramiko client {0}'.format(client_id))
@@ -114,6 +258,368 @@ def get_connection(hostname=None, username=None, password=None,
         logger.info('Destroyed Paramiko client {0}'.format(client_id))
 
 
+def _is_connection_alive(client):
+    """Check whether the transport of a ``paramiko.SSHClient`` can still be
+    used to open new channels.
+
+    Besides checking the local transport state, an ``SSH_MSG_IGNORE`` packet
+    is sent so a socket closed by the remote side is noticed before a command
+    is sent through it.
+
+    """
+    if client is None:
+        return False
+    transport = client.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    try:
+        transport.send_ignore()
+    except CONNECTION_ERRORS:
+        return False
+    return True
+
+
+class _SessionLimiter(object):
+    """Bound the number of channels concurrently opened on a transport.
+
+    OpenSSH refuses to open more than ``MaxSessions`` channels per connection,
+    so callers sharing a pooled connection must wait for a free session
+    instead of failing. If the server refuses a channel before ``limit`` is
+    reached, :meth:`shrink` lowers the limit to what the server accepts.
+
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, blocking=True):
+        """Take a session, waiting for one to be released if ``blocking``.
+
+        :return: Whether a session was taken.
+        :rtype: bool
+
+        """
+        with self._condition:
+            while self.in_use >= self.limit:
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self.in_use += 1
+            return True
+
+    def release(self):
+        """Give back a session taken by :meth:`acquire`."""
+        with self._condition:
+            self.in_use -= 1
+            self._condition.notify()
+
+    def shrink(self):
+        """Lower the limit after the server refused to open a channel while
+        ``in_use`` sessions (including the refused one) were taken.
+
+        """
+        with self._condition:
+            limit = max(1, self.in_use - 1)
+            if limit < self.limit:
+                logger.debug(
+                    'Server refused channel, limiting to %s sessions', limit)
+                self.limit = limit
+
+
+class _PooledConnection(object):
+    """Book-keeping of a single connection held by
+    :class:`SSHConnectionPool`.
+
+    """
+
+    def __init__(self, key, max_sessions):
+        self.key = key
+        self.client = None
+        self.last_used = time.time()
+        self.sessions = _SessionLimiter(max_sessions)
+        # Number of callers currently holding the connection, a connection in
+        # use is never evicted.
+        self.users = 0
+        # Serializes (re)connecting, so concurrent callers which need the same
+        # connection perform the handshake only once.
+        self.lock = threading.Lock()
+
+
+class SSHConnectionPool(object):
+    """Keep authenticated ssh connections alive so they can be reused by
+    subsequent commands.
+
+    Connections are keyed by ``(hostname, username, password,
+    key_filename)``. Paramiko transports are thread safe and every command
+    opens its own channel, so a pooled connection is shared by all threads
+    which need the same key. Before being handed out, the connection health is
+    checked and a new connection is made if the transport went stale.
+    Connections not used for more than ``max_idle_time`` seconds are closed.
+
+    At most ``max_sessions`` channels are opened at the same time on each
+    pooled connection, callers wait for a free session when the limit is
+    reached.
+
+    The pool is bound to the process which created it. When used after a fork
+    (``multiprocessing``, pytest-xdist ``--boxed``) the inherited connections
+    are dropped without being closed as their sockets are shared with the
+    parent process.
+
+    :param int max_idle_time: Number of seconds a connection can stay unused
+        before being closed.
+    :param int max_sessions: Number of channels which can be concurrently
+        opened on a connection. Should not be greater than the server's
+        ``MaxSessions`` sshd option.
+
+    """
+
+    def __init__(self, max_idle_time=300, max_sessions=MAX_SESSIONS):
+        self.max_idle_time = max_idle_time
+        self.max_sessions = max_sessions
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return len(self._connections)
+
+    def _check_pid(self):
+        """Forget the connections inherited from a parent process."""
+        if self._pid != os.getpid():
+            self._connections = {}
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _evict_idle(self):
+        """Close the connections idle for more than ``max_idle_time``.
+
+        Must be called with ``self._lock`` held.
+
+        """
+        now = time.time()
+        for key, entry in list(self._connections.items()):
+            if entry.users == 0 and now - entry.last_used > self.max_idle_time:
+                del self._connections[key]
+                if entry.client is not None:
+                    logger.info(
+                        'Closing idle pooled connection to [%s]', key[0])
+                    entry.client.close()
+
+    def _acquire(self, key):
+        """Return the pool entry for ``key`` marking it as being used."""
+        self._check_pid()
+        with self._lock:
+            self._evict_idle()
+            entry = self._connections.get(key)
+            if entry is None:
+                entry = _PooledConnection(key, self.max_sessions)
+                self._connections[key] = entry
+            entry.users += 1
+        return entry
+
+    def _release(self, entry):
+        """Mark the pool entry as not being used by the caller anymore."""
+        with self._lock:
+            entry.users -= 1
+            entry.last_used = time.time()
+
+    def _checkout_entry(self, hostname, username, password, key_filename,
+                        timeout):
+        """Return the pool entry and its connected client for the given
+        connection parameters.
+
+        The entry is marked as being used and must be given back with
+        :meth:`_release`.
+
+        """
+        key = _get_connection_params(
+            hostname, username, password, key_filename)
+        entry = self._acquire(key)
+        try:
+            with entry.lock:
+                if not _is_connection_alive(entry.client):
+                    if entry.client is not None:
+                        logger.info(
+                            'Reconnecting stale pooled connection to [%s]',
+                            key[0]
+                        )
+                        entry.client.close()
+                    entry.client = None
+                    entry.client = _connect(*key, timeout=timeout)
+                    logger.debug('Pooled connection to [%s]', key[0])
+                return entry, entry.client
+        except Exception:
+            self._release(entry)
+            raise
+
+    def _discard_broken(self, entry, client):
+        """Discard ``client`` from the pool if its transport is broken.
+
+        Other channels may still be using the transport after an error, so it
+        is discarded only when it is really broken.
+
+        """
+        if not _is_connection_alive(client):
+            with entry.lock:
+                if entry.client is client:
+                    entry.client = None
+            client.close()
+
+    @contextmanager
+    def _checkout(self, hostname, username, password, key_filename,
+                  timeout):
+        """Yield the pool entry and its connected client for the given
+        connection parameters.
+
+        """
+        entry, client = self._checkout_entry(
+            hostname, username, password, key_filename, timeout)
+        try:
+            yield entry, client
+        except CONNECTION_ERRORS:
+            self._discard_broken(entry, client)
+            raise
+        finally:
+            self._release(entry)
+
+    @contextmanager
+    def connection(self, hostname=None, username=None, password=None,
+                   key_filename=None, timeout=10):
+        """Yield a pooled ssh connection.
+
+        Accepts the same arguments as :func:`get_connection`, but the yielded
+        connection is not closed when the caller is done with it. If the
+        connection breaks while being used, it is discarded and the next
+        caller will get a new one.
+
+        One session of the connection is reserved until the ``with`` block
+        ends, so only one channel should be opened at a time through the
+        yielded connection.
+
+        :return: An SSH connection.
+        :rtype: ``paramiko.SSHClient``
+
+        """
+        with self._checkout(
+                hostname, username, password, key_filename,
+                timeout) as (entry, client):
+            entry.sessions.acquire()
+            try:
+                yield client
+            except paramiko.ChannelException:
+                # The server refused to open one more channel, make the next
+                # callers wait for the sessions in use.
+                entry.sessions.shrink()
+                raise
+            finally:
+                entry.sessions.release()
+
+    def execute_multiplexed(self, cmds, hostname=None, output_format=None,
+                            username=None, password=None, key_filename=None,
+                            timeout=10, max_channels=None):
+        """Run ``cmds`` concurrently on a pooled connection.
+
+        See :func:`execute_multiplexed` for the description of ``cmds``,
+        ``output_format`` and ``max_channels``. The channels are accounted on
+        the connection sessions limit, so other threads using the same pooled
+        connection are taken into account.
+
+        :return: A list of ``SSHCommandResult`` in the same order as ``cmds``.
+
+        """
+        with self._checkout(
+                hostname, username, password, key_filename,
+                timeout) as (entry, client):
+            return execute_multiplexed(
+                cmds,
+                client,
+                output_format=output_format,
+                max_channels=max_channels,
+                sessions=entry.sessions,
+            )
+
+    def async_execute(self, cmd, hostname=None, output_format=None,
+                      username=None, password=None, key_filename=None,
+                      timeout=10, loop=None):
+        """Run ``cmd`` on a pooled connection without blocking ``loop``.
+
+        Connecting, waiting for a free session and opening the channel are
+        done on the loop default executor, the channel is then polled by the
+        loop until the command finishes. See :func:`async_execute_command`.
+
+        :return: An ``asyncio.Future`` of ``SSHCommandResult``.
+
+        """
+        def open_channel():
+            entry, client = self._checkout_entry(
+                hostname, username, password, key_filename, timeout)
+            try:
+                try:
+                    channel = _open_channel(client, cmd, entry.sessions)
+                except paramiko.ChannelException:
+                    # The sessions limit was lowered to what the server
+                    # accepts, so trying again waits for a free session.
+                    logger.debug('Server refused to open a channel, retrying')
+                    channel = _open_channel(client, cmd, entry.sessions)
+            except Exception as err:
+                if isinstance(err, CONNECTION_ERRORS):
+                    self._discard_broken(entry, client)
+                self._release(entry)
+                raise
+
+            def release(error):
+                entry.sessions.release()
+                if isinstance(error, CONNECTION_ERRORS):
+                    self._discard_broken(entry, client)
+                self._release(entry)
+
+            return channel, release
+
+        return _AsyncCommand(
+            _get_event_loop(loop), open_channel, output_format).start()
+
+    def close_all(self):
+        """Close all the pooled connections."""
+        self._check_pid()
+        with self._lock:
+            entries = list(self._connections.values())
+            self._connections = {}
+        for entry in entries:
+            if entry.client is not None:
+                entry.client.close()
+
+
+_connection_pool = SSHConnectionPool()
+atexit.register(_connection_pool.close_all)
+
+
+def get_pooled_connection(hostname=None, username=None, password=None,
+                          key_filename=None, timeout=10):
+    """Yield a connection from the module connection pool.
+
+    It works like :func:`get_connection`, but the connection is kept open and
+    reused by the next calls with the same arguments::
+
+        with get_pooled_connection() as connection:
+            ...
+
+    """
+    return _connection_pool.connection(
+        hostname=hostname,
+        username=username,
+        password=password,
+        key_filename=key_filename,
+        timeout=timeout,
+    )
+
+
+def close_pooled_connections():
+    """Close all connections held by the module connection pool."""
+    _connection_pool.close_all()
+
+
 def add_authorized_key(key, hostname=None, username=None, password=None,
                        key_filename=None, timeout=10):
     """Appends a local public ssh key to remote authorized keys
@@ -149,27 +655,27 @@ def add_authorized_key(key, hostname=None, username=None, password=None,
     ssh_path = '~/.ssh'
     auth_file = os.path.join(ssh_path, 'authorized_keys')
 
-    with get_connection(hostname=hostname, username=username,
-                        password=password, key_filename=key_filename,
-                        timeout=timeout) as con:
-
-        # ensure ssh directory exists
-        execute_command('mkdir -p %s' % ssh_path, con)
-
-        # append the key if doesn't exists
-        add_key = "grep -q '{key}' {dest} || echo '{key}' >> {dest}".format(
-            key=key_content, dest=auth_file)
-        execute_command(add_key, con)
-
-        # set proper permissions
-        execute_command('chmod 700 %s' % ssh_path, con)
-        execute_command('chmod 600 %s' % auth_file, con)
-        ssh_user = username or settings.server.ssh_username
-        execute_command('chown -R %s %s' % (ssh_user, ssh_path), con)
-
-        # Restore SELinux context with restorecon, if it's available:
-        cmd = 'command -v restorecon && restorecon -RvF %s || true' % ssh_path
-        execute_command(cmd, con)
+    ssh_user = username or settings.server.ssh_username
+    command_batch(
+        [
+            # ensure ssh directory exists
+            'mkdir -p %s' % ssh_path,
+            # append the key if doesn't exists
+            "grep -q '{key}' {dest} || echo '{key}' >> {dest}".format(
+                key=key_content, dest=auth_file),
+            # set proper permissions
+            'chmod 700 %s' % ssh_path,
+            'chmod 600 %s' % auth_file,
+            'chown -R %s %s' % (ssh_user, ssh_path),
+            # Restore SELinux context with restorecon, if it's available:
+            'command -v restorecon && restorecon -RvF %s || true' % ssh_path,
+        ],
+        hostname=hostname,
+        username=username,
+        password=password,
+        key_filename=key_filename,
+        timeout=timeout,
+    )
 
 
 def upload_file(local_file, remote_file, hostname=None):
@@ -181,7 +687,8 @@ def upload_file(local_file, remote_file, hostname=None):
     :param hostname: target machine hostname. If not provided will be used the
         ``server.hostname`` from the configuration.
     """
-    with get_connection(hostname=hostname) as connection:  # pragma: no cover
+    with get_pooled_connection(
+            hostname=hostname) as connection:  # pragma: no cover
         try:
             sftp = connection.open_sftp()
             # Check if local_file is a file-like object and use the proper
@@ -201,7 +708,8 @@ def download_file(remote_file, local_file=None, hostname=None):
     """
     if local_file is None:  # pragma: no cover
         local_file = remote_file
-    with get_connection(hostname=hostname) as connection:  # pragma: no cover
+    with get_pooled_connection(
+            hostname=hostname) as connection:  # pragma: no cover
         try:
             sftp = connection.open_sftp()
             sftp.get(remote_file, local_file)
@@ -213,6 +721,9 @@ def command(cmd, hostname=None, output_format=None, username=None,
             password=None, key_filename=None, timeout=10):
     """Executes SSH command(s) on remote hostname.
 
+    The connection is taken from the module connection pool, so subsequent
+    commands sent to the same host reuse the same authenticated transport.
+
     :param str cmd: The command to run
     :param str output_format: json, csv or None
     :param str hostname: The hostname of the server to establish connection. If
@@ -229,10 +740,421 @@ def command(cmd, hostname=None, output_format=None, username=None,
     :param int timeout: Time to wait for establish the connection.
     """
     hostname = hostname or settings.server.hostname
-    with get_connection(hostname=hostname, username=username,
-                        password=password, key_filename=key_filename,
-                        timeout=timeout) as connection:
-        return execute_command(cmd, connection, output_format, timeout)
+    started = time.time()
+    try:
+        with get_pooled_connection(
+                hostname=hostname, username=username, password=password,
+                key_filename=key_filename, timeout=timeout) as connection:
+            connect_time = time.time() - started
+            result = execute_command(cmd, connection, output_format, timeout)
+            result.connect_time = connect_time
+            return result
+    except paramiko.ChannelException:
+        # The connection sessions limit was lowered to what the server
+        # accepts, so trying again waits for a free session.
+        logger.debug('Server refused to open a channel, retrying')
+    with get_pooled_connection(
+            hostname=hostname, username=username, password=password,
+            key_filename=key_filename, timeout=timeout) as connection:
+        connect_time = time.time() - started
+        result = execute_command(cmd, connection, output_format, timeout)
+        result.connect_time = connect_time
+        return result
+
+
+@contextmanager
+def stream_command(cmd, hostname=None, output_format=None, username=None,
+                   password=None, key_filename=None, timeout=10):
+    """Executes a SSH command on remote hostname and yield a stream of its
+    standard output lines.
+
+    Big outputs, like listing thousands of hammer entities, are processed
+    while being received instead of being held in memory::
+
+        with ssh.stream_command(
+                'hammer --output csv host list', output_format='csv') as hosts:
+            for host in hammer.iter_csv(hosts):
+                ...
+
+    The arguments are the same as :func:`command`. The pooled connection
+    session is held and the channel is kept open until the ``with`` block
+    ends.
+
+    :return: SSHCommandStream
+
+    """
+    hostname = hostname or settings.server.hostname
+    with get_pooled_connection(
+            hostname=hostname, username=username, password=password,
+            key_filename=key_filename, timeout=timeout) as connection:
+        stream = execute_command_stream(cmd, connection, output_format)
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+
+def command_batch(cmds, hostname=None, output_format=None, username=None,
+                  password=None, key_filename=None, timeout=10):
+    """Executes several SSH commands on remote hostname in one round trip.
+
+    See :func:`execute_batch` for how the commands are run. The arguments are
+    the same as :func:`command`, except for:
+
+    :param list cmds: The commands to run.
+    :return: A list of ``SSHCommandResult`` in the same order as ``cmds``.
+
+    """
+    hostname = hostname or settings.server.hostname
+    with get_pooled_connection(
+            hostname=hostname, username=username, password=password,
+            key_filename=key_filename, timeout=timeout) as connection:
+        return execute_batch(cmds, connection, output_format, timeout)
+
+
+def multiplex_commands(cmds, hostname=None, output_format=None,
+                       username=None, password=None, key_filename=None,
+                       timeout=10, max_channels=None):
+    """Executes several SSH commands concurrently on remote hostname.
+
+    All commands are run over a single pooled connection, each one on its own
+    channel, so running them does not cost one connection handshake each. The
+    arguments are the same as :func:`command`, except for:
+
+    :param list cmds: The commands to run.
+    :param int max_channels: The maximum number of commands running at the
+        same time. It is always bounded by the connection sessions limit.
+    :return: A list of ``SSHCommandResult`` in the same order as ``cmds``.
+
+    """
+    hostname = hostname or settings.server.hostname
+    return _connection_pool.execute_multiplexed(
+        cmds,
+        hostname=hostname,
+        output_format=output_format,
+        username=username,
+        password=password,
+        key_filename=key_filename,
+        timeout=timeout,
+        max_channels=max_channels,
+    )
+
+
+def async_command(cmd, hostname=None, output_format=None, username=None,
+                  password=None, key_filename=None, timeout=10, loop=None):
+    """Executes a SSH command on remote hostname without blocking the event
+    loop.
+
+    Works like :func:`command`, but returns an ``asyncio.Future`` which can be
+    awaited or gathered with other futures::
+
+        results = loop.run_until_complete(asyncio.gather(
+            *[ssh.async_command('hostname', hostname=host) for host in hosts]
+        ))
+
+    The arguments are the same as :func:`command`, except for:
+
+    :param loop: The event loop to run the command on. Defaults to the current
+        event loop.
+    :return: An ``asyncio.Future`` of ``SSHCommandResult``.
+
+    """
+    hostname = hostname or settings.server.hostname
+    return _connection_pool.async_execute(
+        cmd,
+        hostname=hostname,
+        output_format=output_format,
+        username=username,
+        password=password,
+        key_filename=key_filename,
+        timeout=timeout,
+        loop=loop,
+    )
+
+
+def async_upload_file(local_file, remote_file, hostname=None, loop=None):
+    """Upload a local file to a remote machine without blocking the event
+    loop.
+
+    SFTP transfers are run on the loop default executor, see
+    :func:`upload_file` for the arguments.
+
+    :return: An ``asyncio.Future`` which is done when the file is uploaded.
+
+    """
+    return _get_event_loop(loop).run_in_executor(
+        None, upload_file, local_file, remote_file, hostname)
+
+
+def async_download_file(remote_file, local_file=None, hostname=None,
+                        loop=None):
+    """Download a remote file to the local machine without blocking the event
+    loop.
+
+    SFTP transfers are run on the loop default executor, see
+    :func:`download_file` for the arguments.
+
+    :return: An ``asyncio.Future`` which is done when the file is downloaded.
+
+    """
+    return _get_event_loop(loop).run_in_executor(
+        None, download_file, remote_file, local_file, hostname)
+
+
+def read_channel(channel, stdout, stderr):
+    """Move the data available on ``channel`` to the ``stdout`` and
+    ``stderr`` lists of chunks without blocking.
+
+    :return: Whether any data was read.
+    :rtype: bool
+
+    """
+    read = False
+    while channel.recv_ready():
+        stdout.append(channel.recv(CHANNEL_CHUNK_SIZE))
+        read = True
+    while channel.recv_stderr_ready():
+        stderr.append(channel.recv_stderr(CHANNEL_CHUNK_SIZE))
+        read = True
+    return read
+
+
+def execute_multiplexed(cmds, connection, output_format=None,
+                        max_channels=None, sessions=None):
+    """Execute several commands concurrently via ssh in the given connection.
+
+    Each command gets its own channel on the connection transport and all of
+    them are drained by the calling thread, so no extra thread is needed to
+    keep several commands in flight. At most ``max_channels`` channels are
+    open at a time, once a command finishes its channel is closed and the next
+    command is started. If the server refuses to open a channel, the remaining
+    commands wait for the running ones to finish.
+
+    :param list cmds: The commands to be executed via ssh.
+    :param connection: SSH Paramiko client connection.
+    :param output_format: plain|json|csv valid only for hammer commands.
+    :param int max_channels: The maximum number of channels open at the same
+        time. Defaults to ``MAX_SESSIONS``.
+    :param sessions: Optional sessions limiter shared with other users of the
+        connection, as used by :class:`SSHConnectionPool`.
+    :return: A list of ``SSHCommandResult`` in the same order as ``cmds``.
+
+    """
+    if max_channels is None:
+        max_channels = MAX_SESSIONS
+    transport = connection.get_transport()
+    pending = collections.deque(enumerate(cmds))
+    running = {}
+    results = [None] * len(cmds)
+    try:
+        while pending or running:
+            while pending and len(running) < max_channels:
+                if sessions is not None and not sessions.acquire(
+                        blocking=not running):
+                    break
+                index, cmd = pending[0]
+                try:
+                    channel = transport.open_session()
+                except paramiko.ChannelException:
+                    if sessions is not None:
+                        sessions.shrink()
+                        sessions.release()
+                    if not running:
+                        raise
+                    max_channels = len(running)
+                    break
+                pending.popleft()
+                logger.debug('>>> %s', cmd)
+                channel.exec_command(cmd)
+                running[channel] = (index, [], [])
+            progress = False
+            for channel, (index, stdout, stderr) in list(running.items()):
+                progress = read_channel(channel, stdout, stderr) or progress
+                if not channel.exit_status_ready():
+                    continue
+                read_channel(channel, stdout, stderr)
+                results[index] = build_result(
+                    b''.join(stdout),
+                    b''.join(stderr),
+                    channel.recv_exit_status(),
+                    output_format,
+                )
+                channel.close()
+                del running[channel]
+                if sessions is not None:
+                    sessions.release()
+                progress = True
+            if not progress:
+                time.sleep(CHANNEL_POLL_INTERVAL)
+    finally:
+        for channel in running:
+            channel.close()
+            if sessions is not None:
+                sessions.release()
+    return results
+
+
+def _get_event_loop(loop=None):
+    """Return ``loop`` or the current event loop if it is ``None``."""
+    if asyncio is None:
+        raise RuntimeError(
+            'asyncio is not available, the asynchronous ssh helpers require '
+            'Python 3.4 or newer.'
+        )
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    return loop
+
+
+def _create_future(loop):
+    """Create an ``asyncio.Future`` attached to ``loop``."""
+    # loop.create_future was added on Python 3.5.2
+    create_future = getattr(loop, 'create_future', None)
+    if create_future is not None:
+        return create_future()
+    return asyncio.Future(loop=loop)
+
+
+def _ensure_future(awaitable, loop):
+    """Schedule ``awaitable`` on ``loop`` and return its future."""
+    # asyncio.ensure_future was added on Python 3.4.4, it was asyncio.async
+    # before, which is not valid syntax on newer versions
+    ensure_future = getattr(asyncio, 'ensure_future', None)
+    if ensure_future is None:
+        ensure_future = getattr(asyncio, 'async')
+    return ensure_future(awaitable, loop=loop)
+
+
+def _open_channel(connection, cmd, sessions=None):
+    """Open a new channel on ``connection`` and start ``cmd`` on it.
+
+    :param connection: SSH Paramiko client connection.
+    :param sessions: Optional sessions limiter of the connection. A session is
+        taken, waiting for one if needed, before opening the channel and it is
+        given back if the command can not be started.
+    :return: The channel running ``cmd``.
+
+    """
+    if sessions is not None:
+        sessions.acquire()
+    try:
+        channel = connection.get_transport().open_session()
+        try:
+            logger.debug('>>> %s', cmd)
+            channel.exec_command(cmd)
+        except Exception:
+            channel.close()
+            raise
+    except Exception as err:
+        if sessions is not None:
+            if isinstance(err, paramiko.ChannelException):
+                sessions.shrink()
+            sessions.release()
+        raise
+    return channel
+
+
+class _AsyncCommand(object):
+    """Run a command on a channel polled by an event loop.
+
+    Opening the channel may block, so ``open_channel`` is called on the loop
+    default executor. It must return the channel running the command and a
+    callable, or ``None``, called with the error, if any, once the channel is
+    closed. The channel is then polled by loop callbacks until the command
+    exits, backing off up to ``CHANNEL_MAX_POLL_INTERVAL`` while the command
+    is silent.
+
+    """
+
+    def __init__(self, loop, open_channel, output_format=None):
+        self.loop = loop
+        self.open_channel = open_channel
+        self.output_format = output_format
+        self.channel = None
+        self.release = None
+        self.stdout = []
+        self.stderr = []
+        self.interval = CHANNEL_POLL_INTERVAL
+        self.future = _create_future(loop)
+
+    def start(self):
+        """Start the command.
+
+        :return: An ``asyncio.Future`` of ``SSHCommandResult``.
+
+        """
+        opening = self.loop.run_in_executor(None, self.open_channel)
+        opening.add_done_callback(self._opened)
+        return self.future
+
+    def _opened(self, opening):
+        if opening.cancelled():
+            self.future.cancel()
+            return
+        if opening.exception() is not None:
+            if not self.future.cancelled():
+                self.future.set_exception(opening.exception())
+            return
+        self.channel, self.release = opening.result()
+        self._poll()
+
+    def _close(self, error=None):
+        self.channel.close()
+        if self.release is not None:
+            self.release(error)
+
+    def _poll(self):
+        if self.future.cancelled():
+            self._close()
+            return
+        result = None
+        try:
+            progress = read_channel(self.channel, self.stdout, self.stderr)
+            if self.channel.exit_status_ready():
+                read_channel(self.channel, self.stdout, self.stderr)
+                result = build_result(
+                    b''.join(self.stdout),
+                    b''.join(self.stderr),
+                    self.channel.recv_exit_status(),
+                    self.output_format,
+                )
+        except Exception as err:
+            self._close(err)
+            self.future.set_exception(err)
+            return
+        if result is not None:
+            self._close()
+            self.future.set_result(result)
+            return
+        if progress:
+            self.interval = CHANNEL_POLL_INTERVAL
+        else:
+            self.interval = min(
+                self.interval * 2, CHANNEL_MAX_POLL_INTERVAL)
+        self.loop.call_later(self.interval, self._poll)
+
+
+def async_execute_command(cmd, connection, output_format=None, loop=None):
+    """Execute a command via ssh in the given connection without blocking the
+    event loop.
+
+    The channel is opened on the loop default executor and then polled by the
+    loop until the command finishes, so hundreds of commands can be gathered
+    without a thread per command.
+
+    :param cmd: a command to be executed via ssh
+    :param connection: SSH Paramiko client connection
+    :param output_format: plain|json|csv valid only for hammer commands
+    :param loop: The event loop to run the command on. Defaults to the current
+        event loop.
+    :return: An ``asyncio.Future`` of ``SSHCommandResult``.
+
+    """
+    def open_channel():
+        return _open_channel(connection, cmd), None
+
+    return _AsyncCommand(
+        _get_event_loop(loop), open_channel, output_format).start()
 
 
 def execute_command(cmd, connection, output_format=None, timeout=120):
@@ -243,39 +1165,141 @@ def execute_command(cmd, connection, output_format=None, timeout=120):
     :param output_format: plain|json|csv valid only for hammer commands
     :param timeout: defaults to 120
     :return: SSHCommandResult
+    """
+    started = time.time()
+    stdout, stderr, return_code = _execute(cmd, connection, timeout)
+    execute_time = time.time() - started
+    result = build_result(stdout, stderr, return_code, output_format)
+    result.execute_time = execute_time
+    result.bytes_received = len(stdout) + len(stderr)
+    return result
+
+
+def _execute(cmd, connection, timeout=120):
+    """Execute a command via ssh in the given connection and return its raw
+    output.
+
+    :return: A ``(stdout, stderr, return_code)`` tuple, the outputs are bytes.
+    :rtype: tuple
+
     """
     logger.debug('>>> %s', cmd)
-    _, stdout, stderr = connection.exec_command(cmd, timeout)
+    _, stdout, stderr = connection.exec_command(cmd, timeout=timeout)
+
+    # Drain both outputs while waiting for the command to finish, otherwise a
+    # command writing more than the channel window stalls forever.
+    channel = stdout.channel
+    stdout_chunks = []
+    stderr_chunks = []
+    while not channel.exit_status_ready():
+        if not read_channel(channel, stdout_chunks, stderr_chunks):
+            time.sleep(CHANNEL_POLL_INTERVAL)
+    errorcode = channel.recv_exit_status()
+    stdout_chunks.append(stdout.read())
+    stderr_chunks.append(stderr.read())
+    return b''.join(stdout_chunks), b''.join(stderr_chunks), errorcode
+
+
+def execute_batch(cmds, connection, output_format=None, timeout=120):
+    """Execute several commands via ssh in the given connection using a single
+    channel.
+
+    The commands are sent at once as a shell script and run one after the
+    other, each one in its own subshell, whatever the return code of the
+    previous ones is. A random sentinel is written to both outputs after each
+    command, with its return code, so the outputs can be split back::
+
+        results = execute_batch(['mkdir -p /tmp/a', 'ls /tmp/a'], connection)
+
+    This costs a single round trip instead of one per command. The remote
+    ``sh`` must be a POSIX shell.
+
+    If the batch is interrupted, the remaining commands get the remaining
+    output and the return code of the whole batch.
+
+    :param list cmds: The commands to be executed via ssh.
+    :param connection: SSH Paramiko client connection.
+    :param output_format: plain|json|csv valid only for hammer commands.
+    :param timeout: defaults to 120
+    :return: A list of ``SSHCommandResult`` in the same order as ``cmds``.
+
+    """
+    sentinel = u'robottelo-batch-{0}'.format(uuid.uuid4().hex)
+    script = []
+    for cmd in cmds:
+        # The line break lets commands end with a comment
+        script.append(u'( {0}\n)'.format(cmd))
+        script.append(u"printf '\\n{0} %d\\n' $?".format(sentinel))
+        script.append(u"printf '\\n{0}\\n' >&2".format(sentinel))
+    stdout, stderr, return_code = _execute(
+        u'sh -c {0}'.format(shlex_quote(u'\n'.join(script))),
+        connection,
+        timeout,
+    )
+    stdout = decode_to_utf8(stdout).split(u'\n{0} '.format(sentinel))
+    stderr = decode_to_utf8(stderr).split(u'\n{0}\n'.format(sentinel))
+    # Output of each command, preceded by the return code of the previous one
+    outputs = [(None, stdout[0])]
+    for part in stdout[1:]:
+        code, _, output = part.partition(u'\n')
+        outputs.append((int(code), output))
+    results = []
+    for index in range(len(cmds)):
+        if index + 1 < len(outputs):
+            code = outputs[index + 1][0]
+        else:
+            code = return_code
+        results.append(build_result(
+            outputs[index][1] if index < len(outputs) else u'',
+            stderr[index] if index < len(stderr) else u'',
+            code,
+            output_format,
+        ))
+    return results
+
 
-    errorcode = stdout.channel.recv_exit_status()
+def execute_command_stream(cmd, connection, output_format=None):
+    """Start a command via ssh in the given connection and return a stream of
+    its standard output lines.
+
+    The channel is closed by :meth:`SSHCommandStream.close`.
+
+    :param cmd: a command to be executed via ssh
+    :param connection: SSH Paramiko client connection
+    :param output_format: plain|json|csv valid only for hammer commands
+    :return: SSHCommandStream
 
-    stdout = stdout.read()
-    stderr = stderr.read()
-    # Remove escape code for colors displayed in the output
-    regex = re.compile(r'\x1b\[\d\d?m')
+    """
+    return SSHCommandStream(_open_channel(connection, cmd), output_format)
+
+
+def build_result(stdout, stderr, return_code, output_format):
+    """Decode and clean up the raw output of a command and wrap it on a
+    ``SSHCommandResult``.
+
+    :param bytes stdout: The raw standard output of the command.
+    :param bytes stderr: The raw standard error of the command.
+    :param int return_code: The command exit status.
+    :param output_format: plain|json|csv valid only for hammer commands
+    :return: SSHCommandResult
+
+    """
     if stdout:
         # Convert to unicode string
         stdout = decode_to_utf8(stdout)
         logger.debug('<<< stdout\n%s', stdout)
     if stderr:
         # Convert to unicode string and remove all color codes characters
-        stderr = regex.sub('', decode_to_utf8(stderr))
+        stderr = COLOR_CODE_REGEX.sub('', decode_to_utf8(stderr))
         logger.debug('<<< stderr\n%s', stderr)
     # we don't want a list as output of 'plain' just pure text
     if stdout and output_format not in ('json', 'plain'):
         # Mostly only for hammer commands
         # for output we don't really want to see all of Rails traffic
         # information, so strip it out.
-        # Empty fields are returned as "" which gives us u'""'
-        stdout = stdout.replace('""', '')
-        stdout = u''.join(stdout).split('\n')
-        stdout = [
-            regex.sub('', line)
-            for line in stdout
-            if not line.startswith('[')
-        ]
+        stdout = list(_clean_lines(stdout.split('\n')))
     return SSHCommandResult(
-        stdout, stderr, errorcode, output_format)
+        stdout, stderr, return_code, output_format)
 
 
 def is_ssh_pub_key(key):
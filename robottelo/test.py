@@ -5,7 +5,9 @@ to help writing API, CLI and UI tests.
 
 """
 import csv
+import functools
 import logging
+import numpy
 import os
 import pytest
 import unittest2
@@ -27,18 +29,25 @@ from robottelo.cli.org import Org as OrgCli
 from robottelo.cli.subscription import Subscription
 from robottelo.config import settings
 from robottelo.constants import DEFAULT_ORG, DEFAULT_ORG_ID
+from robottelo.performance.candlepin import (
+    Candlepin,
+    register_activation_key_scenario,
+    register_attach_scenario,
+)
 from robottelo.performance.constants import NUM_THREADS
 from robottelo.performance.graph import (
     generate_bar_chart_stat,
     generate_line_chart_raw_candlepin,
     generate_line_chart_stat_bucketized_candlepin,
 )
-from robottelo.performance.stat import generate_stat_for_concurrent_thread
-from robottelo.performance.thread import (
-    DeleteThread,
-    SyncThread,
-    SubscribeAKThread,
-    SubscribeAttachThread
+from robottelo.performance.distributed import LoadCoordinator
+from robottelo.performance.load import LoadEngine, find_saturation
+from robottelo.performance.pulp import Pulp
+from robottelo.performance.stat import (
+    bucket_names,
+    bucket_statistics,
+    timing_matrix,
+    write_bucket_statistics,
 )
 from robottelo.ui.browser import browser, DockerBrowser
 from robottelo.ui.activationkey import ActivationKey
@@ -522,7 +531,7 @@ class ConcurrentTestCase(TestCase):
            1000 iterations concurrently;
 
         """
-        self.num_iterations = total_iterations / current_num_threads
+        self.num_iterations = total_iterations // current_num_threads
 
     def _set_bucket_size(self):
         """Set size for each bucket"""
@@ -534,11 +543,6 @@ class ConcurrentTestCase(TestCase):
         else:
             self.bucket_size = 1
 
-    def _join_all_threads(self, thread_list):
-        """Wait for all threads to complete"""
-        for thread in thread_list:
-            thread.join()
-
     def _get_output_filename(self, file_name):
         """Get type of test: ak/att/del/reg as output file name
 
@@ -685,18 +689,21 @@ class ConcurrentTestCase(TestCase):
 
         """
         test_category = self._get_output_filename(stat_file_name)
+        matrix = timing_matrix(time_result_dict, current_num_threads)
+        num_buckets = matrix.shape[1] // self.bucket_size
+
+        # clients x buckets x bucket_size
+        buckets = matrix[:, :num_buckets * self.bucket_size].reshape(
+            current_num_threads, num_buckets, self.bucket_size)
+        names = bucket_names(self.bucket_size, num_buckets)
+        stat_dicts = write_bucket_statistics(
+            stat_file_name,
+            [('client-{0}'.format(i), names)
+             for i in range(current_num_threads)],
+            bucket_statistics(buckets)
+        )
 
-        for i in range(current_num_threads):
-            time_list = time_result_dict.get('thread-{0}'.format(i))
-            thread_name = 'client-{0}'.format(i)
-            stat_dict = generate_stat_for_concurrent_thread(
-                thread_name,
-                time_list,
-                stat_file_name,
-                self.bucket_size,
-                self.num_buckets
-            )
-
+        for i, stat_dict in enumerate(stat_dicts):
             # create line chart with each client being grouped by buckets
             generate_line_chart_stat_bucketized_candlepin(
                 stat_dict,
@@ -731,32 +738,26 @@ class ConcurrentTestCase(TestCase):
             line chart of statistics on these chunks.
 
         """
-        # parameters for generating bucketized line chart
-        stat_dict = {}
-        return_stat = {}
         current_num_threads = len(time_result_dict)
         test_category = self._get_output_filename(stat_file_name)
-
-        for i in range(self.num_buckets):
-            chunks_bucket_i = []
-            for j in range(len(time_result_dict)):
-                time_list = time_result_dict.get('thread-{0}'.format(j))
-                # slice out bucket-size from each client's result and merge
-                chunks_bucket_i += time_list[
-                    i * self.bucket_size: (i + 1) * self.bucket_size
-                ]
-
-            # for each chunk i, compute and output its stat
-            return_stat = generate_stat_for_concurrent_thread(
-                'bucket-{0}'.format(i),
-                chunks_bucket_i,
-                stat_file_name,
-                len(chunks_bucket_i),
-                1
-            )
-
-            # for each chunk i, add stat into final return_dict
-            stat_dict.update({i: return_stat.get(0, (0, 0, 0, 0))})
+        matrix = timing_matrix(time_result_dict)
+        num_buckets = min(
+            self.num_buckets, matrix.shape[1] // self.bucket_size)
+
+        # chunks x 1 x (clients * bucket_size): the i-th buckets of all
+        # clients are merged into the i-th chunk
+        chunks = matrix[:, :num_buckets * self.bucket_size].reshape(
+            current_num_threads, num_buckets, self.bucket_size,
+        ).transpose(1, 0, 2).reshape(num_buckets, 1, -1)
+        sizes = numpy.sum(~numpy.isnan(chunks), axis=-1)[:, 0]
+        stat_dicts = write_bucket_statistics(
+            stat_file_name,
+            [('bucket-{0}'.format(i), bucket_names(size, 1))
+             for i, size in enumerate(sizes)],
+            bucket_statistics(chunks)
+        )
+        stat_dict = dict(
+            (i, chunk_stat[0]) for i, chunk_stat in enumerate(stat_dicts))
 
         # create line chart with all clients grouped by a chunk of buckets
         generate_line_chart_stat_bucketized_candlepin(
@@ -780,27 +781,20 @@ class ConcurrentTestCase(TestCase):
         note: take the full list of a client i; calculate stat on the list
 
         """
-        # parameters for generating bucketized line chart
-        stat_dict = {}
-        return_stat = {}
         current_num_threads = len(time_result_dict)
         test_category = self._get_output_filename(stat_file_name)
+        matrix = timing_matrix(time_result_dict)
 
-        for i in range(current_num_threads):
-            time_list = time_result_dict.get('thread-{0}'.format(i))
-            thread_name = 'client-{0}'.format(i)
-
-            # for each client i, compute and output its stat
-            return_stat = generate_stat_for_concurrent_thread(
-                thread_name,
-                time_list,
-                stat_file_name,
-                len(time_list),
-                1
-            )
-
-            # for each chunk i, add stat into final return_dict
-            stat_dict.update({i: return_stat.get(0, (0, 0, 0, 0))})
+        # clients x 1 x iterations
+        sizes = numpy.sum(~numpy.isnan(matrix), axis=-1)
+        stat_dicts = write_bucket_statistics(
+            stat_file_name,
+            [('client-{0}'.format(i), bucket_names(size, 1))
+             for i, size in enumerate(sizes)],
+            bucket_statistics(matrix[:, numpy.newaxis, :])
+        )
+        stat_dict = dict(
+            (i, client_stat[0]) for i, client_stat in enumerate(stat_dicts))
 
         # create graph based on stats of all clients
         generate_bar_chart_stat(
@@ -819,21 +813,17 @@ class ConcurrentTestCase(TestCase):
         note: take the full dictionary of test and calculate overall stat
 
         """
-        full_list = []  # list containing 1st to 5kth data point
         current_num_threads = len(time_result_dict)
         test_category = self._get_output_filename(stat_file_name)
+        matrix = timing_matrix(time_result_dict)
 
-        for i in range(len(time_result_dict)):
-            time_list = time_result_dict.get('thread-{0}'.format(i))
-            full_list += time_list
-
-        stat_dict = generate_stat_for_concurrent_thread(
-            'test-{0}'.format(len(time_result_dict)),
-            full_list,
+        # 1 x 1 x all the data points
+        size = int(numpy.sum(~numpy.isnan(matrix)))
+        stat_dict = write_bucket_statistics(
             stat_file_name,
-            len(full_list),
-            1
-        )
+            [('test-{0}'.format(current_num_threads), bucket_names(size, 1))],
+            bucket_statistics(matrix.reshape(1, 1, -1))
+        )[0]
 
         generate_bar_chart_stat(
             stat_dict,
@@ -845,6 +835,31 @@ class ConcurrentTestCase(TestCase):
             'test'
         )
 
+    def _run_closed_loop(self, scenario, args, current_num_threads):
+        """Run the Candlepin ``scenario`` on ``current_num_threads`` workers
+
+        The workers are spread over the load agents set by the
+        ``[performance] load_agents`` setting, if any, otherwise they all run
+        from this machine.
+
+        :param scenario: A scenario function of
+            ``robottelo.performance.candlepin``
+        :param dict args: The keyword arguments of the scenario
+        :param int current_num_threads: number of threads
+        :return: The ``LoadResults`` of the test case
+
+        """
+        if settings.performance.load_agents:
+            coordinator = LoadCoordinator(settings.performance.load_agents)
+            return coordinator.run_closed(
+                '{0}:{1}'.format(scenario.__module__, scenario.__name__),
+                current_num_threads,
+                self.num_iterations,
+                args=args
+            )
+        return LoadEngine(functools.partial(scenario, **args)).run_closed(
+            current_num_threads, self.num_iterations)
+
     def kick_off_ak_test(self, current_num_threads, total_iterations):
         """Refactor out concurrent register by ak test case
 
@@ -860,29 +875,16 @@ class ConcurrentTestCase(TestCase):
         self._set_num_iterations(total_iterations, current_num_threads)
         self._set_bucket_size()
 
-        # Create a list to store all threads
-        thread_list = []
-        # Create a dictionary to store all timing results from each client
-        time_result_dict_ak = {}
-
-        # Create new threads and start each thread mapped with a vm
-        for i in range(current_num_threads):
-            thread_name = 'thread-{0}'.format(i)
-            time_result_dict_ak[thread_name] = []
-            thread = SubscribeAKThread(
-                i,
-                thread_name,
-                time_result_dict_ak,
-                self.num_iterations,
-                self.ak_name,
-                self.default_org,
-                current_vm_list[i]
-            )
-            thread.start()
-            thread_list.append(thread)
-
-        # wait all threads in thread list
-        self._join_all_threads(thread_list)
+        # Each worker registers the vm mapped with it
+        time_result_dict_ak = self._run_closed_loop(
+            register_activation_key_scenario,
+            {
+                'ak_name': self.ak_name,
+                'default_org': self.default_org,
+                'vm_ips': current_vm_list,
+            },
+            current_num_threads
+        ).by_worker()
 
         # write raw result of activation-key
         self._write_raw_csv_file(
@@ -915,36 +917,22 @@ class ConcurrentTestCase(TestCase):
         self._set_num_iterations(total_iterations, current_num_threads)
         self._set_bucket_size()
 
-        # Create a list to store all threads
-        thread_list = []
-        # Create a dictionary to store register timings from each client
-        time_result_dict_register = {}
-        # Create a dictionary to store attach timings from each client
-        time_result_dict_attach = {}
-
-        # Create new threads and start each thread mapped with a vm
-        for i in range(current_num_threads):
-            thread_name = 'thread-{0}'.format(i)
-            time_result_dict_register[thread_name] = []
-            time_result_dict_attach[thread_name] = []
-
-            thread = SubscribeAttachThread(
-                i,
-                thread_name,
-                {},
-                time_result_dict_register,
-                time_result_dict_attach,
-                self.num_iterations,
-                self.sub_id,
-                self.default_org,
-                self.environment,
-                current_vm_list[i]
-            )
-            thread.start()
-            thread_list.append(thread)
-
-        # wait all threads in thread list
-        self._join_all_threads(thread_list)
+        # Each worker registers and attaches the vm mapped with it
+        results = self._run_closed_loop(
+            register_attach_scenario,
+            {
+                'sub_id': self.sub_id,
+                'default_org': self.default_org,
+                'environment': self.environment,
+                'vm_ips': current_vm_list,
+            },
+            current_num_threads
+        )
+        # split the (register, attach) timings of each client
+        time_result_dict_register = results.by_worker(
+            value=lambda timings: timings[0])
+        time_result_dict_attach = results.by_worker(
+            value=lambda timings: timings[1])
 
         # write raw result of register
         self._write_raw_csv_file(
@@ -978,6 +966,136 @@ class ConcurrentTestCase(TestCase):
             'stat-att-{0}-clients'.format(current_num_threads)
         )
 
+    def _write_open_loop_csv_file(self, raw_file_name, test_case_name,
+                                  results):
+        """Write the timings of each call of an open loop test to csv file
+
+        Each row has the request number, the seconds between the scheduled
+        and the actual start, the latency and the response time counted from
+        the scheduled start.
+
+        """
+        with open(raw_file_name, 'a') as handler:
+            writer = csv.writer(handler)
+            writer.writerow([test_case_name])
+            writer.writerow(
+                ['request', 'delay', 'latency', 'response time', 'error'])
+            for index in range(len(results)):
+                delay = results.started[index] - results.scheduled[index]
+                writer.writerow([
+                    results.iterations[index],
+                    delay,
+                    results.latency(index),
+                    delay + results.durations[index],
+                    results.errors[index] or '',
+                ])
+            writer.writerow([])
+
+    def _write_saturation_csv_file(
+            self, stat_file_name, test_case_name, summaries, saturation):
+        """Write the summary of each rate of an open loop test to csv file
+
+        :param str stat_file_name: The name of output stat csv file
+        :param str test_case_name: The type of test case
+        :param dict summaries: The
+            :meth:`robottelo.performance.load.LoadResults.summary` of each
+            rate
+        :param saturation: The rate Candlepin could not keep up with
+
+        """
+        columns = ['throughput', 'errors', 'p50', 'p99', 'delay_p99',
+                   'response_p50', 'response_p99']
+        with open(stat_file_name, 'a') as handler:
+            writer = csv.writer(handler)
+            writer.writerow([test_case_name])
+            writer.writerow(['rate'] + columns)
+            for rate, summary in summaries.items():
+                writer.writerow(
+                    [rate] + [summary[column] for column in columns])
+            writer.writerow(['saturation', saturation or 'not reached'])
+            writer.writerow([])
+
+    def _kick_off_open_loop_test(self, open_loop, rates, duration, test_type):
+        """Run ``open_loop`` at increasing rates until Candlepin saturates
+
+        :param open_loop: A function running the registrations at the given
+            rate during the given seconds
+        :param list rates: The registrations per second to try
+        :param duration: The seconds each rate is run
+        :param str test_type: ak or att, used on the csv sections names
+        :return: The rate Candlepin could not keep up with, ``None`` if it
+            kept up with all of them
+
+        """
+        def run(rate):
+            """Run and record the registrations at ``rate``"""
+            results = open_loop(rate, duration)
+            self._write_open_loop_csv_file(
+                self.raw_file_name,
+                'raw-{0}-open-{1}-per-second'.format(test_type, rate),
+                results
+            )
+            return results
+
+        self.logger.info(
+            'Open loop %s test at %s registrations per second, %s seconds '
+            'each', test_type, rates, duration)
+        saturation, summaries = find_saturation(run, rates)
+        self._write_saturation_csv_file(
+            self.stat_file_name,
+            'stat-{0}-open-{1}-clients'.format(test_type, len(self.vm_list)),
+            summaries,
+            saturation
+        )
+        return saturation
+
+    def kick_off_ak_open_loop_test(self, rates, duration):
+        """Register by ak at fixed rates, instead of as fast as each
+        client can, until Candlepin saturates
+
+        :param list rates: The registrations per second to try
+        :param duration: The seconds each rate is run
+        :return: The rate Candlepin could not keep up with, ``None`` if it
+            kept up with all of them
+
+        """
+        return self._kick_off_open_loop_test(
+            lambda rate, duration: Candlepin.open_loop_register_activation_key(
+                self.ak_name,
+                self.default_org,
+                self.vm_list,
+                rate,
+                duration=duration
+            ),
+            rates,
+            duration,
+            'ak'
+        )
+
+    def kick_off_att_open_loop_test(self, rates, duration):
+        """Register and attach at fixed rates, instead of as fast as each
+        client can, until Candlepin saturates
+
+        :param list rates: The registrations per second to try
+        :param duration: The seconds each rate is run
+        :return: The rate Candlepin could not keep up with, ``None`` if it
+            kept up with all of them
+
+        """
+        return self._kick_off_open_loop_test(
+            lambda rate, duration: Candlepin.open_loop_register_attach(
+                self.sub_id,
+                self.default_org,
+                self.environment,
+                self.vm_list,
+                rate,
+                duration=duration
+            ),
+            rates,
+            duration,
+            'att'
+        )
+
     def kick_off_del_test(self, current_num_threads):
         """Refactor out concurrent system deletion test case
 
@@ -987,7 +1105,7 @@ class ConcurrentTestCase(TestCase):
         # Get list of all uuids of registered systems
 
         self.logger.info('Retrieve list of uuids of all registered systems:')
-        uuid_list = self._get_registered_uuids()
+        uuid_list = [uuid for uuid in self._get_registered_uuids() if uuid]
 
         # Parameter for statistics files
         total_iterations = len(uuid_list)
@@ -995,27 +1113,15 @@ class ConcurrentTestCase(TestCase):
         self._set_num_iterations(total_iterations, current_num_threads)
         self._set_bucket_size()
 
-        # Create a list to store all threads
-        thread_list = []
-        # Create a dictionary to store all timing results from each thread
-        time_result_dict_del = {}
-
-        # Create new threads and start the thread which has sublist of uuids
-        for i in range(current_num_threads):
-            time_result_dict_del['thread-{0}'.format(i)] = []
-            thread = DeleteThread(
-                i,
-                'thread-{0}'.format(i),
-                uuid_list[
-                    self.num_iterations * i: self.num_iterations * (i + 1)
-                ],
-                time_result_dict_del
+        # Each worker deletes its own sublist of uuids
+        engine = LoadEngine(
+            lambda worker, iteration: Candlepin.single_delete(
+                uuid_list[self.num_iterations * worker + iteration],
+                worker
             )
-            thread.start()
-            thread_list.append(thread)
-
-        # wait all threads in thread list
-        self._join_all_threads(thread_list)
+        )
+        time_result_dict_del = engine.run_closed(
+            current_num_threads, self.num_iterations).by_worker()
 
         # write raw result of del
         self._write_raw_csv_file(
@@ -1056,48 +1162,35 @@ class ConcurrentTestCase(TestCase):
             .format(repo_names_list)
         )
 
-        # Create a list to store all threads
-        thread_list = []
         # Create a dictionary to store all timing results from each thread
         time_result_dict = {}
         for thread_id in range(current_num_threads):
             time_result_dict['thread-{0}'.format(thread_id)] = []
 
+        def sync(worker, iteration):
+            """Synchronize the repository of ``worker``"""
+            repo_name = repo_names_list[worker]
+            repo_id = self.map_repo_name_id.get(repo_name, None)
+            if repo_id is None:
+                self.logger.warning('Invalid repository name!')
+                raise ValueError(repo_name)
+            return Pulp.repository_single_sync(repo_id, repo_name, worker)
+
+        engine = LoadEngine(sync)
         # sync all specified repositories and repeate X times
         for iteration in range(self.sync_iterations):
-            # for each thread, sync a single repository
-            for tid in range(current_num_threads):
-                repo_name = repo_names_list[tid]
-                repo_id = self.map_repo_name_id.get(repo_name, None)
-
-                if repo_id is None:
-                    self.logger.warning('Invalid repository name!')
-                    continue
-
-                self.logger.debug(
-                    '{0} repository {1} attempt {2} '
-                    'on {3}-repo test case starts:'
-                    .format(
-                        'Initially sync' if is_initial_sync else 'Resync',
-                        repo_name,
-                        iteration,
-                        current_num_threads
-                    )
-                )
-
-                thread = SyncThread(
-                    tid,
-                    "thread-{0}".format(tid),
-                    time_result_dict,
-                    repo_id,
-                    repo_name,
+            self.logger.debug(
+                '{0} attempt {1} on {2}-repo test case starts:'
+                .format(
+                    'Initially sync' if is_initial_sync else 'Resync',
                     iteration,
+                    current_num_threads
                 )
-                thread.start()
-                thread_list.append(thread)
-
-            # wait all threads in thread list
-            self._join_all_threads(thread_list)
+            )
+            # for each thread, sync a single repository
+            results = engine.run_closed(current_num_threads, 1)
+            for thread_name, time_list in results.by_worker().items():
+                time_result_dict[thread_name].extend(time_list)
 
             # Once all threads have completed syncs,
             # reset database before next iteration, if initial sync test
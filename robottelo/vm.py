@@ -8,14 +8,31 @@ Make sure to configure the ``clients`` section on the configuration file. Also
 make sure that the server have in place: the base images for rhel66 and rhel71,
 snap-guest and its dependencies and the ``image_dir`` path created.
 
+Booting a virtual machine takes more than a minute. When ``vm_pool_size`` is
+set on the ``clients`` section, a :class:`VirtualMachinePool` keeps that many
+booted virtual machines ready for each distro, and :class:`VirtualMachine`
+leases them instead of creating new ones. The boot times are recorded for
+each distro, see :func:`get_boot_times`.
+
 """
+import atexit
 import logging
 import os
+import socket
+import threading
 import time
 
+from collections import deque
+from multiprocessing.pool import ThreadPool
 from robottelo import ssh
 from robottelo.config import settings
-from robottelo.helpers import install_katello_ca, remove_katello_ca
+from robottelo.helpers import (
+    get_katello_ca_commands,
+    install_katello_ca,
+    remove_katello_ca,
+    wait_for,
+)
+from robottelo.performance.stat import Histogram
 
 BASE_IMAGES = (
     'rhel65',
@@ -27,6 +44,158 @@ BASE_IMAGES = (
 
 logger = logging.getLogger(__name__)
 
+#: Upper bounds of the buckets counting the boot times, in seconds.
+BOOT_TIME_BUCKETS = (
+    10, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900)
+#: Upper bounds of the buckets counting the bootstrap stage times, in seconds.
+BOOTSTRAP_TIME_BUCKETS = (
+    0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600)
+
+# Boot times of the virtual machines of each distro, see record_boot_time
+_boot_times = {}
+# Times of each bootstrap stage, see VirtualMachine.bootstrap
+_bootstrap_times = {}
+_times_lock = threading.Lock()
+# The pool configured by the clients settings, see get_vm_pool
+_vm_pool = None
+_vm_pool_lock = threading.Lock()
+
+
+def _record_time(histograms, key, seconds, buckets):
+    """Count ``seconds`` on the histogram of ``key`` of ``histograms``."""
+    with _times_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        histogram.add(seconds)
+
+
+def _summarize_times(histograms):
+    """Return the summary of each histogram of ``histograms``."""
+    with _times_lock:
+        return dict(
+            (key, histogram.summary())
+            for key, histogram in histograms.items()
+        )
+
+
+def record_boot_time(distro, seconds):
+    """Count the ``seconds`` a virtual machine of ``distro`` took to boot,
+    see :func:`get_boot_times`.
+
+    """
+    _record_time(_boot_times, distro, seconds, BOOT_TIME_BUCKETS)
+    logger.info(
+        u'%s virtual machine booted in %.1fs', distro, seconds)
+
+
+def get_boot_times():
+    """Return the distribution of the boot times of the virtual machines
+    created by this process, for each distro.
+
+    Boot times growing while more virtual machines run at the same time are
+    a sign of a saturated provisioning server.
+
+    :return: A dictionary with the
+        :meth:`robottelo.performance.stat.Histogram.summary` of the boot
+        times of each distro.
+
+    """
+    return _summarize_times(_boot_times)
+
+
+def get_bootstrap_times():
+    """Return the distribution of the times of each stage of
+    :meth:`VirtualMachine.bootstrap` run by this process.
+
+    :return: A dictionary with the
+        :meth:`robottelo.performance.stat.Histogram.summary` of the times
+        of each stage.
+
+    """
+    return _summarize_times(_bootstrap_times)
+
+
+#: Installs the katello-agent, see VirtualMachine.install_katello_agent.
+_KATELLO_AGENT_INSTALL = u'yum install -y katello-agent'
+#: Checks the katello-agent is installed.
+_KATELLO_AGENT_CHECK = u'rpm -q katello-agent'
+#: Installs puppet, see VirtualMachine.configure_puppet.
+_PUPPET_INSTALL = u'yum install puppet -y'
+#: Requests the certificate of the host to the Satellite puppet CA.
+_PUPPET_REQUEST_CERT = u'puppet agent -t'
+#: Signs the requested certificates, run on the Satellite.
+_PUPPET_SIGN_CERT = u'puppet cert sign --all'
+#: Creates the host entity. Errors at this stage can be ignored.
+_PUPPET_CREATE_HOST = u'puppet agent -t 2> /dev/null'
+
+
+def _rhel_repo_command(rhel_repo):
+    """Return the command adding the ``rhel_repo`` yum repository, see
+    :meth:`VirtualMachine.configure_rhel_repo`.
+
+    """
+    return u'wget -O /etc/yum.repos.d/rhel.repo {0}'.format(rhel_repo)
+
+
+def _puppet_conf_command():
+    """Return the command pointing puppet to the Satellite, see
+    :meth:`VirtualMachine.configure_puppet`.
+
+    """
+    sat6_hostname = settings.server.hostname
+    puppet_conf = (
+        'pluginsync      = true\n'
+        'report          = true\n'
+        'ignoreschedules = true\n'
+        'daemon          = false\n'
+        'ca_server       = {0}\n'
+        'server          = {1}\n'
+        .format(sat6_hostname, sat6_hostname)
+    )
+    return u'echo "{0}" >> /etc/puppet/puppet.conf'.format(puppet_conf)
+
+
+def _register_command(org, activation_key=None, lce=None, force=True,
+                      releasever=None):
+    """Return the ``subscription-manager register`` command, see
+    :meth:`VirtualMachine.register_contenthost`.
+
+    """
+    cmd = (u'subscription-manager register --org {0}'.format(org))
+    if activation_key is not None:
+        cmd += u' --activationkey {0}'.format(activation_key)
+    elif lce is not None:
+        cmd += u' --environment {0} --username {1} --password {2}'.format(
+            lce,
+            settings.server.admin_username,
+            settings.server.admin_password,
+        )
+    else:
+        raise VirtualMachineError(
+            'Please provide either activation key or lifecycle '
+            'environment name to successfully register a host'
+        )
+    if releasever is not None:
+        cmd += u' --release {0}'.format(releasever)
+    if force:
+        cmd += u' --force'
+    return cmd
+
+
+def _sshd_available(ip_addr, timeout=5):
+    """Return whether an SSH server answers on port 22 of ``ip_addr``."""
+    try:
+        connection = socket.create_connection((ip_addr, 22), timeout)
+    except (socket.error, socket.timeout):
+        return False
+    try:
+        return connection.recv(4).startswith(b'SSH-')
+    except (socket.error, socket.timeout):
+        return False
+    finally:
+        connection.close()
+
 
 class VirtualMachineError(Exception):
     """Exception raised for failed virtual machine management operations"""
@@ -52,11 +221,20 @@ class VirtualMachine(object):
     as per virtual machine basis. Just set the wanted values when
     instantiating.
 
+    When the virtual machine pool is enabled, see :func:`get_vm_pool`,
+    :meth:`create` leases a booted virtual machine with the katello-ca
+    installed from the pool, and :meth:`destroy` hands it back to the pool
+    which destroys it in the background. Set ``use_pool`` to ``False`` to get
+    a fresh virtual machine.
+
     """
 
+    #: Seconds :meth:`create` waits for the virtual machine to boot.
+    boot_timeout = 600
+
     def __init__(
             self, cpu=1, ram=512, distro=None, provisioning_server=None,
-            image_dir=None, tag=None):
+            image_dir=None, tag=None, use_pool=True):
         self.cpu = cpu
         self.ram = ram
         self.distro = BASE_IMAGES[-1] if distro is None else distro
@@ -89,6 +267,9 @@ class VirtualMachine(object):
         self._target_image = str(id(self))
         if tag is not None:
             self._target_image = tag + self._target_image
+        self._use_pool = use_pool
+        # The pool the virtual machine was leased from
+        self._pool = None
 
     def create(self):
         """Creates a virtual machine on the provisioning server using
@@ -101,6 +282,9 @@ class VirtualMachine(object):
         if self._created:
             return
 
+        if self._use_pool and self._lease():
+            return
+
         command_args = [
             'snap-guest',
             '-b {source_image}',
@@ -129,45 +313,108 @@ class VirtualMachine(object):
             image_dir=self.image_dir,
         )
 
+        started = time.time()
         result = ssh.command(command, self.provisioning_server)
 
         if result.return_code != 0:
             raise VirtualMachineError(
                 u'Failed to run snap-guest: {0}'.format(result.stderr))
 
-        # Give some time to machine boot
-        time.sleep(60)
+        # The domain exists from now on, destroy it if it does not boot
+        self.hostname = u'{0}.{1}'.format(self._target_image, self._domain)
+        self._created = True
+        try:
+            self._wait_for_boot(started + self.boot_timeout)
+        except Exception:
+            try:
+                self.destroy()
+            except Exception as err:  # pylint:disable=broad-except
+                logger.warning(
+                    u'Failed to destroy the %s virtual machine: %s',
+                    self.hostname, err
+                )
+            self._created = False
+            raise
+        record_boot_time(self.distro, time.time() - started)
+
+    def _wait_for_boot(self, deadline):
+        """Wait for the virtual machine to get an IP address and start sshd.
+
+        :param float deadline: The time to stop waiting at.
+        :raises robottelo.vm.VirtualMachineError: If the virtual machine is
+            not ready before the deadline.
+
+        """
+        self.ip_addr = wait_for(
+            self._get_ip_addr, deadline - time.time(), delay=5)
+        if self.ip_addr is None:
+            raise VirtualMachineError(
+                'Failed to fetch virtual machine IP address information')
+        if not wait_for(
+                lambda: _sshd_available(self.ip_addr),
+                deadline - time.time()):
+            raise VirtualMachineError(
+                u'sshd did not start on the virtual machine {0}'
+                .format(self.ip_addr)
+            )
+
+    def _get_ip_addr(self):
+        """Return the IP address of the virtual machine, resolved on the
+        provisioning server, or ``None`` if it has none yet.
 
+        """
         result = ssh.command(
             u'ping -c 1 {0}.local'.format(self._target_image),
             self.provisioning_server
         )
         if result.return_code != 0:
-            raise VirtualMachineError(
-                'Failed to fetch virtual machine IP address information')
+            return None
         output = ''.join(result.stdout)
-        self.ip_addr = output.split('(')[1].split(')')[0]
-        self.hostname = u'{0}.{1}'.format(self._target_image, self._domain)
+        return output.split('(')[1].split(')')[0]
+
+    def _lease(self):
+        """Take the place of a virtual machine leased from the pool.
+
+        :return: Whether a virtual machine was leased.
+
+        """
+        pool = get_vm_pool()
+        if pool is None or not pool.matches(self):
+            return False
+        leased = pool.lease(self.distro)
+        if leased is None:
+            return False
+        self._domain = leased._domain
+        self._target_image = leased._target_image
+        self.hostname = leased.hostname
+        self.ip_addr = leased.ip_addr
+        self._pool = pool
         self._created = True
+        return True
 
     def destroy(self):
-        """Destroys the virtual machine on the provisioning server"""
+        """Destroys the virtual machine on the provisioning server
+
+        Virtual machines leased from the pool are handed back to it, it
+        destroys them in the background.
+
+        """
         if not self._created:
             return
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self)
+            return
         if self._subscribed:
             self.unregister()
 
-        ssh.command(
-            u'virsh destroy {0}'.format(self.hostname),
-            hostname=self.provisioning_server
-        )
-        ssh.command(
-            u'virsh undefine {0}'.format(self.hostname),
-            hostname=self.provisioning_server
-        )
         image_name = u'{0}.img'.format(self.hostname)
-        ssh.command(
-            u'rm {0}'.format(os.path.join(self.image_dir, image_name)),
+        ssh.command_batch(
+            [
+                u'virsh destroy {0}'.format(self.hostname),
+                u'virsh undefine {0}'.format(self.hostname),
+                u'rm {0}'.format(os.path.join(self.image_dir, image_name)),
+            ],
             hostname=self.provisioning_server
         )
 
@@ -208,8 +455,8 @@ class VirtualMachine(object):
             installed.
 
         """
-        self.run('yum install -y katello-agent')
-        result = self.run('rpm -q katello-agent')
+        self.run(_KATELLO_AGENT_INSTALL)
+        result = self.run(_KATELLO_AGENT_CHECK)
         if result.return_code != 0:
             raise VirtualMachineError('Failed to install katello-agent')
 
@@ -247,25 +494,8 @@ class VirtualMachine(object):
             registration.
 
         """
-        cmd = (u'subscription-manager register --org {0}'.format(org))
-        if activation_key is not None:
-            cmd += u' --activationkey {0}'.format(activation_key)
-        elif lce is not None:
-            cmd += u' --environment {0} --username {1} --password {2}'.format(
-                lce,
-                settings.server.admin_username,
-                settings.server.admin_password,
-            )
-        else:
-            raise VirtualMachineError(
-                'Please provide either activation key or lifecycle '
-                'environment name to successfully register a host'
-            )
-        if releasever is not None:
-            cmd += u' --release {0}'.format(releasever)
-        if force:
-            cmd += u' --force'
-        result = self.run(cmd)
+        result = self.run(_register_command(
+            org, activation_key, lce, force, releasever))
         if result.return_code == 0:
             self._subscribed = True
         return result
@@ -294,6 +524,96 @@ class VirtualMachine(object):
         """
         return self.run(u'subscription-manager unregister')
 
+    def bootstrap(self, org, activation_key=None, lce=None,
+                  releasever=None, katello_agent=True, puppet_rhel_repo=None):
+        """Install the katello-ca, register the content host, install the
+        katello-agent and configure puppet in one pass.
+
+        Does the same as :meth:`install_katello_ca`,
+        :meth:`register_contenthost`, :meth:`install_katello_agent` and
+        :meth:`configure_puppet`, but the commands of each stage are sent as
+        a single script over the pooled connection to the virtual machine,
+        see :func:`robottelo.ssh.command_batch`, instead of one command at a
+        time. The time of each stage is recorded, see
+        :func:`get_bootstrap_times`.
+
+        :param org: Organization name to register content host for.
+        :param activation_key: Activation key name to register content host
+            with.
+        :param lce: Lifecycle environment name to register content host with,
+            when no activation key is given.
+        :param releasever: Set a release version.
+        :param bool katello_agent: Whether to install the katello-agent.
+        :param puppet_rhel_repo: Red Hat repository link from properties file
+            used to install puppet. Puppet is not configured if ``None``.
+        :return: A dictionary with the seconds spent on each stage.
+        :raises robottelo.vm.VirtualMachineError: If any stage failed.
+
+        """
+        if not self._created:
+            raise VirtualMachineError(
+                'The virtual machine should be created before bootstrapping '
+                'it'
+            )
+        timings = {}
+
+        def run_stage(stage, cmds, hostname=None):
+            """Run ``cmds`` at once and return their results by command."""
+            started = time.time()
+            results = ssh.command_batch(
+                cmds, hostname=hostname or self.ip_addr, timeout=600)
+            elapsed = time.time() - started
+            timings[stage] = timings.get(stage, 0) + elapsed
+            _record_time(
+                _bootstrap_times, stage, elapsed, BOOTSTRAP_TIME_BUCKETS)
+            return dict(zip(cmds, results))
+
+        # Not checking the install return code, as the rpm could be installed
+        # before, see robottelo.helpers.install_katello_ca
+        ca_commands = get_katello_ca_commands()
+        results = run_stage('katello-ca', list(ca_commands))
+        if results[ca_commands[-1]].return_code != 0:
+            raise VirtualMachineError(
+                'Failed to download and install the katello-ca rpm')
+
+        register_command = _register_command(
+            org, activation_key, lce, releasever=releasever)
+        result = run_stage('register', [register_command])[register_command]
+        if result.return_code != 0:
+            raise VirtualMachineError(
+                u'Failed to register the content host: {0}'
+                .format(result.stderr)
+            )
+        self._subscribed = True
+
+        if katello_agent:
+            results = run_stage('katello-agent', [
+                _KATELLO_AGENT_INSTALL,
+                _KATELLO_AGENT_CHECK,
+            ])
+            if results[_KATELLO_AGENT_CHECK].return_code != 0:
+                raise VirtualMachineError('Failed to install katello-agent')
+
+        if puppet_rhel_repo is not None:
+            results = run_stage('puppet', [
+                _rhel_repo_command(puppet_rhel_repo),
+                _PUPPET_INSTALL,
+                _puppet_conf_command(),
+                _PUPPET_REQUEST_CERT,
+            ])
+            if results[_PUPPET_INSTALL].return_code != 0:
+                raise VirtualMachineError(
+                    'Failed to install the puppet rpm')
+            # Sign the certificate requested by the first puppet run, then
+            # let the second one create the host
+            run_stage('puppet', [_PUPPET_SIGN_CERT],
+                      hostname=settings.server.hostname)
+            run_stage('puppet', [_PUPPET_CREATE_HOST])
+
+        logger.debug(
+            u'%s bootstrap timings: %s', self.hostname, timings)
+        return timings
+
     def run(self, cmd):
         """Runs a ssh command on the virtual machine
 
@@ -339,10 +659,7 @@ class VirtualMachine(object):
         # 'Access Insights', 'puppet' requires RHEL 6/7 repo and it is not
         # possible to sync the repo during the tests as they are huge(in GB's)
         # hence this adds a file in /etc/yum.repos.d/rhel6/7.repo
-        self.run(
-            'wget -O /etc/yum.repos.d/rhel.repo {0}'
-            .format(rhel_repo)
-        )
+        self.run(_rhel_repo_command(rhel_repo))
 
     def configure_puppet(self, rhel_repo=None):
         """Configures puppet on the virtual machine/Host.
@@ -351,34 +668,21 @@ class VirtualMachine(object):
         :return: None.
 
         """
-        sat6_hostname = settings.server.hostname
         self.configure_rhel_repo(rhel_repo)
-        puppet_conf = (
-            'pluginsync      = true\n'
-            'report          = true\n'
-            'ignoreschedules = true\n'
-            'daemon          = false\n'
-            'ca_server       = {0}\n'
-            'server          = {1}\n'
-            .format(sat6_hostname, sat6_hostname)
-        )
-        result = self.run(u'yum install puppet -y')
+        result = self.run(_PUPPET_INSTALL)
         if result.return_code != 0:
             raise VirtualMachineError(
                 'Failed to install the puppet rpm')
-        self.run(
-            'echo "{0}" >> /etc/puppet/puppet.conf'
-            .format(puppet_conf)
-        )
+        self.run(_puppet_conf_command())
         # This particular puppet run on client would populate a cert on sat6
         # under the capsule --> certifcates or via cli "puppet cert list", so
         # that we sign it.
-        self.run(u'puppet agent -t')
-        ssh.command(u'puppet cert sign --all')
+        self.run(_PUPPET_REQUEST_CERT)
+        ssh.command(_PUPPET_SIGN_CERT)
         # This particular puppet run would create the host entity under
         # 'All Hosts' and let's redirect stderr to /dev/null as errors at this
         # stage can be ignored.
-        self.run(u'puppet agent -t 2> /dev/null')
+        self.run(_PUPPET_CREATE_HOST)
 
     def execute_foreman_scap_client(self, policy_id=None):
         """Executes foreman_scap_client on the vm/clients to create security
@@ -463,9 +767,444 @@ class VirtualMachine(object):
                 'Unable to register client to Access Insights through '
                 'Satellite')
 
+    @classmethod
+    def create_many(cls, count, provisioning_servers=None, max_workers=None,
+                    **kwargs):
+        """Create ``count`` virtual machines concurrently::
+
+            with VirtualMachine.create_many(3, distro='rhel71') as vms:
+                for vm in vms:
+                    vm.install_katello_ca()
+
+        The virtual machines are spread over ``provisioning_servers``, each
+        one going to the server with the most free memory left once the
+        memory of the virtual machines already given to it is taken, see
+        :func:`spread_over_servers`.
+
+        If any virtual machine could not be created, the created ones are
+        destroyed before raising. Virtual machines which did not boot in time
+        are destroyed by :meth:`create` itself.
+
+        :param int count: The number of virtual machines to create.
+        :param provisioning_servers: The hostnames of the provisioning
+            servers. Defaults to the ``provisioning_server`` setting of the
+            ``clients`` section.
+        :param int max_workers: Maximum number of virtual machines created at
+            the same time. Defaults to ``count``.
+        :param kwargs: The arguments given to :class:`VirtualMachine` for
+            every virtual machine, like ``distro`` or ``ram``.
+        :return: A :class:`VirtualMachineGroup` with the created virtual
+            machines.
+        :raises robottelo.vm.VirtualMachineError: If any virtual machine
+            could not be created.
+
+        """
+        if provisioning_servers is None:
+            provisioning_servers = [settings.clients.provisioning_server]
+        servers = spread_over_servers(
+            count, provisioning_servers, kwargs.get('ram', 512))
+        group = VirtualMachineGroup(
+            [cls(provisioning_server=server, **kwargs) for server in servers],
+            max_workers=max_workers,
+        )
+        if not group:
+            return group
+
+        def create(vm):
+            try:
+                vm.create()
+            except Exception as err:  # pylint:disable=broad-except
+                return err
+
+        errors = [
+            (vm, error)
+            for vm, error in zip(group, group.map(create))
+            if error is not None
+        ]
+        if errors:
+            group.destroy()
+            raise VirtualMachineError(
+                u'{0} of {1} virtual machines could not be created:\n{2}'
+                .format(
+                    len(errors),
+                    len(group),
+                    u'\n'.join(
+                        u'{0}: {1}'.format(vm.provisioning_server, error)
+                        for vm, error in errors
+                    ),
+                )
+            )
+        return group
+
     def __enter__(self):
         self.create()
         return self
 
     def __exit__(self, *exc):
         self.destroy()
+
+
+class VirtualMachineGroup(list):
+    """A list of virtual machines destroyed concurrently, see
+    :meth:`VirtualMachine.create_many`.
+
+    It can be used as a context manager, destroying the virtual machines when
+    leaving the ``with`` block.
+
+    :param int max_workers: Maximum number of virtual machines handled at the
+        same time. Defaults to the number of virtual machines.
+
+    """
+
+    def __init__(self, vms=(), max_workers=None):
+        super(VirtualMachineGroup, self).__init__(vms)
+        self.max_workers = max_workers
+
+    def map(self, function):
+        """Call ``function`` with each virtual machine concurrently and
+        return the results, in order.
+
+        """
+        if not self:
+            return []
+        workers = ThreadPool(min(self.max_workers or len(self), len(self)))
+        try:
+            return workers.map(function, self)
+        finally:
+            workers.close()
+            workers.join()
+
+    def destroy(self):
+        """Destroy the virtual machines concurrently.
+
+        Every virtual machine is destroyed even if destroying some fails, the
+        errors are logged.
+
+        """
+        def destroy(vm):
+            try:
+                vm.destroy()
+            except Exception as err:  # pylint:disable=broad-except
+                logger.warning(
+                    u'Failed to destroy the %s virtual machine: %s',
+                    vm.hostname, err
+                )
+
+        self.map(destroy)
+
+    def bootstrap(self, *args, **kwargs):
+        """Bootstrap the virtual machines concurrently, see
+        :meth:`VirtualMachine.bootstrap`.
+
+        :return: A list with the timings of each virtual machine, in order.
+        :raises robottelo.vm.VirtualMachineError: If any bootstrap failed,
+            once they are all finished.
+
+        """
+        def bootstrap(vm):
+            try:
+                return True, vm.bootstrap(*args, **kwargs)
+            except Exception as err:  # pylint:disable=broad-except
+                return False, err
+
+        outcomes = self.map(bootstrap)
+        errors = [
+            (vm, outcome)
+            for vm, (success, outcome) in zip(self, outcomes)
+            if not success
+        ]
+        if errors:
+            raise VirtualMachineError(
+                u'{0} of {1} virtual machines could not be bootstrapped:\n'
+                u'{2}'.format(
+                    len(errors),
+                    len(self),
+                    u'\n'.join(
+                        u'{0}: {1}'.format(vm.hostname, error)
+                        for vm, error in errors
+                    ),
+                )
+            )
+        return [outcome for _, outcome in outcomes]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.destroy()
+
+
+def get_free_memory(provisioning_server):
+    """Return the MiB of memory available on ``provisioning_server``, or
+    ``None`` if it could not be read.
+
+    """
+    result = ssh.command(
+        u"awk '/^MemAvailable:/ {print $2}' /proc/meminfo",
+        provisioning_server,
+    )
+    try:
+        return int(u''.join(result.stdout).strip()) // 1024
+    except (TypeError, ValueError):
+        return None
+
+
+def spread_over_servers(count, provisioning_servers, ram):
+    """Pick the provisioning server of each of ``count`` virtual machines
+    using ``ram`` MiB of memory.
+
+    Each virtual machine goes to the server with the most free memory, see
+    :func:`get_free_memory`, minus the memory of the virtual machines already
+    given to it. The servers whose free memory could not be read are picked
+    once no other server has room left.
+
+    :return: A list with the hostname of the provisioning server of each
+        virtual machine.
+
+    """
+    provisioning_servers = list(provisioning_servers)
+    if len(provisioning_servers) == 1:
+        return provisioning_servers * count
+    free = dict(
+        (server, get_free_memory(server)) for server in provisioning_servers)
+    servers = []
+    for _ in range(count):
+        server = max(
+            provisioning_servers,
+            key=lambda server: (
+                free[server] is not None and free[server] >= ram,
+                free[server] or 0,
+                -servers.count(server),
+            )
+        )
+        if free[server] is not None:
+            free[server] -= ram
+        servers.append(server)
+    return servers
+
+
+class VirtualMachinePool(object):
+    """Keep booted virtual machines with the katello-ca installed ready to be
+    leased.
+
+    ``size`` virtual machines are kept ready for each distro of ``distros``.
+    Every time a virtual machine is leased or released, the virtual machines
+    needed to get back to ``size`` are provisioned in the background, and the
+    released ones are destroyed in the background too.
+
+    Only the virtual machines with the same ``cpu``, ``ram``,
+    ``provisioning_server`` and ``image_dir`` as the pool are leased from it,
+    see :meth:`matches`.
+
+    :param int size: Number of virtual machines kept ready for each distro.
+    :param distros: The distros of the pool. Defaults to ``BASE_IMAGES``.
+    :param int max_workers: Maximum number of virtual machines provisioned or
+        destroyed at the same time. Defaults to ``size`` times the number of
+        distros.
+
+    """
+
+    def __init__(self, size=1, distros=None, cpu=1, ram=512,
+                 provisioning_server=None, image_dir=None, max_workers=None):
+        self.size = size
+        self.distros = tuple(BASE_IMAGES if distros is None else distros)
+        self.cpu = cpu
+        self.ram = ram
+        if provisioning_server is None:
+            provisioning_server = settings.clients.provisioning_server
+        self.provisioning_server = provisioning_server
+        if image_dir is None:
+            image_dir = settings.clients.image_dir
+        self.image_dir = image_dir
+        self.max_workers = max_workers or size * len(self.distros)
+        self.leased = 0
+        #: Counters of the leases served from the pool (``hits``) or not
+        #: (``misses``), and the virtual machines ``created``, ``failed`` to
+        #: provision and ``destroyed`` by the pool.
+        self.counters = dict.fromkeys(
+            ('hits', 'misses', 'created', 'failed', 'destroyed'), 0)
+        self._ready = dict((distro, deque()) for distro in self.distros)
+        self._provisioning = dict.fromkeys(self.distros, 0)
+        self._condition = threading.Condition()
+        self._workers = None
+        self._closed = False
+
+    def matches(self, vm):
+        """Return whether ``vm`` can be leased from this pool."""
+        return (
+            vm.distro in self.distros and
+            vm.cpu == self.cpu and
+            vm.ram == self.ram and
+            vm.provisioning_server == self.provisioning_server and
+            vm.image_dir == self.image_dir
+        )
+
+    def start(self):
+        """Start provisioning the virtual machines of every distro."""
+        for distro in self.distros:
+            self._fill(distro)
+
+    def _fill(self, distro):
+        """Provision the virtual machines missing to get ``size`` of
+        ``distro``.
+
+        """
+        with self._condition:
+            if self._closed:
+                return
+            if self._workers is None:
+                self._workers = ThreadPool(self.max_workers)
+            missing = (
+                self.size -
+                len(self._ready[distro]) -
+                self._provisioning[distro]
+            )
+            for _ in range(missing):
+                self._provisioning[distro] += 1
+                self._workers.apply_async(self._provision, (distro,))
+
+    def _provision(self, distro):
+        """Create a virtual machine of ``distro`` and make it ready."""
+        vm = VirtualMachine(
+            cpu=self.cpu,
+            ram=self.ram,
+            distro=distro,
+            provisioning_server=self.provisioning_server,
+            image_dir=self.image_dir,
+            tag='pool',
+            use_pool=False,
+        )
+        try:
+            vm.create()
+            vm.install_katello_ca()
+        except Exception as err:  # pylint:disable=broad-except
+            logger.warning(
+                u'Failed to provision a %s virtual machine for the pool: %s',
+                distro, err
+            )
+            self._destroy(vm)
+            with self._condition:
+                self._provisioning[distro] -= 1
+                self.counters['failed'] += 1
+                self._condition.notify_all()
+            return
+        with self._condition:
+            self._provisioning[distro] -= 1
+            self.counters['created'] += 1
+            closed = self._closed
+            if not closed:
+                self._ready[distro].append(vm)
+            self._condition.notify_all()
+        if closed:
+            self._destroy(vm)
+
+    def _destroy(self, vm):
+        """Destroy ``vm``, logging the errors."""
+        try:
+            vm.destroy()
+        except Exception as err:  # pylint:disable=broad-except
+            logger.warning(
+                u'Failed to destroy the %s virtual machine: %s',
+                vm.hostname, err
+            )
+        else:
+            with self._condition:
+                self.counters['destroyed'] += 1
+
+    def lease(self, distro):
+        """Take a ready virtual machine of ``distro`` out of the pool.
+
+        If none is ready but some are being provisioned, wait for them, as
+        they are ready sooner than a new virtual machine would be.
+
+        :return: The leased :class:`VirtualMachine`, or ``None`` if none is
+            ready nor being provisioned.
+
+        """
+        with self._condition:
+            while (not self._ready[distro] and
+                   self._provisioning[distro] > 0 and not self._closed):
+                self._condition.wait(1)
+            if self._ready[distro]:
+                vm = self._ready[distro].popleft()
+                self.leased += 1
+                self.counters['hits'] += 1
+            else:
+                vm = None
+                self.counters['misses'] += 1
+        self._fill(distro)
+        logger.debug(u'Virtual machine pool: %s', self.stats())
+        return vm
+
+    def release(self, vm):
+        """Destroy the leased ``vm`` in the background and provision its
+        replacement.
+
+        """
+        with self._condition:
+            self.leased -= 1
+            workers = None if self._closed else self._workers
+            if workers is not None:
+                workers.apply_async(self._destroy, (vm,))
+        if workers is None:
+            self._destroy(vm)
+        self._fill(vm.distro)
+
+    def stats(self):
+        """Return the pool size metrics.
+
+        :return: A dictionary with the number of virtual machines ``ready``
+            and ``provisioning`` for each distro, the number of virtual
+            machines currently ``leased`` and the :attr:`counters`.
+
+        """
+        with self._condition:
+            stats = {
+                'leased': self.leased,
+                'ready': dict(
+                    (distro, len(vms)) for distro, vms in self._ready.items()),
+                'provisioning': dict(self._provisioning),
+            }
+            stats.update(self.counters)
+        return stats
+
+    def close(self):
+        """Destroy the ready virtual machines and wait for the ones being
+        provisioned or destroyed.
+
+        The virtual machines still leased are not destroyed.
+
+        """
+        with self._condition:
+            self._closed = True
+            ready = [vm for vms in self._ready.values() for vm in vms]
+            for vms in self._ready.values():
+                vms.clear()
+            workers, self._workers = self._workers, None
+            self._condition.notify_all()
+        for vm in ready:
+            self._destroy(vm)
+        if workers is not None:
+            workers.close()
+            workers.join()
+
+
+def get_vm_pool():
+    """Return the virtual machine pool configured by the ``vm_pool_size``
+    setting of the ``clients`` section, or ``None`` if it is not set.
+
+    The pool is started the first time it is returned and closed when the
+    interpreter exits.
+
+    """
+    global _vm_pool  # pylint:disable=global-statement
+    size = settings.clients.vm_pool_size
+    if _vm_pool is None and isinstance(size, int) and size > 0:
+        with _vm_pool_lock:
+            if _vm_pool is None:
+                pool = VirtualMachinePool(
+                    size, distros=settings.clients.vm_pool_distros)
+                pool.start()
+                atexit.register(pool.close)
+                _vm_pool = pool
+    return _vm_pool
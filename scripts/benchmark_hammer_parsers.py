@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Benchmark the hammer output parsers of ``robottelo.cli.hammer``.
+
+Each parser is run over a hammer output and its throughput in lines (or JSON
+entries) per second is printed. By default the outputs are generated to look
+like the outputs of large entities: a content view ``info`` with nested
+numbered lists, a 10000 rows ``content-host list`` CSV and its JSON version.
+Recorded outputs can be given instead, one hammer output per file::
+
+    scripts/benchmark_hammer_parsers.py --info info.txt --csv list.csv
+
+"""
+from __future__ import print_function
+import argparse
+import io
+import timeit
+
+from robottelo.cli import hammer
+
+
+def generate_info_output(items=500):
+    """Generate the ``info`` output of an entity with numbered lists."""
+    lines = [
+        u'ID:          1',
+        u'Name:        Big Content View',
+        u'Label:       Big_Content_View',
+        u'Composite:   no',
+        u'Description:',
+        u'Yum Repositories:',
+    ]
+    for number in range(1, items + 1):
+        lines.extend([
+            u' {0}) ID:    {0}'.format(number),
+            u'    Name:  Repository {0}'.format(number),
+            u'    Label: repository_{0}'.format(number),
+        ])
+    lines.append(u'Puppet Modules:')
+    for number in range(1, items + 1):
+        lines.append(u' {0}) module_{0}'.format(number))
+    lines.append(u'Parameters:')
+    for number in range(1, items + 1):
+        lines.append(u' key{0} => value{0}'.format(number))
+    return lines
+
+
+def generate_csv_output(rows=10000):
+    """Generate the CSV output of a long ``list``."""
+    lines = [u'ID,Name,Installable Errata,Content View,Lifecycle Environment']
+    for number in range(1, rows + 1):
+        lines.append(
+            u'{0},host{0}.example.com,"{1} security, {1} bugfix",'
+            u'Default Organization View,Library'.format(number, number % 7)
+        )
+    return lines
+
+
+def generate_json_output(rows=10000):
+    """Generate the JSON output of a long ``list``."""
+    return u'[{0}]'.format(u','.join(
+        u'{{"ID": {0}, "Name": "host{0}.example.com", '
+        u'"Content View": "Default Organization View", '
+        u'"Lifecycle Environment": "Library"}}'.format(number)
+        for number in range(1, rows + 1)
+    ))
+
+
+def generate_help_output(options=200):
+    """Generate the ``--help`` output of a command with many options."""
+    lines = [
+        u'Usage:',
+        u'    hammer content-view [OPTIONS] SUBCOMMAND [ARG] ...',
+        u'',
+        u'Subcommands:',
+    ]
+    for number in range(1, options + 1):
+        lines.extend([
+            u' subcommand-{0:<16} Subcommand number {0}'.format(number),
+            u'                             which has a long description',
+        ])
+    lines.extend([u'', u'Options:'])
+    for number in range(1, options + 1):
+        lines.extend([
+            u' --option-{0:<6} VALUE       Option number {0}'.format(number),
+            u'                             which has a long help',
+        ])
+    return lines
+
+
+def read_output(path):
+    """Read a recorded hammer output and return its lines."""
+    with io.open(path, encoding='utf-8') as handler:
+        return handler.read().splitlines()
+
+
+def benchmark(name, parser, output, lines, repeat):
+    """Run ``parser`` over ``output`` and print the best throughput."""
+    best = min(timeit.repeat(lambda: parser(output), number=1, repeat=repeat))
+    print('{0:<12} {1:>8} items {2:>10.4f}s {3:>12.0f} items/s'.format(
+        name, lines, best, lines / best))
+
+
+def main():
+    """Parse the arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--info', help='recorded output of an info command')
+    parser.add_argument('--csv', help='recorded CSV output of a list command')
+    parser.add_argument('--json', help='recorded JSON output of a command')
+    parser.add_argument('--help-output', help='recorded output of --help')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    info = read_output(args.info) if args.info else generate_info_output()
+    csv = read_output(args.csv) if args.csv else generate_csv_output()
+    if args.json:
+        json = u'\n'.join(read_output(args.json))
+    else:
+        json = generate_json_output()
+
+    if args.help_output:
+        help_ = read_output(args.help_output)
+    else:
+        help_ = generate_help_output()
+
+    benchmark('parse_help', hammer.parse_help, help_, len(help_), args.repeat)
+    benchmark('parse_info', hammer.parse_info, info, len(info), args.repeat)
+    benchmark('parse_csv', hammer.parse_csv, csv, len(csv), args.repeat)
+    benchmark(
+        'parse_json',
+        lambda output: hammer.to_text_output(hammer.parse_json(output)),
+        json,
+        len(hammer.parse_json(json)),
+        args.repeat,
+    )
+
+
+if __name__ == '__main__':
+    main()
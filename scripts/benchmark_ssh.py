@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Benchmark the client side of ``robottelo.ssh`` and ``robottelo.cli``.
+
+The commands are run against a :class:`robottelo.fake_ssh.FakeSSHServer` on
+localhost, so the server time is fixed by the latency profile and only the
+client overhead changes between runs::
+
+    scripts/benchmark_ssh.py --profile lan --commands 100
+
+Recorded hammer responses can be served with ``--responses``, see
+:func:`robottelo.fake_ssh.load_responses`.
+
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from robottelo import fake_ssh, ssh
+from robottelo.cli.org import Org
+
+
+def generate_responses(rows):
+    """Generate the responses used by the benchmarks."""
+    return [
+        fake_ssh.make_response(r'^true$'),
+        fake_ssh.make_response(
+            r'hammer .*--output=csv organization list',
+            [u'ID,Name,Label,Description'] + [
+                u'{0},Organization {0},organization_{0},'.format(number)
+                for number in range(1, rows + 1)
+            ],
+        ),
+    ]
+
+
+def benchmark(name, function, count):
+    """Run ``function`` and print how long it took."""
+    started = time.time()
+    function()
+    elapsed = time.time() - started
+    print('{0:<24} {1:>6} commands {2:>9.3f}s {3:>9.1f} commands/s'.format(
+        name, count, elapsed, count / elapsed))
+
+
+def run_unpooled(count):
+    """Run ``count`` commands, each on a new connection."""
+    for _ in range(count):
+        with ssh.get_connection() as connection:
+            ssh.execute_command('true', connection)
+
+
+def run_pooled(count):
+    """Run ``count`` commands on the pooled connection."""
+    for _ in range(count):
+        ssh.command('true')
+
+
+def main():
+    """Parse the arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--profile',
+        default='lan',
+        choices=sorted(fake_ssh.PROFILES),
+        help='latency profile of the server',
+    )
+    parser.add_argument('--commands', type=int, default=50)
+    parser.add_argument(
+        '--rows', type=int, default=10000, help='rows of the listed output')
+    parser.add_argument('--responses', help='recorded responses JSON file')
+    args = parser.parse_args()
+
+    responses = generate_responses(args.rows)
+    if args.responses:
+        responses = fake_ssh.load_responses(args.responses) + responses
+    count = args.commands
+    with fake_ssh.FakeSSHServer(responses, args.profile) as server:
+        with server.patch_ssh():
+            benchmark('unpooled connections', lambda: run_unpooled(count),
+                      count)
+            benchmark('pooled connection', lambda: run_pooled(count), count)
+            benchmark(
+                'batch',
+                lambda: ssh.command_batch(['true'] * count),
+                count,
+            )
+            benchmark(
+                'multiplexed',
+                lambda: ssh.multiplex_commands(['true'] * count),
+                count,
+            )
+            benchmark('list {0} rows'.format(args.rows), Org.list, 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Run a load agent driven by ``robottelo.performance.distributed``.
+
+Start it on each load generator host, then list the agents on the
+``[performance] load_agents`` setting of the machine running the tests::
+
+    scripts/load_agent.py --host 0.0.0.0 --port 5555
+
+The scenarios run with the agent settings, like the ssh credentials used to
+reach the clients, so the agent host needs its own ``robottelo.properties``
+on the robottelo project root, as the test runner does.
+
+The agent only runs the Candlepin scenarios of
+``robottelo.performance.distributed.SCENARIOS`` and the ones given with
+``--scenario``, but should still only be exposed on a trusted network.
+
+"""
+import argparse
+
+from robottelo.config import settings
+from robottelo.performance.distributed import SCENARIOS, LoadAgent
+
+
+def main():
+    """Parse the arguments and serve the coordinators."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        dest='scenarios',
+        default=[],
+        help='import path, as module:function, of a scenario to run besides '
+             'the default ones',
+    )
+    args = parser.parse_args()
+    settings.configure()
+    agent = LoadAgent(
+        args.host, args.port, SCENARIOS.union(args.scenarios))
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+
+
+if __name__ == '__main__':
+    main()
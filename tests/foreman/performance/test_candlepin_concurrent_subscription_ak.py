@@ -21,6 +21,8 @@ from robottelo.performance.constants import (
     ACTIVATION_KEY,
     CONTENT_VIEW,
     LIFE_CYCLE_ENV,
+    OPEN_LOOP_DURATION,
+    OPEN_LOOP_RATES,
     QUANTITY,
     RAW_AK_FILE_NAME,
     STAT_AK_FILE_NAME,
@@ -193,3 +195,27 @@ class ConcurrentSubActivationKeyTestCase(ConcurrentTestCase):
 
         """
         self.kick_off_ak_test(self.num_threads[5], 5000)
+
+    def test_subscribe_ak_open_loop(self):
+        """Subscribe system by activation key at increasing fixed rates
+
+        @id: 50f5beb9-8a7f-4758-9308-2ddaa73f9fe4
+
+        @Steps:
+
+        1. create activation key (setup)
+        2. get subscription id (setup)
+        3. add activation key to subscription (setup)
+        4. register all virtual machines at each rate, whether the previous
+           registrations are finished or not
+        5. stop at the rate Candlepin throughput can't keep up with
+        6. produce result of timing and saturation rate
+
+        @Assert: Restoring where there's no activation key or registration
+
+        """
+        saturation = self.kick_off_ak_open_loop_test(
+            OPEN_LOOP_RATES, OPEN_LOOP_DURATION)
+        self.logger.info(
+            'Registration by ak saturates at {0} per second'
+            .format(saturation))
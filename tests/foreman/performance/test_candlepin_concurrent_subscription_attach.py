@@ -16,6 +16,8 @@
 """
 from robottelo.performance.constants import (
     ATTACH_ENV,
+    OPEN_LOOP_DURATION,
+    OPEN_LOOP_RATES,
     RAW_ATT_FILE_NAME,
     RAW_REG_FILE_NAME,
     STAT_ATT_FILE_NAME,
@@ -132,3 +134,24 @@ class ConcurrentSubAttachTestCase(ConcurrentTestCase):
 
         """
         self.kick_off_att_test(self.num_threads[5], 5000)
+
+    def test_register_attach_open_loop(self):
+        """Register and attach system at increasing fixed rates
+
+        @id: 62504594-5e7e-46dc-ba4d-5ae793292ebd
+
+        @Steps:
+
+        1. register and attach all virtual machines at each rate, whether the
+           previous registrations are finished or not
+        2. stop at the rate Candlepin throughput can't keep up with
+        3. produce result of timing and saturation rate
+
+        @Assert: Restoring from database without any registered systems.
+
+        """
+        saturation = self.kick_off_att_open_loop_test(
+            OPEN_LOOP_RATES, OPEN_LOOP_DURATION)
+        self.logger.info(
+            'Registration and attach saturates at {0} per second'
+            .format(saturation))
@@ -0,0 +1,76 @@
+"""Tests for module ``robottelo.performance.candlepin``."""
+import six
+import threading
+import time
+import unittest2
+
+from robottelo import ssh
+from robottelo.performance.candlepin import Candlepin
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+
+class OpenLoopTestCase(unittest2.TestCase):
+    """Tests for registering clients at a fixed rate"""
+
+    def setUp(self):
+        self.busy = set()
+        self.overlaps = []
+        self.lock = threading.Lock()
+
+    def command(self, cmd, hostname):
+        """Pretend to run ``cmd`` on the client, registering for 0.1s."""
+        if 'register' not in cmd:
+            return ssh.SSHCommandResult()
+        with self.lock:
+            self.overlaps.append(hostname in self.busy)
+            self.busy.add(hostname)
+        time.sleep(0.1)
+        with self.lock:
+            self.busy.discard(hostname)
+        return ssh.SSHCommandResult(stderr='real 0.10\nuser 0.01\n')
+
+    @mock.patch('robottelo.performance.candlepin.ssh.command')
+    def test_register_activation_key(self, command):
+        """Registrations queue when every client is busy"""
+        command.side_effect = self.command
+        results = Candlepin.open_loop_register_activation_key(
+            'ak', 'org', ['192.168.0.1', '192.168.0.2'], 50, count=6)
+        self.assertEqual(len(results), 6)
+        self.assertFalse(any(self.overlaps))
+        self.assertEqual(results.latencies(), [0.1] * 6)
+        # 2 clients take 0.3s for 6 registrations of 0.1s, the last ones
+        # wait for a free client
+        self.assertGreater(max(results.delays()), 0.1)
+        self.assertGreater(results.summary()['response_max'], 0.2)
+
+    @mock.patch('robottelo.performance.candlepin.ssh.command')
+    def test_failed_registrations(self, command):
+        """Failed registrations are recorded as errors"""
+        attaches = []
+
+        def fail_every_other_attach(cmd, hostname):
+            """Fail every other attach, as an overloaded Candlepin would."""
+            if 'attach' in cmd:
+                with self.lock:
+                    attaches.append(cmd)
+                    failed = len(attaches) % 2 == 0
+                if failed:
+                    return ssh.SSHCommandResult(
+                        stderr='No pools\nreal 0.01\n', return_code=1)
+                return ssh.SSHCommandResult(stderr='real 0.01\n')
+            return self.command(cmd, hostname)
+
+        command.side_effect = fail_every_other_attach
+        results = Candlepin.open_loop_register_attach(
+            'sub', 'org', 'env', ['192.168.0.1', '192.168.0.2'], 50, count=4)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(results.failures()), 2)
+        self.assertTrue(all(
+            results.errors[index].startswith(u'CandlepinError')
+            for index in results.failures()
+        ))
+        self.assertEqual(results.summary()['errors'], 2)
@@ -1,7 +1,15 @@
 import six
+from six import text_type
+import time
 import unittest2
 
-from robottelo.cli.base import Base, CLIReturnCodeError, CLIError
+from robottelo.cli.base import (
+    Base,
+    CLIBulkError,
+    CLIError,
+    CLIReturnCodeError,
+    ResponseCache,
+)
 
 if six.PY2:
     import mock
@@ -15,6 +23,19 @@ class CLIClass(Base):
     foreman_admin_password = 'adminpassword'
 
 
+class SleepyCLIClass(Base):
+    """Class used for the concurrent execution tests"""
+    command_base = 'sleepy'
+
+    @classmethod
+    def execute(cls, command, *args, **kwargs):
+        """Give the other threads the time to change the subcommand"""
+        time.sleep(0.01)
+        if u'fail' in command:
+            raise CLIReturnCodeError(1, u'error', u'failed')
+        return cls._construct_command()
+
+
 class BaseCliTestCase(unittest2.TestCase):
     """Tests for the Base cli class"""
 
@@ -237,6 +258,261 @@ class BaseCliTestCase(unittest2.TestCase):
         self.assert_cmd_execution(construct, execute, Base.dump, 'dump')
 
 
+class ExecuteManyTestCase(unittest2.TestCase):
+    """Tests for running several cli commands concurrently"""
+
+    def test_execute_many(self):
+        """Results are in the tasks order and subcommands don't mix"""
+        tasks = [
+            (SleepyCLIClass, 'create', {u'name': i}) if i % 2 else
+            (SleepyCLIClass, 'delete-parameter', {u'name': i})
+            for i in range(10)
+        ]
+        results = Base.execute_many(tasks, max_workers=5)
+        self.assertEqual(
+            results,
+            [
+                u'sleepy {0} '.format(
+                    'create' if i % 2 else 'delete-parameter')
+                for i in range(10)
+            ]
+        )
+
+    def test_execute_many_errors(self):
+        """Errors are raised together once all tasks are finished"""
+        with self.assertRaises(CLIBulkError) as context:
+            SleepyCLIClass.map(
+                'delete', [None, {u'fail': True}, None, {u'fail': True}])
+        error = context.exception
+        self.assertEqual(
+            error.results, [u'sleepy delete ', None, u'sleepy delete ', None])
+        self.assertEqual([index for index, _, _ in error.errors], [1, 3])
+        self.assertIsInstance(error.errors[0][2], CLIReturnCodeError)
+
+    def test_execute_many_empty(self):
+        """No task gives no result"""
+        self.assertEqual(Base.execute_many([]), [])
+
+
+class IterListTestCase(unittest2.TestCase):
+    """Tests for listing entities one page at a time"""
+
+    def setUp(self):
+        patcher = mock.patch('robottelo.cli.base.Base.list')
+        self.list = patcher.start()
+        self.addCleanup(patcher.stop)
+        rows = [{u'id': text_type(number)} for number in range(5)]
+        self.list.side_effect = lambda options: rows[
+            (options[u'page'] - 1) * options[u'per-page']:
+            options[u'page'] * options[u'per-page']
+        ]
+
+    def fetched_pages(self):
+        return [call[0][0][u'page'] for call in self.list.call_args_list]
+
+    def test_iter_list(self):
+        """All the pages are fetched with the given options"""
+        rows = list(Base.iter_list({u'search': u'name=foo'}, per_page=2))
+        self.assertEqual([row[u'id'] for row in rows], list(u'01234'))
+        self.assertEqual(self.fetched_pages(), [1, 2, 3])
+        self.assertEqual(
+            self.list.call_args[0][0],
+            {u'search': u'name=foo', u'page': 3, u'per-page': 2}
+        )
+
+    def test_full_last_page(self):
+        """An empty page ends the iteration"""
+        rows = list(Base.iter_list(per_page=5, prefetch=False))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(self.fetched_pages(), [1, 2])
+
+    def test_stop(self):
+        """No more pages are fetched once the caller stops iterating"""
+        rows = Base.iter_list(per_page=1)
+        next(rows)
+        next(rows)
+        rows.close()
+        # Give a late page prefetch the time to run
+        time.sleep(0.05)
+        self.assertEqual(self.fetched_pages(), [1, 2, 3])
+        rows = Base.iter_list(per_page=1, prefetch=False)
+        self.list.reset_mock()
+        next(rows)
+        rows.close()
+        self.assertEqual(self.fetched_pages(), [1])
+
+
+class CachedCLIClass(Base):
+    """Class used for the response cache tests"""
+    command_base = 'cached'
+    command_requires_org = False
+    foreman_admin_username = 'admin'
+    foreman_admin_password = 'changeme'
+
+
+class OtherCachedCLIClass(CachedCLIClass):
+    """Class used for the response cache invalidation tests"""
+    command_base = 'other'
+
+
+class ResponseCacheTestCase(unittest2.TestCase):
+    """Tests for caching the info and list responses"""
+
+    def setUp(self):
+        Base.response_cache = ResponseCache(ttl=60, maxsize=3)
+        self.addCleanup(setattr, Base, 'response_cache', None)
+        patcher = mock.patch('robottelo.cli.base.Base.execute')
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.execute.side_effect = lambda *args, **kwargs: [u'Id: 1']
+
+    def test_cached_info(self):
+        """An info is run once and copies of its response are returned"""
+        first = CachedCLIClass.info({u'id': 1})
+        first['id'] = u'2'
+        second = CachedCLIClass.info({u'id': 1})
+        self.assertEqual(second, {u'id': u'1'})
+        self.assertEqual(self.execute.call_count, 1)
+        self.assertEqual(Base.response_cache.hits, 1)
+        self.assertEqual(Base.response_cache.misses, 1)
+
+    def test_cache_key(self):
+        """Responses are cached by options and user"""
+        CachedCLIClass.list({u'search': u'name=foo'})
+        CachedCLIClass.list({u'search': u'name=bar'})
+        CachedCLIClass.with_user('viewer', 'changeme').list(
+            {u'search': u'name=foo'})
+        CachedCLIClass.list({u'search': u'name=foo'}, per_page=False)
+        self.assertEqual(self.execute.call_count, 4)
+
+    def test_lru_eviction(self):
+        """The least recently used responses are evicted"""
+        for name in ('a', 'b', 'c'):
+            CachedCLIClass.info({u'name': name})
+        CachedCLIClass.info({u'name': 'a'})
+        CachedCLIClass.info({u'name': 'd'})
+        self.assertEqual(self.execute.call_count, 4)
+        CachedCLIClass.info({u'name': 'a'})
+        self.assertEqual(self.execute.call_count, 4)
+        CachedCLIClass.info({u'name': 'b'})
+        self.assertEqual(self.execute.call_count, 5)
+
+    def test_ttl(self):
+        """Responses expire after the cache ttl"""
+        Base.response_cache = ResponseCache(ttl=0.05)
+        CachedCLIClass.info({u'id': 1})
+        time.sleep(0.1)
+        CachedCLIClass.info({u'id': 1})
+        self.assertEqual(self.execute.call_count, 2)
+
+    def test_disabled(self):
+        """Nothing is cached when the cache is disabled"""
+        Base.response_cache = None
+        CachedCLIClass.info({u'id': 1})
+        CachedCLIClass.info({u'id': 1})
+        self.assertEqual(self.execute.call_count, 2)
+
+
+class ResponseCacheInvalidationTestCase(unittest2.TestCase):
+    """Tests for dropping cached responses when running commands"""
+
+    def setUp(self):
+        Base.response_cache = ResponseCache()
+        self.addCleanup(setattr, Base, 'response_cache', None)
+
+    @mock.patch('robottelo.cli.base.settings')
+    @mock.patch('robottelo.cli.base.ssh.command')
+    def test_invalidation(self, command, settings):
+        """Only commands changing the server drop the cached responses of
+        the same command base
+        """
+        command.return_value.return_code = 0
+        command.return_value.stderr = u''
+        command.return_value.stdout = [{u'id': u'1'}]
+        settings.hammer_backend = 'ssh'
+        CachedCLIClass.list()
+        OtherCachedCLIClass.list()
+        self.assertEqual(len(Base.response_cache), 2)
+        CachedCLIClass.exists(search=('name', 'foo'))
+        self.assertEqual(len(Base.response_cache), 3)
+        CachedCLIClass.delete({u'id': 1})
+        self.assertEqual(len(Base.response_cache), 1)
+        CachedCLIClass.list()
+        self.assertEqual(command.call_count, 5)
+
+
+class JSONCLIClass(Base):
+    """Class used for the JSON output tests"""
+    command_base = 'json'
+    command_requires_org = False
+    json_output = True
+
+
+class JSONOutputTestCase(unittest2.TestCase):
+    """Tests for requesting JSON output to hammer"""
+
+    def setUp(self):
+        patcher = mock.patch('robottelo.cli.base.Base.execute')
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('robottelo.cli.base._json_unsupported', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_info(self):
+        """info requests JSON output and converts it"""
+        self.execute.return_value = {
+            u'id': u'1', u'versions': {u'1': {u'id': u'2'}}}
+        self.assertEqual(
+            JSONCLIClass.info({u'id': 1}),
+            {u'id': u'1', u'versions': [{u'id': u'2'}]}
+        )
+        self.execute.assert_called_once_with(
+            u'json info --id="1"', output_format='json')
+
+    def test_list_fallback(self):
+        """list falls back to CSV output when the output is not JSON"""
+        self.execute.side_effect = [ValueError, [{u'id': u'1'}]]
+        self.assertEqual(JSONCLIClass.list(), [{u'id': u'1'}])
+        self.assertEqual(
+            self.execute.call_args_list[1][1], {'output_format': 'csv'})
+        self.execute.side_effect = None
+        self.execute.return_value = []
+        JSONCLIClass.list()
+        self.assertEqual(
+            self.execute.call_args_list[2][1], {'output_format': 'csv'})
+
+    @mock.patch('robottelo.cli.base.Base.info')
+    def test_create(self, info):
+        """create accepts the object output by hammer JSON"""
+        self.execute.return_value = {u'message': u'Created', u'id': 3}
+        info.return_value = {u'id': u'3', u'name': u'foo'}
+        self.assertEqual(
+            JSONCLIClass.create({u'name': u'foo'}), info.return_value)
+        info.assert_called_once_with({u'id': 3})
+
+    @mock.patch('robottelo.cli.base.Base.info')
+    def test_create_info_fields(self, info):
+        """create skips info when the output has the needed fields"""
+        self.execute.return_value = {u'message': u'Created', u'id': 3}
+        isolated_class = type(
+            'JSONCLIClass', (JSONCLIClass,), {'create_info_fields': ['id']})
+        self.assertEqual(
+            isolated_class.create({u'name': u'foo'}),
+            {u'message': u'Created', u'id': 3}
+        )
+        isolated_class.create_info_fields = ['id', 'name']
+        isolated_class.create({u'name': u'foo'})
+        info.assert_called_once_with({u'id': 3})
+
+    def test_create_not_json(self):
+        """create is not run again when the output is not JSON"""
+        self.execute.side_effect = ValueError
+        with self.assertRaises(CLIError):
+            JSONCLIClass.create({u'name': u'foo'})
+        self.assertEqual(self.execute.call_count, 1)
+
+
 class CLIReturnCodeErrorTestCase(unittest2.TestCase):
     """Tests for the CLIReturnCodeError cli class"""
 
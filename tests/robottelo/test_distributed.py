@@ -0,0 +1,151 @@
+"""Tests for module ``robottelo.performance.distributed``."""
+import os
+import six
+import socket
+import time
+import unittest2
+
+from robottelo.performance import distributed
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+SCENARIOS = ('tests.robottelo.test_distributed:scenario',
+             'tests.robottelo.test_distributed:missing')
+
+
+def scenario(worker, iteration, delay=0, fail=None):
+    """Scenario run by the agents, returning the agent process and time."""
+    time.sleep(delay)
+    if iteration == fail:
+        raise ValueError('failed')
+    return [os.getpid(), time.time()]
+
+
+class SplitLoadTestCase(unittest2.TestCase):
+    """Tests for splitting the load between agents"""
+
+    def test_split_load(self):
+        """Shares differ by one at most"""
+        self.assertEqual(distributed.split_load(10, 3), [4, 3, 3])
+        self.assertEqual(distributed.split_load(2, 3), [1, 1, 0])
+
+    def test_load_scenario(self):
+        """Only the allowed scenarios are imported"""
+        function = distributed.load_scenario(
+            'tests.robottelo.test_distributed:scenario',
+            {'fail': 0},
+            SCENARIOS,
+        )
+        with self.assertRaises(ValueError):
+            function(0, 0)
+        for path in ('tests.robottelo.test_distributed:scenario',
+                     'os:system',
+                     'robottelo.ssh:command'):
+            with self.assertRaises(distributed.DistributedLoadError):
+                distributed.load_scenario(path)
+        with self.assertRaises(distributed.DistributedLoadError):
+            distributed.load_scenario(
+                'tests.robottelo.test_distributed:missing', None, SCENARIOS)
+        for path in distributed.SCENARIOS:
+            self.assertTrue(callable(distributed.load_scenario(path)))
+
+    def test_load_scenario_not_imported(self):
+        """Scenarios which are not allowed are not imported"""
+        with mock.patch('importlib.import_module') as import_module:
+            with self.assertRaises(distributed.DistributedLoadError):
+                distributed.load_scenario('robottelo.ssh:command')
+        self.assertFalse(import_module.called)
+
+
+class LoadCoordinatorTestCase(unittest2.TestCase):
+    """Tests for running a scenario on agents on localhost"""
+
+    def setUp(self):
+        self.agents = []
+        for _ in range(3):
+            agent = distributed.LoadAgent(scenarios=SCENARIOS)
+            agent.start()
+            self.addCleanup(agent.close)
+            self.agents.append(agent)
+        self.coordinator = distributed.LoadCoordinator(
+            [each.address for each in self.agents],
+            timeout=10,
+            start_delay=0.2,
+        )
+
+    def test_run_closed(self):
+        """The workers are spread over the agents and start together"""
+        started = time.time()
+        results = self.coordinator.run_closed(
+            'tests.robottelo.test_distributed:scenario',
+            workers=7,
+            iterations=3,
+            args={'delay': 0.01, 'fail': 2},
+        )
+        self.assertEqual(len(results), 21)
+        self.assertEqual(len(results.failures()), 7)
+        self.assertEqual(
+            sorted(results.by_worker()),
+            ['thread-{0}'.format(worker) for worker in range(7)],
+        )
+        self.assertTrue(all(
+            len(time_list) == 2 for time_list in results.by_worker().values()
+        ))
+        # Every agent waited for the shared start time
+        first_calls = [
+            results.started[index] for index in range(len(results))
+            if results.iterations[index] == 0
+        ]
+        self.assertGreaterEqual(min(first_calls), started + 0.2)
+        self.assertLess(max(first_calls) - min(first_calls), 0.1)
+        self.assertEqual(len(self.coordinator.agent_summaries), 3)
+        self.assertEqual(
+            sorted(
+                summary['count']
+                for summary in self.coordinator.agent_summaries.values()),
+            [6, 6, 9],
+        )
+
+    def test_run_open(self):
+        """The rate is spread over the agents, requests interleaving"""
+        results = self.coordinator.run_open(
+            'tests.robottelo.test_distributed:scenario',
+            rate=60,
+            requests=12,
+        )
+        self.assertEqual(len(results), 12)
+        self.assertEqual(sorted(results.iterations), list(range(12)))
+        scheduled = [
+            results.scheduled[results.iterations.index(request)]
+            for request in range(12)
+        ]
+        # The requests of all agents arrive one every 1/60s
+        gaps = [later - earlier
+                for earlier, later in zip(scheduled, scheduled[1:])]
+        for gap in gaps:
+            self.assertAlmostEqual(gap, 1 / 60.0, delta=0.01)
+
+    def test_agent_error(self):
+        """Agent failures are raised by the coordinator"""
+        with self.assertRaises(distributed.DistributedLoadError):
+            self.coordinator.run_closed(
+                'tests.robottelo.test_distributed:missing', 1, 1)
+        # The agents are still usable
+        results = self.coordinator.run_closed(
+            'tests.robottelo.test_distributed:scenario', 3, 1)
+        self.assertEqual(len(results), 3)
+
+    def test_unreachable_agent(self):
+        """Unreachable agents are reported"""
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        coordinator = distributed.LoadCoordinator(
+            ['127.0.0.1:{0}'.format(port)], timeout=1)
+        with self.assertRaises(distributed.DistributedLoadError):
+            coordinator.run_closed(
+                'tests.robottelo.test_distributed:scenario', 1, 1)
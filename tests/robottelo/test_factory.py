@@ -0,0 +1,191 @@
+"""Tests for module ``robottelo.cli.factory``."""
+import six
+import threading
+import time
+import unittest2
+
+from robottelo.cli import factory
+from robottelo.cli.base import Base
+from robottelo.cli.repository import Repository
+from robottelo.cli.task import Task
+from robottelo.cli.user import User
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+
+class MakeBulkTestCase(unittest2.TestCase):
+    """Tests for creating entities concurrently"""
+
+    def setUp(self):
+        patcher = mock.patch.object(User, 'json_output', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Other tests may set it on Base
+        patcher = mock.patch.object(User, 'command_requires_org', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def execute(self, command, *args, **kwargs):
+        """Pretend to run ``command`` and return the created user."""
+        with self.lock:
+            self.commands.append(command)
+            number = len(self.commands)
+        # Give the other threads the time to change the subcommand
+        time.sleep(0.01)
+        if u'fail' in command:
+            raise factory.CLIReturnCodeError(1, u'error', u'failed')
+        return [{
+            u'message': u'User created',
+            u'id': u'{0}'.format(number),
+            u'name': u'user{0}'.format(number),
+        }]
+
+    def test_make_user_bulk(self):
+        """Entities are created concurrently without info lookup"""
+        with mock.patch.object(User, 'execute', side_effect=self.execute):
+            users = factory.make_user_bulk(5, {u'auth-source-id': 1})
+        self.assertEqual(len(users), 5)
+        self.assertEqual(len(set(user['id'] for user in users)), 5)
+        self.assertEqual(len(self.commands), 5)
+        self.assertTrue(all(
+            command.startswith(u'user create') for command in self.commands))
+        # The generated values differ for each entity
+        self.assertEqual(len(set(self.commands)), 5)
+        self.assertIsNone(User.create_info_fields)
+
+    def test_fields(self):
+        """Entities are fetched when the create output lacks fields"""
+        with mock.patch.object(User, 'execute', side_effect=self.execute), \
+                mock.patch.object(
+                    User, 'info', return_value={u'id': u'1'}) as info:
+            factory.make_user_bulk(2, fields=(u'id', u'login'))
+            self.assertEqual(info.call_count, 2)
+            info.reset_mock()
+            factory.make_user_bulk(2, fields=None)
+            self.assertEqual(info.call_count, 2)
+
+    def test_partial_failure(self):
+        """The failures are reported once every entity is created"""
+        with mock.patch.object(User, 'execute', side_effect=self.execute):
+            with self.assertRaises(factory.CLIFactoryBulkError) as context:
+                factory.make_user_bulk(3, [
+                    {u'login': u'first'},
+                    {u'login': u'fail'},
+                    {u'login': u'last'},
+                ])
+        results = context.exception.results
+        self.assertIsNone(results[1])
+        self.assertIsNotNone(results[0])
+        self.assertIsNotNone(results[2])
+        index, error = context.exception.errors[0]
+        self.assertEqual(index, 1)
+        self.assertIsInstance(error, factory.CLIFactoryError)
+        self.assertEqual(len(self.commands), 3)
+
+    def test_empty(self):
+        """Creating no entities does nothing"""
+        self.assertEqual(factory.make_bulk(factory.make_user, 0), [])
+
+
+class CreateObjectTestCase(unittest2.TestCase):
+    """Tests for creating entities with the CLI"""
+
+    @mock.patch('robottelo.cli.base._json_unsupported', set())
+    def test_json_output_error(self):
+        """Unparsable JSON output fails the factory"""
+        with mock.patch.object(User, 'json_output', True), \
+                mock.patch.object(User, 'command_requires_org', False), \
+                mock.patch.object(User, 'execute', side_effect=ValueError):
+            with self.assertRaises(factory.CLIFactoryError) as context:
+                factory.make_user({u'auth-source-id': 1})
+        self.assertIn(u'Could not parse', u'{0}'.format(context.exception))
+
+
+class EntityExistsTestCase(unittest2.TestCase):
+    """Tests for validating the cached entities"""
+
+    def setUp(self):
+        self.cli_object = type('Product', (Base,), {
+            'command_base': 'product',
+            'command_requires_org': True,
+            'json_output': False,
+        })
+        patcher = mock.patch.object(self.cli_object, 'execute')
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.validator = factory._entity_exists(self.cli_object)
+
+    def test_exists(self):
+        """Entities read with info are valid"""
+        self.execute.return_value = [u'ID: 1']
+        self.assertTrue(self.validator(
+            {u'id': u'1'}, {u'organization-id': u'2'}))
+        self.assertIn(
+            u'--organization-id="2"', self.execute.call_args[1]['command'])
+
+    def test_not_found(self):
+        """Entities info fails to read are stale"""
+        self.execute.side_effect = factory.CLIReturnCodeError(
+            128, u'Error: not found', u'failed')
+        self.assertFalse(self.validator(
+            {u'id': u'1'}, {u'organization-id': u'2'}))
+
+    def test_missing_organization(self):
+        """Entities without the organization info requires are stale"""
+        self.assertFalse(self.validator({u'id': u'1'}, None))
+        self.assertFalse(self.execute.called)
+
+
+class RunTaskTestCase(unittest2.TestCase):
+    """Tests for waiting for the tasks of the asynchronous commands"""
+
+    task_id = u'0a1b2c3d-4e5f-6789-abcd-ef0123456789'
+
+    def setUp(self):
+        patcher = mock.patch.object(Repository, 'synchronize', return_value=[
+            u'Repository is being synchronized in task {0}'
+            .format(self.task_id),
+        ])
+        self.synchronize = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Task, 'progress')
+        self.progress = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            Task, 'info', return_value={u'result': u'success'})
+        self.info = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_task(self):
+        """Synchronize a repository, waiting for its task."""
+        factory._run_task(
+            Repository, 'synchronize', {u'id': 1}, u'Failed to sync')
+
+    def test_success(self):
+        """The started tasks are waited for"""
+        self.run_task()
+        self.assertEqual(
+            self.synchronize.call_args[0][0], {u'id': 1, u'async': True})
+        self.progress.assert_called_once_with(
+            {u'id': self.task_id}, timeout=None)
+        self.info.assert_called_once_with({u'id': self.task_id})
+
+    def test_failed_task(self):
+        """Tasks finished with errors or warnings fail"""
+        for result in (u'error', u'warning'):
+            self.info.return_value = {u'result': result}
+            with self.assertRaises(factory.CLIFactoryError) as context:
+                self.run_task()
+            self.assertIn(result, u'{0}'.format(context.exception))
+
+    def test_no_task(self):
+        """Commands which did not start a task fail"""
+        self.synchronize.return_value = [u'Repository synchronized']
+        with self.assertRaises(factory.CLIFactoryError):
+            self.run_task()
+        self.assertFalse(self.progress.called)
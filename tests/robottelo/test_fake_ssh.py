@@ -0,0 +1,132 @@
+"""Tests for module ``robottelo.fake_ssh``."""
+import os
+import six
+import time
+import unittest2
+
+from robottelo import fake_ssh, ssh
+from robottelo.cli.base import CLIReturnCodeError
+from robottelo.cli.org import Org
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+RESPONSES_PATH = os.path.join(
+    os.path.dirname(__file__), 'data', 'hammer_responses.json')
+
+
+class FakeSSHServerTestCase(unittest2.TestCase):
+    """Tests for running commands on the fake SSH server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fake_ssh.FakeSSHServer(
+            fake_ssh.load_responses(RESPONSES_PATH) + [
+                fake_ssh.make_response(r'^echo hello$', u'hello\n'),
+                fake_ssh.make_response(
+                    r'^false$', stderr=[u'failed'], return_code=1),
+                fake_ssh.make_response(r'^cat big$', b'x' * 100000),
+            ]
+        )
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        patcher = self.server.patch_ssh()
+        patcher.__enter__()
+        self.addCleanup(patcher.__exit__, None, None, None)
+        self.server.commands = []
+        # Other tests may set it on Base
+        patcher = mock.patch.object(Org, 'command_requires_org', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_command(self):
+        """Commands get their canned response"""
+        result = ssh.command('echo hello', hostname='satellite.example.com')
+        self.assertEqual(result.stdout, [u'hello', u''])
+        self.assertEqual(result.return_code, 0)
+        result = ssh.command('false', hostname='satellite.example.com')
+        self.assertEqual(result.stderr, u'failed\n')
+        self.assertEqual(result.return_code, 1)
+        result = ssh.command(
+            'cat big', output_format='plain', hostname='satellite.example.com')
+        self.assertEqual(len(result.stdout), 100000)
+        self.assertEqual(
+            self.server.commands, ['echo hello', 'false', 'cat big'])
+
+    def test_unknown_command(self):
+        """Commands without canned response are not found"""
+        result = ssh.command('reboot', hostname='satellite.example.com')
+        self.assertEqual(
+            result.return_code, fake_ssh.UNKNOWN_COMMAND_RETURN_CODE)
+        self.assertIn(u'command not found', result.stderr)
+
+    def test_batch(self):
+        """The commands of a batch get their own canned response"""
+        results = ssh.command_batch(
+            ['echo hello', 'false', "echo 'quoted'"],
+            hostname='satellite.example.com',
+        )
+        self.assertEqual(
+            [result.return_code for result in results],
+            [0, 1, fake_ssh.UNKNOWN_COMMAND_RETURN_CODE]
+        )
+        self.assertEqual(results[0].stdout, [u'hello', u''])
+        self.assertEqual(results[1].stderr, u'failed\n')
+        self.assertEqual(self.server.commands[2], u"echo 'quoted'")
+
+    def test_cli(self):
+        """The CLI classes parse the recorded hammer responses"""
+        orgs = Org.list()
+        self.assertEqual(len(orgs), 2)
+        self.assertEqual(orgs[1][u'description'], u'Testing, with a comma')
+        org = Org.info({u'id': 1})
+        self.assertEqual(org[u'domains'], [u'example.com'])
+        self.assertEqual(org[u'parameters'], {u'key': u'value'})
+        with self.assertRaises(CLIReturnCodeError) as context:
+            Org.info({u'id': 2})
+        self.assertEqual(context.exception.return_code, 65)
+
+
+class LatencyProfileTestCase(unittest2.TestCase):
+    """Tests for the fake SSH server latency profiles"""
+
+    def test_profile(self):
+        """The server waits as told by its profile"""
+        profile = fake_ssh.LatencyProfile(
+            connect_time=0.1, latency=0.05, command_time=0.05)
+        responses = [fake_ssh.make_response(r'^true$')]
+        with fake_ssh.FakeSSHServer(responses, profile) as server:
+            with server.patch_ssh():
+                started = time.time()
+                ssh.command('true', hostname='satellite.example.com')
+                first = time.time() - started
+                started = time.time()
+                ssh.command_batch(
+                    ['true', 'true'], hostname='satellite.example.com')
+                batch = time.time() - started
+        # The pooled connection is authenticated only once
+        self.assertGreaterEqual(first, 0.2)
+        self.assertGreaterEqual(batch, 0.15)
+        self.assertLess(batch, first)
+        self.assertEqual(server.connections, 1)
+
+    @mock.patch('robottelo.fake_ssh.time.sleep')
+    def test_jitter(self, sleep):
+        """The jitter is reproducible"""
+        waits = []
+        for _ in range(2):
+            server = fake_ssh.FakeSSHServer(
+                profile=fake_ssh.LatencyProfile(jitter=0.5), seed=1)
+            for _ in range(3):
+                server.wait(1)
+            waits.append([call[0][0] for call in sleep.call_args_list])
+            sleep.reset_mock()
+        self.assertEqual(waits[0], waits[1])
+        self.assertTrue(all(0.5 <= wait <= 1.5 for wait in waits[0]))
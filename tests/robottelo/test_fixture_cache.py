@@ -0,0 +1,161 @@
+"""Tests for module ``robottelo.fixture_cache``."""
+import os
+import shutil
+import six
+import tempfile
+import unittest2
+
+from robottelo import decorators, fixture_cache
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+
+class FixtureCacheTestCase(unittest2.TestCase):
+    """Tests for storing the factories entities on sqlite"""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = os.path.join(tmpdir, 'fixtures.sqlite')
+        self.cache = fixture_cache.FixtureCache(
+            self.path, server='satellite.example.com')
+        patcher = mock.patch.dict(
+            'robottelo.fixture_cache._validators', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_dependencies(self):
+        """Options referencing entities are dependencies"""
+        self.assertEqual(
+            fixture_cache.get_dependencies({
+                u'organization-id': 1,
+                u'content-view-id': u'2',
+                u'lifecycle-environment-ids': u'3,4',
+                u'operatingsystem-ids': [5],
+                u'name': u'foo',
+                u'product-id': None,
+            }),
+            [
+                ('content_view', u'2'),
+                ('lifecycle_environment', u'3'),
+                ('lifecycle_environment', u'4'),
+                ('org', u'1'),
+                ('os', u'5'),
+            ]
+        )
+
+    def test_put_get(self):
+        """Entities are keyed by the server, kind and options"""
+        self.cache.put('product', {u'organization-id': 1}, {u'id': u'10'})
+        self.cache.put('product', {u'organization-id': 2}, {u'id': u'20'})
+        self.assertEqual(
+            self.cache.get('product', {u'organization-id': 1}),
+            {u'id': u'10'}
+        )
+        self.assertEqual(
+            self.cache.get('product', {u'organization-id': 2}),
+            {u'id': u'20'}
+        )
+        self.assertIsNone(self.cache.get('product', None))
+        other_server = fixture_cache.FixtureCache(
+            self.path, server='other.example.com')
+        self.assertIsNone(
+            other_server.get('product', {u'organization-id': 1}))
+        shared = fixture_cache.FixtureCache(
+            self.path, server='satellite.example.com')
+        self.assertEqual(
+            shared.get('product', {u'organization-id': 1}), {u'id': u'10'})
+        self.assertEqual(len(shared), 2)
+
+    def test_put_without_id(self):
+        """Entities without id are not stored"""
+        self.cache.put('content_host', None, {u'name': u'foo'})
+        self.cache.put('content_host', None, [])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_validation(self):
+        """Missing entities are evicted along with their dependents"""
+        self.cache.put('org', None, {u'id': u'1'})
+        self.cache.put('content_view', {u'organization-id': 1}, {u'id': u'2'})
+        self.cache.put('activation_key', {
+            u'organization-id': u'1',
+            u'content-view-id': u'2',
+        }, {u'id': u'3'})
+        self.cache.put('org', {u'name': u'other'}, {u'id': u'4'})
+        validator = mock.Mock(
+            side_effect=lambda entity, options: entity[u'id'] != u'1')
+        fixture_cache.register_validator('org', validator)
+        cache = fixture_cache.FixtureCache(
+            self.path, server='satellite.example.com')
+        self.assertIsNone(cache.get('org', None))
+        validator.assert_called_once_with({u'id': u'1'}, None)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get('org', {u'name': u'other'}))
+
+    def test_validated_once(self):
+        """Entities are validated once per process"""
+        self.cache.put('org', None, {u'id': u'1'})
+        validator = mock.Mock(return_value=True)
+        fixture_cache.register_validator('org', validator)
+        cache = fixture_cache.FixtureCache(
+            self.path, server='satellite.example.com')
+        for _ in range(3):
+            self.assertEqual(cache.get('org', None), {u'id': u'1'})
+        self.assertEqual(validator.call_count, 1)
+
+
+class CacheableFixtureCacheTestCase(unittest2.TestCase):
+    """Tests for :func:`robottelo.decorators.cacheable` with a fixture
+    cache.
+
+    """
+
+    def setUp(self):
+        patcher = mock.patch.dict('robottelo.decorators.OBJECT_CACHE')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'robottelo.fixture_cache.get_fixture_cache')
+        self.store = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.factory = mock.Mock(return_value={u'id': u'1'})
+        self.factory.__name__ = 'make_product'
+        self.make_product = decorators.cacheable(self.factory)
+
+    def test_build_and_store(self):
+        """Built entities are stored"""
+        self.store.get.return_value = None
+        options = {u'organization-id': 1}
+        self.assertEqual(
+            self.make_product(options, cached=True), {u'id': u'1'})
+        self.store.put.assert_called_once_with(
+            'product', options, {u'id': u'1'})
+        # The next call is served from memory
+        self.make_product({u'organization-id': 1}, cached=True)
+        self.assertEqual(self.factory.call_count, 1)
+        self.assertEqual(self.store.get.call_count, 1)
+
+    def test_stored(self):
+        """Stored entities are not built again"""
+        self.store.get.return_value = {u'id': u'2'}
+        self.assertEqual(
+            self.make_product({u'organization-id': 1}, cached=True),
+            {u'id': u'2'}
+        )
+        self.assertFalse(self.factory.called)
+
+    def test_options_key(self):
+        """Entities built with other options are not reused"""
+        self.store.get.return_value = None
+        self.make_product({u'organization-id': 1}, cached=True)
+        self.make_product({u'organization-id': 2}, cached=True)
+        self.assertEqual(self.factory.call_count, 2)
+
+    def test_not_cached(self):
+        """The cache is not used unless asked to"""
+        self.make_product({u'organization-id': 1})
+        self.assertFalse(self.store.get.called)
+        self.assertFalse(self.store.put.called)
@@ -38,6 +38,28 @@ class ParseCSVTestCase(unittest2.TestCase):
             ]
         )
 
+    def test_parse_csv_multiline_value(self):
+        """Quoted values spanning several lines are kept"""
+        self.assertEqual(
+            hammer.parse_csv([u'Name,Description', u'a,"first', u'second"']),
+            [{u'name': u'a', u'description': u'first\nsecond'}]
+        )
+
+    def test_iter_csv(self):
+        """Entries are parsed as the lines are consumed"""
+        consumed = []
+
+        def lines():
+            for line in (u'ID,Name', u'1,first', u'2,second'):
+                consumed.append(line)
+                yield line
+
+        entries = hammer.iter_csv(lines())
+        self.assertEqual(next(entries), {u'id': u'1', u'name': u'first'})
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(list(entries), [{u'id': u'2', u'name': u'second'}])
+        self.assertEqual(list(hammer.iter_csv([])), [])
+
 
 class ParseJSONTestCase(unittest2.TestCase):
     """Tests for parsing JSON hammer output"""
@@ -138,6 +160,44 @@ class ParseJSONTestCase(unittest2.TestCase):
                          hammer.parse_csv(csv_ouput_lines)[0])
 
 
+class ToTextOutputTestCase(unittest2.TestCase):
+    """Tests for converting JSON hammer output to the text output shape"""
+
+    def test_to_text_output(self):
+        """Numbered objects become lists, booleans and nulls become text"""
+        output = hammer.parse_json(u"""{
+          "ID": 1,
+          "Composite": false,
+          "Description": null,
+          "Yum Repositories": {},
+          "Versions": {
+            "2": {"ID": 2, "Version": "2.0"},
+            "1": {"ID": 1, "Version": "1.0"}
+          },
+          "Organizations": ["Org 1", "Org 2"]
+        }""")
+        self.assertEqual(
+            hammer.to_text_output(output),
+            {
+                u'id': u'1',
+                u'composite': u'no',
+                u'description': u'',
+                u'yum-repositories': {},
+                u'versions': [
+                    {u'id': u'1', u'version': u'1.0'},
+                    {u'id': u'2', u'version': u'2.0'},
+                ],
+                u'organizations': [u'Org 1', u'Org 2'],
+            }
+        )
+
+    def test_list_output(self):
+        """JSON list output has the same shape as the CSV output"""
+        csv_output = hammer.parse_csv([u'ID,Name', u'1,Library'])
+        json_output = hammer.parse_json(u'[{"ID": 1, "Name": "Library"}]')
+        self.assertEqual(hammer.to_text_output(json_output), csv_output)
+
+
 class ParseHelpTestCase(unittest2.TestCase):
     """Tests for parsing hammer help output"""
 
@@ -348,6 +408,26 @@ class ParseInfoTestCase(unittest2.TestCase):
             }
         )
 
+    def test_parse_arrow_attributes(self):
+        """Can parse attributes separated by '=>' and '::' names"""
+        output = [
+            'Parameters:',
+            ' key1 => value1',
+            ' key2 => value2',
+            'Puppet Classes:',
+            ' test::params::keys',
+        ]
+        self.assertDictEqual(
+            hammer.parse_info(output),
+            {
+                'parameters': {
+                    'key1': 'value1',
+                    'key2': 'value2',
+                },
+                'puppet-classes': ['test::params::keys'],
+            }
+        )
+
     def test_parse_info(self):
         """Can parse info output"""
         output = [
@@ -0,0 +1,246 @@
+"""Tests for module ``robottelo.cli.hammer_shell``."""
+import six
+import threading
+import unittest2
+
+from contextlib import contextmanager
+from robottelo import ssh
+from robottelo.cli import hammer_shell
+from robottelo.cli.base import Base, CLIReturnCodeError
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+
+class MockShellChannel(object):
+    """A mock ``paramiko.Channel`` running ``hammer shell``.
+
+    ``responses`` maps each command line to the ``(stdout, stderr)`` written
+    by the shell, a response of ``None`` makes the shell hang and a command
+    missing from it makes the shell crash.
+
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.closed = False
+        self.command = None
+        self.lines = []
+        self.stdout = b''
+        self.stderr = b''
+        self.exited = False
+
+    def exec_command(self, command):
+        self.command = command
+        self.stdout = hammer_shell.PROMPT
+
+    def sendall(self, data):
+        line = data.decode('utf-8').rstrip(u'\n')
+        self.lines.append(line)
+        if line not in self.responses:
+            self.exited = True
+            return
+        response = self.responses[line]
+        if response is not None:
+            stdout, stderr = response
+            self.stdout += stdout.encode('utf-8') + hammer_shell.PROMPT
+            self.stderr += stderr.encode('utf-8')
+
+    def recv_ready(self):
+        return len(self.stdout) > 0
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return len(self.stderr) > 0
+
+    def recv_stderr(self, size):
+        data, self.stderr = self.stderr[:size], self.stderr[size:]
+        return data
+
+    def exit_status_ready(self):
+        return self.exited
+
+    def recv_exit_status(self):
+        return 1
+
+    def close(self):
+        self.closed = True
+
+
+class HammerShellTestCase(unittest2.TestCase):
+    """Tests for running hammer commands on ``hammer shell``."""
+    def setUp(self):
+        self.responses = {
+            u'--output=csv org list': (u'Id,Name\n1,Default\n', u''),
+            u'org info --id 2': (u'', u'Error: organization not found\n'),
+            u'--output=plain org delete --id 1': (
+                u'Organization deleted\n', u'Warning: deprecated option\n'),
+            u'ping': None,
+        }
+        self.channels = []
+        connection = mock.Mock()
+        connection.get_transport.return_value.open_session.side_effect = (
+            self.open_session)
+
+        @contextmanager
+        def get_connection(hostname=None):
+            yield connection
+            self.released += 1
+
+        self.released = 0
+        patcher = mock.patch('robottelo.ssh.get_connection', get_connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings_patcher = mock.patch('robottelo.cli.hammer_shell.settings')
+        settings_patcher.start().locale = 'en_US.UTF-8'
+        self.addCleanup(settings_patcher.stop)
+        self.addCleanup(hammer_shell.close_shells)
+
+    def open_session(self):
+        channel = MockShellChannel(self.responses)
+        self.channels.append(channel)
+        return channel
+
+    def test_execute(self):
+        """Commands run on a single shell started with the credentials"""
+        result = hammer_shell.execute(
+            u'org list', 'admin', 'changeme', output_format='csv')
+        self.assertEqual(result.stdout, [{u'id': u'1', u'name': u'Default'}])
+        self.assertEqual(result.return_code, 0)
+        result = hammer_shell.execute(u'org info --id 2', 'admin', 'changeme')
+        self.assertEqual(result.return_code, 1)
+        self.assertEqual(result.stderr, u'Error: organization not found\n')
+        self.assertEqual(len(self.channels), 1)
+        self.assertEqual(
+            self.channels[0].command,
+            b'LANG=en_US.UTF-8 hammer -v -u admin -p changeme shell'
+        )
+
+    def test_execute_warning(self):
+        """Warnings on stderr do not fail the command"""
+        result = hammer_shell.execute(
+            u'org delete --id 1', 'admin', 'changeme', output_format='plain')
+        self.assertEqual(result.return_code, 0)
+        self.assertEqual(result.stdout, u'Organization deleted\n')
+
+    def test_shell_per_credentials(self):
+        """Each user and password pair gets its own shell"""
+        hammer_shell.execute(u'org list', 'admin', 'changeme', 'csv')
+        hammer_shell.execute(u'org list', 'viewer', 'changeme', 'csv')
+        hammer_shell.execute(u'org list', 'admin', 'changeme', 'csv')
+        self.assertEqual(len(self.channels), 2)
+        hammer_shell.close_shells()
+        self.assertTrue(all(channel.closed for channel in self.channels))
+        self.assertEqual(self.released, 2)
+
+    def test_shells_per_credentials(self):
+        """Concurrent commands run on several shells, up to the maximum"""
+        pool = hammer_shell.HammerShellPool(max_shells=2)
+        self.addCleanup(pool.close_all)
+        first = pool.acquire('admin', 'changeme')
+        second = pool.acquire('admin', 'changeme')
+        self.assertIsNot(first, second)
+        acquired = []
+        thread = threading.Thread(
+            target=lambda: acquired.append(
+                pool.acquire('admin', 'changeme')))
+        thread.start()
+        # Both shells are busy
+        thread.join(0.1)
+        self.assertEqual(acquired, [])
+        pool.release(first)
+        thread.join(5)
+        self.assertEqual(acquired, [first])
+        pool.release(second)
+        pool.release(first)
+        result = pool.execute(u'org list', 'admin', 'changeme', 'csv')
+        self.assertEqual(result.return_code, 0)
+        self.assertEqual(len(self.channels), 1)
+        pool.close_all()
+        self.assertTrue(all(channel.closed for channel in self.channels))
+
+    def test_crash(self):
+        """A crashed shell is restarted for the next command"""
+        result = hammer_shell.execute(u'crash', 'admin', 'changeme')
+        self.assertEqual(
+            result.return_code, hammer_shell.SHELL_ERROR_RETURN_CODE)
+        self.assertTrue(self.channels[0].closed)
+        self.assertEqual(self.released, 1)
+        result = hammer_shell.execute(
+            u'org list', 'admin', 'changeme', output_format='csv')
+        self.assertEqual(result.return_code, 0)
+        self.assertEqual(len(self.channels), 2)
+
+    def test_hang(self):
+        """A command not finishing on time fails and the shell is restarted
+        """
+        result = hammer_shell.execute(
+            u'ping', 'admin', 'changeme', timeout=0.05)
+        self.assertEqual(
+            result.return_code, hammer_shell.SHELL_ERROR_RETURN_CODE)
+        self.assertTrue(self.channels[0].closed)
+
+    def test_guess_return_code(self):
+        """Only stderr lines other than warnings fail the command"""
+        self.assertEqual(hammer_shell.guess_return_code(u''), 0)
+        self.assertEqual(hammer_shell.guess_return_code(None), 0)
+        self.assertEqual(
+            hammer_shell.guess_return_code(u'Warning: foo\n\n'), 0)
+        self.assertEqual(
+            hammer_shell.guess_return_code(u'Warning: foo\nCould not'), 1)
+
+    @mock.patch('robottelo.cli.base.settings')
+    def test_base_execute(self, settings):
+        """Base.execute uses the shell when configured to"""
+        settings.hammer_backend = 'shell'
+        settings.performance.time_hammer = False
+        Base.command_base = 'org'
+        Base.command_sub = 'info'
+        with self.assertRaises(CLIReturnCodeError):
+            Base.execute(u'org info --id 2', 'admin', 'changeme')
+        self.assertEqual(self.channels[0].lines, [u'org info --id 2'])
+
+
+class HammerShellConnectionTestCase(unittest2.TestCase):
+    """Tests for the ssh connections used by ``hammer shell``."""
+    def setUp(self):
+        self.clients = []
+        for target, new in (
+                ('robottelo.ssh._connect', self.connect),
+                ('robottelo.ssh._connection_pool', ssh.SSHConnectionPool()),
+                ('robottelo.ssh.execute_command',
+                 mock.Mock(return_value=ssh.SSHCommandResult())),
+                ('robottelo.ssh.settings', mock.Mock()),
+                ('robottelo.cli.hammer_shell.settings', mock.Mock())):
+            patcher = mock.patch(target, new)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(hammer_shell.close_shells)
+
+    def connect(self, *args, **kwargs):
+        client = mock.Mock()
+        client.get_transport.return_value.open_session.side_effect = (
+            lambda: MockShellChannel({u'org list': (u'', u'')}))
+        self.clients.append(client)
+        return client
+
+    def test_shells_do_not_take_pooled_sessions(self):
+        """Running shells leave the pooled sessions to ssh.command"""
+        for index in range(ssh.MAX_SESSIONS + 1):
+            result = hammer_shell.execute(
+                u'org list', 'user{0}'.format(index), 'changeme')
+            self.assertEqual(result.return_code, 0)
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(ssh.command('true')))
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.assertEqual(len(results), 1)
+        shell_clients = self.clients[:ssh.MAX_SESSIONS + 1]
+        hammer_shell.close_shells()
+        self.assertTrue(all(client.close.called for client in shell_clients))
@@ -7,6 +7,7 @@ from robottelo.helpers import (
     escape_search,
     get_host_info,
     get_server_version,
+    wait_for,
 )
 
 if six.PY2:
@@ -117,3 +118,35 @@ class EscapeSearchTestCase(unittest2.TestCase):
         term = escape_search('term')
         self.assertEqual(term[0], '"')
         self.assertEqual(term[-1], '"')
+
+
+class WaitForTestCase(unittest2.TestCase):
+    """Tests for method ``wait_for``."""
+
+    @mock.patch('robottelo.helpers.time.sleep')
+    def test_backoff(self, sleep):
+        """The waits grow up to the maximum delay"""
+        condition = mock.Mock(side_effect=[None, False, 0, None, 'ready'])
+        self.assertEqual(
+            wait_for(condition, 60, delay=1, max_delay=3, jitter=0), 'ready')
+        self.assertEqual(
+            [call[0][0] for call in sleep.call_args_list], [1, 2, 3, 3])
+
+    @mock.patch('robottelo.helpers.time.sleep')
+    def test_jitter(self, sleep):
+        """The waits are moved randomly"""
+        condition = mock.Mock(side_effect=[False] * 20 + [True])
+        wait_for(condition, 60, delay=1, backoff=1, jitter=0.5)
+        waits = [call[0][0] for call in sleep.call_args_list]
+        self.assertTrue(all(0.5 <= wait <= 1.5 for wait in waits))
+        self.assertGreater(len(set(waits)), 1)
+
+    @mock.patch('robottelo.helpers.time.time', side_effect=[0, 1, 30, 61])
+    @mock.patch('robottelo.helpers.time.sleep')
+    def test_timeout(self, sleep, time):
+        """None is returned once the timeout elapsed"""
+        self.assertIsNone(wait_for(
+            mock.Mock(return_value=False), 60, delay=10, jitter=0))
+        # The last wait is cut to the remaining time
+        self.assertEqual(
+            [call[0][0] for call in sleep.call_args_list], [10, 20])
@@ -0,0 +1,151 @@
+"""Tests for module ``robottelo.cli.instrumentation``."""
+import csv
+import io
+import json
+import os
+import shutil
+import six
+import tempfile
+import unittest2
+
+from robottelo.cli import instrumentation
+from robottelo.cli.base import Base, CLIReturnCodeError
+
+if six.PY2:
+    import mock
+else:
+    from unittest import mock
+
+
+def make_record(command_sub='list', total_time=0.2, **kwargs):
+    """Build a record of a ``product`` command."""
+    fields = {
+        'timestamp': 1500000000.0,
+        'command_base': 'product',
+        'command_sub': command_sub,
+        'return_code': 0,
+        'total_time': total_time,
+        'connect_time': 0.001,
+        'execute_time': 0.19,
+        'parse_time': 0.009,
+        'bytes_received': 1024,
+    }
+    fields.update(kwargs)
+    return instrumentation.CommandRecord(**fields)
+
+
+class SinksTestCase(unittest2.TestCase):
+    """Tests for the instrumentation sinks"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_histogram_sink(self):
+        """Each command has its own histograms"""
+        sink = instrumentation.HistogramSink()
+        sink.record(make_record())
+        sink.record(make_record(total_time=0.4, connect_time=None))
+        sink.record(make_record(command_sub='info'))
+        summary = sink.summary()
+        self.assertEqual(
+            sorted(summary), [('product', 'info'), ('product', 'list')])
+        list_summary = summary[('product', 'list')]
+        self.assertEqual(list_summary['total_time']['max'], 0.4)
+        self.assertEqual(list_summary['connect_time']['count'], 1)
+
+    def test_csv_sink(self):
+        """Records are appended to the CSV file below its header"""
+        path = os.path.join(self.tmpdir, 'records.csv')
+        for _ in range(2):
+            sink = instrumentation.CSVSink(path)
+            sink.record(make_record())
+            sink.close()
+        with open(path) as handler:
+            rows = list(csv.reader(handler))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(tuple(rows[0]), instrumentation.RECORD_FIELDS)
+        self.assertEqual(rows[1][1:4], ['product', 'list', '0'])
+
+    def test_json_lines_sink(self):
+        """Records are appended to the file as JSON objects"""
+        path = os.path.join(self.tmpdir, 'records.jsonl')
+        sink = instrumentation.JSONLinesSink(path)
+        sink.record(make_record())
+        sink.record(make_record(return_code=None))
+        sink.close()
+        with io.open(path, encoding='utf-8') as handler:
+            records = [json.loads(line) for line in handler]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['bytes_received'], 1024)
+        self.assertEqual(records[1]['return_code'], None)
+
+    def test_failing_sink(self):
+        """A failing sink does not stop the other sinks"""
+        failing = mock.Mock()
+        failing.record.side_effect = IOError
+        sink = instrumentation.HistogramSink()
+        instr = instrumentation.Instrumentation([failing, sink])
+        instr.record(make_record())
+        self.assertEqual(len(sink.histograms), 1)
+        instr.remove_sink(failing)
+        self.assertEqual(instr.sinks, [sink])
+        failing.close.assert_called_once_with()
+
+
+class BaseInstrumentationTestCase(unittest2.TestCase):
+    """Tests for recording the commands run by ``Base.execute``"""
+
+    def setUp(self):
+        self.sink = instrumentation.HistogramSink()
+        patcher = mock.patch.object(
+            Base,
+            'instrumentation',
+            instrumentation.Instrumentation([self.sink]),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('robottelo.cli.base.settings')
+        settings = patcher.start()
+        self.addCleanup(patcher.stop)
+        settings.hammer_backend = 'ssh'
+        patcher = mock.patch('robottelo.cli.base.ssh.command')
+        self.command = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.records = []
+        self.sink.record = self.records.append
+
+    def test_record(self):
+        """The timings of the response are recorded"""
+        response = self.command.return_value
+        response.return_code = 0
+        response.connect_time = 0.1
+        response.execute_time = 0.2
+        response.parse_time = 0.3
+        response.bytes_received = 4
+        Base.command_base = 'product'
+        Base.command_sub = 'list'
+        Base.execute('product list')
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual(record.command_base, 'product')
+        self.assertEqual(record.command_sub, 'list')
+        self.assertEqual(record.return_code, 0)
+        self.assertEqual(
+            (record.connect_time, record.execute_time, record.parse_time),
+            (0.1, 0.2, 0.3)
+        )
+        self.assertEqual(record.bytes_received, 4)
+        self.assertGreaterEqual(record.total_time, 0)
+
+    def test_record_failure(self):
+        """Failed commands are recorded"""
+        self.command.return_value.return_code = 1
+        with self.assertRaises(CLIReturnCodeError):
+            Base.execute('product info')
+        self.assertEqual(self.records[0].return_code, 1)
+        self.command.side_effect = IOError
+        with self.assertRaises(IOError):
+            Base.execute('product info')
+        self.assertEqual(self.records[1].return_code, None)
+        self.assertEqual(self.records[1].execute_time, None)
@@ -0,0 +1,274 @@
+"""Tests for module ``robottelo.performance.load``."""
+import threading
+import time
+import unittest2
+
+from robottelo.performance import load
+
+
+def square(worker, iteration):
+    """Scenario run on the process executor, it must be picklable."""
+    if iteration == 1:
+        raise ValueError('failed')
+    return (worker or 0) * 10 + iteration
+
+
+class LoadResultsTestCase(unittest2.TestCase):
+    """Tests for storing the outcome of the calls"""
+
+    def test_record(self):
+        """Calls are grouped by worker and iteration"""
+        results = load.LoadResults(4)
+        results.record(1, 0, 10, 10, 0.5)
+        results.record(0, 1, 10, 11, 0.25, value=3)
+        results.record(0, 0, 10, 10, 0.5, value=u'done')
+        results.record(1, 1, 10, 11, 2, error=u'ValueError: failed')
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results.failures(), [3])
+        self.assertEqual(results.latencies(), [0.5, 3, 0.5])
+        self.assertEqual(results.by_worker(), {
+            'thread-0': [0.5, 3],
+            'thread-1': [0.5],
+        })
+        self.assertEqual(
+            results.by_worker(value=lambda value: value),
+            {'thread-0': [u'done', 3], 'thread-1': [None]},
+        )
+        summary = results.summary()
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['elapsed'], 3)
+        self.assertEqual(summary['throughput'], 1)
+        self.assertEqual(summary['p50'], 0.5)
+        self.assertEqual(summary['max'], 3)
+        with self.assertRaises(IndexError):
+            results.record(0, 2, 10, 10, 1)
+
+    def test_delays(self):
+        """Response times count the wait for a free worker"""
+        results = load.LoadResults(3)
+        results.record(None, 0, 10, 10, 1)
+        results.record(None, 1, 10.5, 11, 1)
+        results.record(None, 2, 11, 12, 1, error=u'failed')
+        self.assertEqual(results.delays(), [0, 0.5, 1])
+        self.assertEqual(results.response_times(), [1, 1.5])
+        summary = results.summary()
+        self.assertEqual(summary['delay_max'], 1)
+        self.assertEqual(summary['response_p99'], 1.5)
+        self.assertEqual(summary['p99'], 1)
+
+    def test_concurrent_record(self):
+        """Every call gets its own slot"""
+        results = load.LoadResults(400)
+
+        def record(worker):
+            for iteration in range(100):
+                results.record(worker, iteration, 0, 0, 1)
+
+        threads = [
+            threading.Thread(target=record, args=(worker,))
+            for worker in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 400)
+        self.assertEqual(
+            sorted(zip(results.workers, results.iterations)),
+            [(worker, iteration)
+             for worker in range(4) for iteration in range(100)],
+        )
+
+
+class HistogramResultsTestCase(unittest2.TestCase):
+    """Tests for counting the outcome of the calls on histograms"""
+
+    def test_record(self):
+        """The summary matches the one of the stored calls"""
+        stored = load.LoadResults(4)
+        counted = load.HistogramResults(4)
+        for results in (stored, counted):
+            results.record(1, 0, 10, 10, 0.5)
+            results.record(0, 1, 10, 11, 0.25, value=3)
+            results.record(0, 0, 10, 10, 0.5, value=u'done')
+            results.record(1, 1, 10, 11, 2, error=u'ValueError: failed')
+        self.assertEqual(len(counted), 4)
+        self.assertEqual(counted.errors, {u'ValueError: failed': 1})
+        self.assertEqual(list(counted.worker_histograms), [
+            'thread-1', 'thread-0'])
+        self.assertEqual(counted.worker_histograms['thread-0'].count, 2)
+        expected = stored.summary()
+        summary = counted.summary()
+        self.assertEqual(sorted(summary), sorted(expected))
+        for key, value in expected.items():
+            self.assertAlmostEqual(summary[key], value, delta=value * 1e-3)
+        with self.assertRaises(IndexError):
+            counted.record(0, 2, 10, 10, 1)
+
+    def test_engine(self):
+        """The engine counts the calls on histograms when asked to"""
+        results = load.LoadEngine(
+            square, results_class=load.HistogramResults).run_closed(2, 3)
+        self.assertIsInstance(results, load.HistogramResults)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results.summary()['errors'], 2)
+        self.assertEqual(results.worker_histograms['thread-1'].max, 12)
+        results = load.LoadEngine(
+            lambda worker, iteration: None,
+            results_class=load.HistogramResults,
+        ).run_open(100, requests=5)
+        self.assertEqual(results.summary()['count'], 5)
+        self.assertEqual(results.worker_histograms, {})
+
+
+class ScheduleTestCase(unittest2.TestCase):
+    """Tests for planning when the calls start"""
+
+    def test_closed_loop_starts(self):
+        """Workers are started evenly over the ramp up"""
+        self.assertEqual(load.closed_loop_starts(4, 2), [0, 0.5, 1, 1.5])
+        self.assertEqual(load.closed_loop_starts(2), [0, 0])
+
+    def test_open_loop_arrivals(self):
+        """Requests arrive at the rate, after a linear ramp up"""
+        self.assertEqual(load.open_loop_arrivals(4, 3), [0, 0.25, 0.5])
+        self.assertEqual(
+            load.open_loop_arrivals(2, duration=2), [0, 0.5, 1, 1.5])
+        arrivals = load.open_loop_arrivals(10, duration=4, ramp_up=2)
+        # 10 requests during the ramp up, then 10 per second
+        self.assertEqual(len(arrivals), 30)
+        self.assertEqual(
+            len([offset for offset in arrivals if offset < 1]), 3)
+        self.assertAlmostEqual(arrivals[10], 2)
+        self.assertEqual(arrivals, sorted(arrivals))
+        with self.assertRaises(ValueError):
+            load.open_loop_arrivals(10)
+        with self.assertRaises(ValueError):
+            load.open_loop_arrivals(0, 10)
+
+
+class FindSaturationTestCase(unittest2.TestCase):
+    """Tests for finding the rate a server can't keep up with"""
+
+    @staticmethod
+    def open_loop(rate):
+        """Pretend to run an open loop on a server doing 5 calls a second."""
+        results = load.LoadResults(rate)
+        for request in range(rate):
+            scheduled = request / float(rate)
+            started = max(scheduled, request / 5.0)
+            results.record(None, request, scheduled, started, 0.2)
+        return results
+
+    def test_find_saturation(self):
+        """Higher rates are not run once the server is saturated"""
+        saturation, summaries = load.find_saturation(
+            self.open_loop, [8, 2, 4, 16])
+        self.assertEqual(saturation, 8)
+        self.assertEqual(list(summaries), [2, 4, 8])
+        self.assertGreater(summaries[8]['delay_max'], 0)
+
+    def test_not_saturated(self):
+        """No saturation rate is reported if the server keeps up"""
+        saturation, summaries = load.find_saturation(self.open_loop, [1, 2])
+        self.assertIsNone(saturation)
+        self.assertEqual(len(summaries), 2)
+
+
+class LoadEngineTestCase(unittest2.TestCase):
+    """Tests for running the scenarios"""
+
+    def test_closed(self):
+        """Workers run their iterations one after the other"""
+        running = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def scenario(worker, iteration):
+            with lock:
+                overlaps.append(worker in running)
+                running.add(worker)
+            time.sleep(0.01)
+            with lock:
+                running.discard(worker)
+            if worker == 2 and iteration == 1:
+                raise ValueError('failed')
+
+        results = load.LoadEngine(scenario).run_closed(3, 4)
+        self.assertEqual(len(results), 12)
+        self.assertFalse(any(overlaps))
+        self.assertEqual(
+            [len(time_list) for time_list in results.by_worker().values()],
+            [4, 4, 3],
+        )
+        self.assertEqual(
+            results.errors[results.failures()[0]], u'ValueError: failed')
+
+    def test_closed_ramp_up(self):
+        """Workers start over the ramp up"""
+        results = load.LoadEngine(
+            lambda worker, iteration: None).run_closed(2, 1, ramp_up=0.4)
+        first, second = sorted(results.started[:2])
+        self.assertGreaterEqual(second - first, 0.15)
+
+    def test_open(self):
+        """Calls start at the rate without waiting for the others"""
+        results = load.LoadEngine(
+            lambda worker, iteration: time.sleep(0.1),
+        ).run_open(100, requests=10)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(sorted(results.iterations), list(range(10)))
+        self.assertEqual(results.workers, [None] * 10)
+        # A closed loop of one worker would take a second
+        self.assertLess(results.summary()['elapsed'], 0.5)
+
+    def test_process(self):
+        """Calls run on processes"""
+        results = load.LoadEngine(square, executor='process').run_closed(2, 3)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(len(results.failures()), 2)
+        self.assertEqual(
+            results.by_worker(value=lambda value: value),
+            {'thread-0': [0, 2], 'thread-1': [10, 12]},
+        )
+        results = load.LoadEngine(
+            square, executor='process', max_workers=2).run_open(50, 3)
+        self.assertEqual(
+            sorted(value for value in results.values if value is not None),
+            [0, 2],
+        )
+
+    @unittest2.skipIf(load.asyncio is None, 'asyncio is not available')
+    def test_asyncio(self):
+        """Coroutines run concurrently on the event loop"""
+        def scenario(worker, iteration):
+            if iteration == 1:
+                raise ValueError('failed')
+            return load.asyncio.sleep(0.1, result=iteration)
+
+        engine = load.LoadEngine(scenario, executor='asyncio')
+        started = time.time()
+        results = engine.run_closed(5, 3)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(len(results), 15)
+        self.assertEqual(len(results.failures()), 5)
+        results = engine.run_open(100, requests=10)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(results.failures()), 1)
+
+    def test_executor_errors(self):
+        """Errors recording the calls are not dropped"""
+        executor = load.ThreadExecutor()
+        with self.assertRaises(IndexError):
+            executor.run_closed(
+                lambda worker, iteration: None, [0, 0], 2, load.LoadResults(3))
+        with self.assertRaises(IndexError):
+            executor.run_open(
+                lambda worker, iteration: None, [0, 0, 0],
+                load.LoadResults(2), 3)
+
+    def test_unknown_executor(self):
+        """Only the known executors can be used"""
+        with self.assertRaises(ValueError):
+            load.LoadEngine(lambda worker, iteration: None, executor='fiber')
@@ -0,0 +1,114 @@
+"""Tests for module ``robottelo.pipeline``."""
+import threading
+import time
+import unittest2
+
+from robottelo.cli.task import get_task_ids
+from robottelo.pipeline import Pipeline
+
+
+class PipelineTestCase(unittest2.TestCase):
+    """Tests for running the steps of a pipeline"""
+
+    def test_dependencies(self):
+        """Steps get the results of the steps they require"""
+        pipeline = Pipeline()
+        pipeline.add('org', lambda results: 1)
+        pipeline.add(
+            'product', lambda results: results['org'] + 1, requires=('org',))
+        pipeline.add(
+            'env', lambda results: results['org'] + 2, requires=('org',))
+        pipeline.add(
+            'sum',
+            lambda results: sorted(results.items()),
+            requires=('product', 'env'),
+        )
+        self.assertEqual(pipeline.run(), {
+            'org': 1,
+            'product': 2,
+            'env': 3,
+            'sum': [('env', 3), ('product', 2)],
+        })
+
+    def test_concurrent(self):
+        """Independent steps run at the same time"""
+        barrier = threading.Event()
+        pipeline = Pipeline()
+        pipeline.add('first', lambda results: barrier.wait(5))
+        pipeline.add('second', lambda results: barrier.set())
+        self.assertEqual(pipeline.run()['first'], True)
+
+    def test_failure(self):
+        """The first error is raised and no other step starts"""
+        started = []
+
+        def fail(results):
+            started.append('fail')
+            raise ValueError('failed')
+
+        def slow(results):
+            started.append('slow')
+            time.sleep(0.05)
+
+        pipeline = Pipeline()
+        pipeline.add('fail', fail)
+        pipeline.add('slow', slow)
+        pipeline.add(
+            'next', lambda results: started.append('next'), requires=('slow',))
+        with self.assertRaises(ValueError):
+            pipeline.run()
+        self.assertEqual(sorted(started), ['fail', 'slow'])
+        self.assertIsNotNone(pipeline.steps['slow'].duration)
+        self.assertIsNone(pipeline.steps['fail'].duration)
+        report = pipeline.report()
+        self.assertIn(u'failed', report)
+        self.assertIn(u'not run', report)
+
+    def test_add_validation(self):
+        """Steps require steps added before and have unique names"""
+        pipeline = Pipeline()
+        with self.assertRaises(ValueError):
+            pipeline.add('product', lambda results: None, requires=('org',))
+        pipeline.add('org', lambda results: None)
+        with self.assertRaises(ValueError):
+            pipeline.add('org', lambda results: None)
+
+    def test_report(self):
+        """The report has the duration of each step"""
+        pipeline = Pipeline(u'setup')
+        pipeline.add('org', lambda results: time.sleep(0.01))
+        pipeline.run()
+        lines = pipeline.report().splitlines()
+        self.assertEqual(lines[0], u'setup timings:')
+        self.assertTrue(lines[1].strip().startswith(u'org'))
+        self.assertTrue(lines[2].strip().startswith(u'total'))
+        self.assertGreaterEqual(pipeline.steps['org'].duration, 0.01)
+
+    def test_empty(self):
+        """Empty pipelines have no results"""
+        self.assertEqual(Pipeline().run(), {})
+
+
+class GetTaskIdsTestCase(unittest2.TestCase):
+    """Tests for finding the tasks started by the asynchronous commands"""
+
+    def test_get_task_ids(self):
+        """Task UUIDs are found on the text and parsed output"""
+        task_id = u'0a1b2c3d-4e5f-6789-abcd-ef0123456789'
+        self.assertEqual(
+            get_task_ids([
+                u'Repository is being synchronized in task {0}'
+                .format(task_id),
+                u'',
+            ]),
+            [task_id]
+        )
+        self.assertEqual(
+            get_task_ids([{u'message': u'task {0}'.format(task_id)}] * 2),
+            [task_id]
+        )
+        self.assertEqual(
+            get_task_ids({u'task': {u'id': task_id}, u'count': 1}),
+            [task_id]
+        )
+        self.assertEqual(get_task_ids([]), [])
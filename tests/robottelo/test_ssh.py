@@ -3,9 +3,10 @@
 import os
 import paramiko
 import six
+import subprocess
 
 from robottelo import ssh
-from unittest2 import TestCase
+from unittest2 import TestCase, skipIf
 
 if six.PY2:
     import mock
@@ -17,17 +18,120 @@ class MockChannel(object):
     def __init__(self, ret):
         self.ret = ret
 
+    def recv_ready(self):
+        return False
+
+    def recv_stderr_ready(self):
+        return False
+
+    def exit_status_ready(self):
+        return True
+
     def recv_exit_status(self):
         return self.ret
 
 
+class MockSessionChannel(object):
+    """A mock ``paramiko.Channel`` which command finishes after being polled
+    a few times.
+    """
+    def __init__(self, transport):
+        self.transport = transport
+        self.cmd = None
+        self.polls = 0
+        self.stdout = b''
+
+    def exec_command(self, cmd):
+        self.cmd = cmd
+        self.stdout = cmd.encode('utf-8')
+
+    def recv_ready(self):
+        return self.polls > 2 and len(self.stdout) > 0
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return False
+
+    def exit_status_ready(self):
+        self.polls += 1
+        return self.polls > 3
+
+    def recv_exit_status(self):
+        return 0 if self.cmd != 'false' else 1
+
+    def close(self):
+        self.transport.open_channels -= 1
+
+
+class MockTransport(object):
+    def __init__(self):
+        self.active = True
+        self.max_sessions = None
+        self.open_channels = 0
+        self.peak_channels = 0
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        pass
+
+    def open_session(self):
+        if self.open_channels == self.max_sessions:
+            raise paramiko.ChannelException(1, 'Administratively prohibited')
+        self.open_channels += 1
+        self.peak_channels = max(self.peak_channels, self.open_channels)
+        return MockSessionChannel(self)
+
+
 class MockStdout(object):
     def __init__(self, cmd, ret):
         self.cmd = cmd
         self.channel = MockChannel(ret=ret)
 
     def read(self):
-        return self.cmd
+        return self.cmd.encode('utf-8')
+
+
+class MockStreamChannel(object):
+    """A mock ``paramiko.Channel`` which outputs one chunk each time it is
+    polled and exits only once all its output was read, like a command
+    blocked on a full channel window.
+    """
+    def __init__(self, stdout, stderr=(), ret=0):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.ret = ret
+        self.sent = 0
+        self.closed = False
+
+    def recv_ready(self):
+        return self.sent > 0 and len(self.stdout) > 0
+
+    def recv(self, size):
+        self.sent -= 1
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return len(self.stderr) > 0
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        self.sent += 1
+        return len(self.stdout) == 0 and len(self.stderr) == 0
+
+    def recv_exit_status(self):
+        if not self.exit_status_ready():
+            raise AssertionError('Blocked waiting for the exit status')
+        return self.ret
+
+    def close(self):
+        self.closed = True
 
 
 class MockSSHClient(object):
@@ -43,6 +147,7 @@ class MockSSHClient(object):
         self.set_missing_host_key_policy_ = 0
         self.connect_ = 0
         self.close_ = 0
+        self.transport = MockTransport()
         # The tests look for these vars
         self.hostname = None
         self.username = None
@@ -77,6 +182,11 @@ class MockSSHClient(object):
     def close(self):
         """A no-op stub method."""
         self.close_ += 1
+        self.transport.active = False
+
+    def get_transport(self):
+        """Return the mock transport of this client."""
+        return self.transport
 
     def exec_command(self, cmd, *args, **kwargs):
         return (
@@ -86,8 +196,36 @@ class MockSSHClient(object):
         )
 
 
+class MockLocalSSHClient(object):
+    """A mock ``paramiko.SSHClient`` which runs the commands locally."""
+    def exec_command(self, cmd, *args, **kwargs):
+        process = subprocess.Popen(
+            cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        return (
+            None,
+            MockLocalOutput(stdout, process.returncode),
+            MockLocalOutput(stderr, process.returncode),
+        )
+
+
+class MockLocalOutput(MockChannel):
+    """A mock ``paramiko.ChannelFile`` of a finished command."""
+    def __init__(self, data, ret):
+        super(MockLocalOutput, self).__init__(ret)
+        self.data = data
+        self.channel = self
+
+    def read(self):
+        return self.data
+
+
 class SSHTestCase(TestCase):
     """Tests for module ``robottelo.ssh``."""
+    def tearDown(self):
+        """Do not share pooled connections between tests."""
+        ssh.close_pooled_connections()
+
     @mock.patch('robottelo.ssh.settings')
     def test_get_connection_key(self, settings):
         """Test method ``get_connection`` using key file to connect to the
@@ -181,6 +319,13 @@ class SSHTestCase(TestCase):
         for key in invalid_keys:
             self.assertFalse(ssh.is_ssh_pub_key(key))
 
+    def test_decode_to_utf8(self):
+        """Bytes are decoded and unicode strings returned unchanged"""
+        self.assertEqual(
+            ssh.decode_to_utf8(u'caf\xe9'.encode('utf-8')), u'caf\xe9')
+        self.assertEqual(ssh.decode_to_utf8(u'caf\xe9'), u'caf\xe9')
+        self.assertIsNone(ssh.decode_to_utf8(None))
+
     def test_add_authorized_key_raises_invalid_key(self):
         with self.assertRaises(AttributeError):
             ssh.add_authorized_key('sfsdfsdfsdf')
@@ -244,6 +389,9 @@ class SSHTestCase(TestCase):
         ret = ssh.command('ls -la')
         self.assertEquals(ret.stdout, [u'ls -la'])
         self.assertIsInstance(ret, ssh.SSHCommandResult)
+        self.assertEqual(ret.bytes_received, len(b'ls -la'))
+        for timing in (ret.connect_time, ret.execute_time, ret.parse_time):
+            self.assertGreaterEqual(timing, 0)
 
     @mock.patch('robottelo.ssh.settings')
     def test_command_plain_output(self, settings):
@@ -286,3 +434,383 @@ class SSHTestCase(TestCase):
             ssh._call_paramiko_sshclient(),
             (paramiko.SSHClient, MockSSHClient)
         )
+
+
+class BatchTestCase(TestCase):
+    """Tests for running several commands in one round trip."""
+    def test_execute_batch(self):
+        """Each command gets its own output and return code"""
+        results = ssh.execute_batch(
+            [
+                'echo out; echo err >&2',
+                'printf "no line break"',
+                'exit 3',
+                'echo "quoted \'value\'" # comment',
+            ],
+            MockLocalSSHClient(),
+            output_format='plain',
+        )
+        self.assertEqual(
+            [(result.stdout, result.stderr, result.return_code)
+             for result in results],
+            [
+                (u'out\n', u'err\n', 0),
+                (u'no line break', u'', 0),
+                (u'', u'', 3),
+                (u'quoted \'value\'\n', u'', 0),
+            ]
+        )
+
+    def test_execute_batch_csv(self):
+        """Outputs are parsed according to output_format"""
+        results = ssh.execute_batch(
+            ['printf "A,B\\n1,2\\n"', 'printf "C\\n3\\n"'],
+            MockLocalSSHClient(),
+            output_format='csv',
+        )
+        self.assertEqual(
+            [result.stdout for result in results],
+            [[{u'a': u'1', u'b': u'2'}], [{u'c': u'3'}]]
+        )
+
+    def test_execute_batch_interrupted(self):
+        """Commands not run get the return code of the batch"""
+        results = ssh.execute_batch(
+            ['echo 1', 'echo 2; kill -9 $$', 'echo 3'],
+            MockLocalSSHClient(),
+            output_format='plain',
+        )
+        self.assertEqual(
+            [result.stdout for result in results], [u'1\n', u'2\n', u''])
+        self.assertEqual(results[0].return_code, 0)
+        self.assertNotEqual(results[1].return_code, 0)
+        self.assertEqual(results[1].return_code, results[2].return_code)
+
+
+class StreamTestCase(TestCase):
+    """Tests for draining and streaming the output of commands."""
+    def setUp(self):
+        self.channel = MockStreamChannel(
+            [
+                b'ID,Name\n1,fir',
+                b'st\n[Rails log]\n2,\xc3',
+                b'\xa9\x1b[32m\n3,""\n',
+            ],
+            stderr=[b'\x1b[31mwarning'],
+        )
+
+    def test_execute_command_drains_output(self):
+        """The output is read while waiting for the exit status"""
+        client = mock.Mock()
+        stdout = mock.Mock(channel=self.channel)
+        stdout.read.return_value = b''
+        stderr = mock.Mock()
+        stderr.read.return_value = b''
+        client.exec_command.return_value = (None, stdout, stderr)
+        result = ssh.execute_command('hammer host list', client)
+        self.assertEqual(
+            result.stdout, [u'ID,Name', u'1,first', u'2,\xe9', u'3,', u''])
+        self.assertEqual(result.stderr, u'warning')
+
+    def test_stream_lines(self):
+        """Lines are cleaned up and yielded as they are received"""
+        stream = ssh.SSHCommandStream(self.channel)
+        lines = iter(stream)
+        self.assertEqual(next(lines), u'ID,Name')
+        self.assertEqual(len(self.channel.stdout), 2)
+        self.assertIsNone(stream.return_code)
+        self.assertEqual(list(lines), [u'1,first', u'2,\xe9', u'3,'])
+        self.assertEqual(stream.return_code, 0)
+        self.assertEqual(stream.stderr, u'warning')
+
+    def test_stream_csv(self):
+        """A stream can be parsed by hammer.iter_csv"""
+        from robottelo.cli import hammer
+        self.assertEqual(
+            [host[u'name'] for host in hammer.iter_csv(
+                ssh.SSHCommandStream(self.channel))],
+            [u'first', u'\xe9', u''],
+        )
+
+    def test_stream_plain(self):
+        """Plain output lines are not cleaned up"""
+        self.assertEqual(
+            list(ssh.SSHCommandStream(self.channel, output_format='plain')),
+            [u'ID,Name', u'1,first', u'[Rails log]', u'2,\xe9\x1b[32m',
+             u'3,""'],
+        )
+
+    @mock.patch('robottelo.ssh.settings')
+    def test_stream_command(self, settings):
+        """stream_command closes the channel when the block ends"""
+        settings.server.hostname = 'example.com'
+        ssh._call_paramiko_sshclient = MockSSHClient  # pylint:disable=W0212
+        try:
+            with ssh.stream_command('echo 1', output_format='plain') as lines:
+                self.assertEqual(list(lines), [u'echo 1'])
+                channel = lines.channel
+                self.assertEqual(channel.transport.open_channels, 1)
+            self.assertEqual(channel.transport.open_channels, 0)
+        finally:
+            ssh.close_pooled_connections()
+
+
+class SSHConnectionPoolTestCase(TestCase):
+    """Tests for class ``robottelo.ssh.SSHConnectionPool``."""
+    def setUp(self):
+        ssh._call_paramiko_sshclient = MockSSHClient  # pylint:disable=W0212
+        self.pool = ssh.SSHConnectionPool()
+        self.params = {
+            'hostname': 'example.com',
+            'username': 'nobody',
+            'password': 'test_password',
+            'key_filename': None,
+        }
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def test_connection_is_reused(self):
+        """The same connection is yielded for the same parameters and it is
+        not closed when the caller is done with it.
+        """
+        with self.pool.connection(**self.params) as first:
+            pass
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(first.connect_, 1)
+        self.assertEqual(first.close_, 0)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_connection_keyed_by_parameters(self):
+        """Different hosts or users get different connections"""
+        with self.pool.connection(**self.params) as first:
+            pass
+        self.params['hostname'] = 'other.example.com'
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.params['username'] = 'somebody'
+        with self.pool.connection(**self.params) as third:
+            pass
+        self.assertEqual(len(set([id(first), id(second), id(third)])), 3)
+        self.assertEqual(second.hostname, 'other.example.com')
+        self.assertEqual(third.username, 'somebody')
+
+    def test_stale_connection_is_replaced(self):
+        """A connection with an inactive transport is closed and replaced"""
+        with self.pool.connection(**self.params) as first:
+            first.transport.active = False
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertEqual(first.close_, 1)
+        self.assertEqual(second.connect_, 1)
+
+    def test_connection_discarded_on_ssh_error(self):
+        """A connection broken by an ssh error is not handed out again"""
+        with self.assertRaises(paramiko.SSHException):
+            with self.pool.connection(**self.params) as first:
+                first.transport.active = False
+                raise paramiko.SSHException('boom')
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertEqual(first.close_, 1)
+
+    def test_connection_kept_on_channel_error(self):
+        """A connection which transport is still active is kept when an ssh
+        error is raised, as other threads may be using it.
+        """
+        with self.assertRaises(paramiko.SSHException):
+            with self.pool.connection(**self.params) as first:
+                raise paramiko.SSHException('boom')
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(first.close_, 0)
+
+    def test_idle_connection_is_evicted(self):
+        """Connections idle for too long are closed"""
+        self.pool.max_idle_time = -1
+        with self.pool.connection(**self.params) as first:
+            pass
+        self.params['hostname'] = 'other.example.com'
+        with self.pool.connection(**self.params):
+            # connection to example.com is not used anymore
+            self.assertEqual(first.close_, 1)
+            self.assertEqual(len(self.pool), 1)
+
+    def test_connection_in_use_is_not_evicted(self):
+        """Connections being used are not closed even if idle for too long"""
+        self.pool.max_idle_time = -1
+        with self.pool.connection(**self.params) as first:
+            self.params['hostname'] = 'other.example.com'
+            with self.pool.connection(**self.params):
+                self.assertEqual(first.close_, 0)
+                self.assertEqual(len(self.pool), 2)
+
+    def test_connections_dropped_after_fork(self):
+        """Connections inherited from a parent process are not reused nor
+        closed.
+        """
+        with self.pool.connection(**self.params) as first:
+            pass
+        self.pool._pid = -1  # pylint:disable=W0212
+        with self.pool.connection(**self.params) as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertEqual(first.close_, 0)
+
+    def test_close_all(self):
+        """close_all closes every pooled connection"""
+        with self.pool.connection(**self.params) as first:
+            pass
+        self.pool.close_all()
+        self.assertEqual(first.close_, 1)
+        self.assertEqual(len(self.pool), 0)
+
+
+class MultiplexTestCase(TestCase):
+    """Tests for running several commands on a single connection."""
+    def setUp(self):
+        ssh._call_paramiko_sshclient = MockSSHClient  # pylint:disable=W0212
+        self.client = MockSSHClient()
+        self.cmds = ['echo {0}'.format(i) for i in range(7)]
+
+    def test_execute_multiplexed(self):
+        """Results are returned in the commands order"""
+        results = ssh.execute_multiplexed(
+            self.cmds + ['false'], self.client, output_format='plain')
+        self.assertEqual(
+            [result.stdout for result in results[:-1]], self.cmds)
+        self.assertEqual(
+            [result.return_code for result in results], [0] * 7 + [1])
+        self.assertEqual(self.client.transport.open_channels, 0)
+
+    def test_execute_multiplexed_max_channels(self):
+        """No more than max_channels channels are open at the same time"""
+        results = ssh.execute_multiplexed(
+            self.cmds, self.client, max_channels=3)
+        self.assertEqual(self.client.transport.peak_channels, 3)
+        self.assertEqual(len(results), len(self.cmds))
+
+    def test_execute_multiplexed_server_refuses_channel(self):
+        """Commands wait for a free channel when the server refuses to open
+        more channels.
+        """
+        self.client.transport.max_sessions = 2
+        sessions = ssh._SessionLimiter(10)  # pylint:disable=W0212
+        results = ssh.execute_multiplexed(
+            self.cmds, self.client, sessions=sessions, output_format='plain')
+        self.assertEqual([result.stdout for result in results], self.cmds)
+        self.assertEqual(self.client.transport.peak_channels, 2)
+        self.assertEqual(sessions.limit, 2)
+        self.assertEqual(sessions.in_use, 0)
+
+    def test_session_limiter(self):
+        """Sessions can't be taken over the limit without blocking"""
+        sessions = ssh._SessionLimiter(2)  # pylint:disable=W0212
+        self.assertTrue(sessions.acquire())
+        self.assertTrue(sessions.acquire(blocking=False))
+        self.assertFalse(sessions.acquire(blocking=False))
+        sessions.shrink()
+        self.assertEqual(sessions.limit, 1)
+        sessions.release()
+        self.assertFalse(sessions.acquire(blocking=False))
+        sessions.release()
+        self.assertTrue(sessions.acquire(blocking=False))
+
+    @mock.patch('robottelo.ssh.settings')
+    def test_multiplex_commands(self, settings):
+        """multiplex_commands runs all commands on a pooled connection"""
+        settings.server.hostname = 'example.com'
+        settings.server.ssh_username = 'nobody'
+        settings.server.ssh_key = None
+        settings.server.ssh_password = 'test_password'
+        try:
+            results = ssh.multiplex_commands(self.cmds, output_format='plain')
+            with ssh.get_pooled_connection() as connection:
+                self.assertEqual(connection.connect_, 1)
+        finally:
+            ssh.close_pooled_connections()
+        self.assertEqual([result.stdout for result in results], self.cmds)
+
+
+@skipIf(ssh.asyncio is None, 'asyncio is not available')
+class AsyncTestCase(TestCase):
+    """Tests for the asynchronous ssh helpers."""
+    def setUp(self):
+        ssh._call_paramiko_sshclient = MockSSHClient  # pylint:disable=W0212
+        self.client = MockSSHClient()
+        self.cmds = ['echo {0}'.format(i) for i in range(7)]
+        self.loop = ssh.asyncio.new_event_loop()
+        self.settings_patcher = mock.patch('robottelo.ssh.settings')
+        settings = self.settings_patcher.start()
+        settings.server.hostname = 'example.com'
+        settings.server.ssh_username = 'nobody'
+        settings.server.ssh_key = None
+        settings.server.ssh_password = 'test_password'
+
+    def tearDown(self):
+        ssh.close_pooled_connections()
+        self.settings_patcher.stop()
+        self.loop.close()
+
+    def gather(self, futures):
+        """Run the loop until all ``futures`` are done."""
+        return self.loop.run_until_complete(ssh.asyncio.gather(*futures))
+
+    def test_async_execute_command(self):
+        """Commands run concurrently on the given connection"""
+        results = self.gather([
+            ssh.async_execute_command(
+                cmd, self.client, output_format='plain', loop=self.loop)
+            for cmd in self.cmds + ['false']
+        ])
+        self.assertEqual(
+            [result.stdout for result in results[:-1]], self.cmds)
+        self.assertEqual(
+            [result.return_code for result in results], [0] * 7 + [1])
+        self.assertEqual(self.client.transport.open_channels, 0)
+
+    def test_async_command(self):
+        """async_command runs the commands on a pooled connection and gives
+        back its sessions.
+        """
+        results = self.gather([
+            ssh.async_command(cmd, output_format='plain', loop=self.loop)
+            for cmd in self.cmds
+        ])
+        self.assertEqual([result.stdout for result in results], self.cmds)
+        # pylint:disable=W0212
+        entry = list(ssh._connection_pool._connections.values())[0]
+        self.assertEqual(entry.client.connect_, 1)
+        self.assertEqual(entry.users, 0)
+        self.assertEqual(entry.sessions.in_use, 0)
+
+    def test_async_command_error(self):
+        """Errors opening the channel are set on the future and the pooled
+        connection is given back.
+        """
+        with ssh.get_pooled_connection() as connection:
+            connection.transport.max_sessions = 0
+        with self.assertRaises(paramiko.ChannelException):
+            self.gather([ssh.async_command('hostname', loop=self.loop)])
+        # pylint:disable=W0212
+        entry = list(ssh._connection_pool._connections.values())[0]
+        self.assertEqual(entry.users, 0)
+        self.assertEqual(entry.sessions.in_use, 0)
+
+    @mock.patch('robottelo.ssh.upload_file')
+    def test_async_upload_file(self, upload_file):
+        """async_upload_file runs upload_file on the loop executor"""
+        self.gather([ssh.async_upload_file(
+            '/local', '/remote', hostname='example.org', loop=self.loop)])
+        upload_file.assert_called_once_with('/local', '/remote', 'example.org')
+
+    @mock.patch('robottelo.ssh.download_file')
+    def test_async_download_file(self, download_file):
+        """async_download_file runs download_file on the loop executor"""
+        self.gather([ssh.async_download_file('/remote', loop=self.loop)])
+        download_file.assert_called_once_with('/remote', None, None)
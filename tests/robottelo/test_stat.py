@@ -0,0 +1,215 @@
+"""Tests for module ``robottelo.performance.stat``."""
+import csv
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest2
+
+from robottelo.performance.stat import (
+    HdrHistogram,
+    Histogram,
+    bucket_names,
+    bucket_statistics,
+    generate_stat_for_concurrent_thread,
+    generate_stat_for_histograms,
+    timing_matrix,
+    write_bucket_statistics,
+)
+
+
+class BucketStatisticsTestCase(unittest2.TestCase):
+    """Tests for computing the statistics of every bucket at once"""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.tmpdir = tmpdir
+        generator = random.Random(1)
+        self.time_result_dict = dict(
+            ('thread-{0}'.format(i),
+             [generator.uniform(0, 10) for _ in range(40)])
+            for i in range(3)
+        )
+
+    def read_csv(self, name):
+        """Return the rows of the csv file ``name``."""
+        with open(os.path.join(self.tmpdir, name)) as handler:
+            return list(csv.reader(handler))
+
+    def test_timing_matrix(self):
+        """Shorter clients are padded with NaN"""
+        matrix = timing_matrix({'thread-0': [1, 2], 'thread-1': [3]}, 3)
+        self.assertEqual(matrix.shape, (3, 2))
+        self.assertEqual(matrix[0].tolist(), [1, 2])
+        self.assertEqual(matrix[1, 0], 3)
+        self.assertTrue(all(value != value for value in matrix[2]))
+
+    def test_same_as_per_bucket(self):
+        """The statistics match the ones computed bucket by bucket"""
+        expected_path = os.path.join(self.tmpdir, 'expected.csv')
+        expected = []
+        for i in range(3):
+            expected.append(generate_stat_for_concurrent_thread(
+                'client-{0}'.format(i),
+                self.time_result_dict['thread-{0}'.format(i)],
+                expected_path,
+                10,
+                4
+            ))
+        buckets = timing_matrix(self.time_result_dict).reshape(3, 4, 10)
+        stats = write_bucket_statistics(
+            os.path.join(self.tmpdir, 'stat.csv'),
+            [('client-{0}'.format(i), bucket_names(10, 4))
+             for i in range(3)],
+            bucket_statistics(buckets),
+        )
+        for client, client_stats in enumerate(stats):
+            for bucket, bucket_stats in client_stats.items():
+                for value, expected_value in zip(
+                        bucket_stats, expected[client][bucket]):
+                    self.assertAlmostEqual(value, expected_value)
+        rows = self.read_csv('stat.csv')
+        expected_rows = self.read_csv('expected.csv')
+        self.assertEqual(len(rows), len(expected_rows))
+        for row, expected_row in zip(rows, expected_rows):
+            self.assertEqual(len(row), len(expected_row))
+            self.assertEqual(row[:1], expected_row[:1])
+            if row and row[0][0].isdigit():
+                for value, expected_value in zip(row[1:], expected_row[1:]):
+                    self.assertAlmostEqual(
+                        float(value), float(expected_value))
+
+    def test_missing_timings(self):
+        """Buckets missing timings are ignored"""
+        stats = bucket_statistics([[1, 3, float('nan')], [float('nan')] * 3])
+        self.assertEqual(stats['mean'][0], 2)
+        self.assertAlmostEqual(stats['99%'][0], 2.98)
+        self.assertNotEqual(stats['max'][1], stats['max'][1])
+
+
+class HistogramTestCase(unittest2.TestCase):
+    """Tests for the bucketed histogram"""
+
+    def test_summary(self):
+        """The percentiles are estimated by the bucket upper bounds"""
+        histogram = Histogram()
+        self.assertEqual(histogram.summary()['p50'], None)
+        for value in [0.003] * 50 + [0.2] * 40 + [7] * 10:
+            histogram.add(value)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['min'], 0.003)
+        self.assertEqual(summary['max'], 7)
+        self.assertAlmostEqual(summary['mean'], 0.7815)
+        self.assertEqual(summary['p50'], 0.005)
+        self.assertEqual(summary['p90'], 0.25)
+        self.assertEqual(summary['p99'], 7)
+
+    def test_above_last_bucket(self):
+        """Values above the last bucket are counted"""
+        histogram = Histogram()
+        histogram.add(1000)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(50), 1000)
+
+
+class HdrHistogramTestCase(unittest2.TestCase):
+    """Tests for recording timings on log-bucketed ranges"""
+
+    def setUp(self):
+        generator = random.Random(1)
+        self.timings = [
+            generator.lognormvariate(-1, 1) for _ in range(20000)]
+        self.histogram = HdrHistogram()
+        for timing in self.timings:
+            self.histogram.record(timing)
+
+    def assertAccurate(self, value, expected, digits=3):
+        """Check ``value`` keeps the significant ``digits`` of
+        ``expected``.
+
+        """
+        self.assertLessEqual(
+            abs(value - expected), expected / 10 ** digits + 1e-6)
+
+    def test_percentiles(self):
+        """Percentiles are accurate to the significant digits"""
+        timings = sorted(self.timings)
+        for percent in (50, 90, 99, 99.9):
+            rank = int(percent / 100.0 * len(timings) + 0.5) - 1
+            self.assertAccurate(
+                self.histogram.percentile(percent), timings[rank])
+        summary = self.histogram.summary()
+        self.assertEqual(summary['count'], 20000)
+        self.assertEqual(summary['max'], timings[-1])
+        self.assertEqual(summary['min'], timings[0])
+        self.assertAlmostEqual(
+            summary['mean'], sum(timings) / len(timings))
+        self.assertEqual(self.histogram.percentile(100), timings[-1])
+
+    def test_constant_memory(self):
+        """The counters don't grow with the number of timings"""
+        size = len(self.histogram.counts)
+        self.assertEqual(size, len(HdrHistogram().counts))
+        self.histogram.record(7200)
+        self.assertEqual(len(self.histogram.counts), size)
+        self.assertEqual(self.histogram.max, 7200)
+        with self.assertRaises(ValueError):
+            self.histogram.record(-1)
+
+    def test_empty(self):
+        """Empty histograms have no statistics"""
+        summary = HdrHistogram().summary()
+        self.assertEqual(summary['count'], 0)
+        self.assertIsNone(summary['p99'])
+        self.assertIsNone(summary['mean'])
+
+    def test_merge(self):
+        """Merged histograms count the timings of both"""
+        first, second = HdrHistogram(), HdrHistogram()
+        for number, timing in enumerate(self.timings):
+            (first if number % 2 else second).record(timing)
+        first.merge(second)
+        self.assertEqual(list(first.counts), list(self.histogram.counts))
+        merged, expected = first.summary(), self.histogram.summary()
+        for key in ('mean', 'std'):
+            self.assertAlmostEqual(merged.pop(key), expected.pop(key))
+        self.assertEqual(merged, expected)
+        with self.assertRaises(ValueError):
+            first.merge(HdrHistogram(significant_digits=2))
+
+    def test_serialize(self):
+        """Histograms round trip through JSON, the encoding and pickle"""
+        summary = self.histogram.summary()
+        for histogram in (
+                HdrHistogram.from_json(self.histogram.to_json()),
+                HdrHistogram.decode(self.histogram.encode()),
+                pickle.loads(pickle.dumps(self.histogram))):
+            self.assertEqual(histogram.summary(), summary)
+            self.assertEqual(
+                list(histogram.counts), list(self.histogram.counts))
+            histogram.record(1)
+        # The encoding is far smaller than the timings
+        self.assertLess(len(self.histogram.encode()), 20000)
+        empty = HdrHistogram.decode(HdrHistogram().encode())
+        self.assertIsNone(empty.max)
+        with self.assertRaises(ValueError):
+            HdrHistogram.decode(
+                HdrHistogram().encode().replace('eJ', 'eA', 1))
+
+    def test_generate_stat(self):
+        """Each histogram is a row of the csv file"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        stat_file_name = os.path.join(tmpdir, 'stat.csv')
+        stat = generate_stat_for_histograms(
+            {'client-0': self.histogram}, stat_file_name)
+        self.assertEqual(stat['client-0'][2], self.histogram.max)
+        with open(stat_file_name) as handler:
+            rows = list(csv.reader(handler))
+        self.assertEqual(
+            rows[1][2:], ['min', 'median', 'mean', 'max', 'std', '90%', '95%',
+                          '99%', '99.9%'])
+        self.assertEqual(rows[2][:2], ['client-0', '20000'])
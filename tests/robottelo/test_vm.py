@@ -1,13 +1,23 @@
 """Tests for :mod:`robottelo.vm`."""
 import six
+import time
 import unittest2
 from robottelo import ssh
-from robottelo.vm import VirtualMachine, VirtualMachineError
+from robottelo.vm import (
+    VirtualMachine,
+    VirtualMachineError,
+    VirtualMachineGroup,
+    VirtualMachinePool,
+    get_boot_times,
+    get_bootstrap_times,
+    record_boot_time,
+    spread_over_servers,
+)
 
 if six.PY2:
-    from mock import call, patch
+    from mock import patch
 else:
-    from unittest.mock import call, patch
+    from unittest.mock import patch
 
 
 class VirtualMachineTestCase(unittest2.TestCase):
@@ -31,13 +41,14 @@ class VirtualMachineTestCase(unittest2.TestCase):
         """
         self.settings.clients.provisioning_server = self.provisioning_server
 
+    @patch('robottelo.vm._sshd_available', return_value=True)
     @patch('time.sleep')
     @patch('robottelo.ssh.command', side_effect=[
         ssh.SSHCommandResult(),
         ssh.SSHCommandResult(stdout=['(192.168.0.1)']),
     ])
     def test_dont_create_if_already_created(
-            self, ssh_command, sleep):
+            self, ssh_command, sleep, sshd_available):
         """Check if the creation steps does run more than one"""
         self.configure_provisoning_server()
         vm = VirtualMachine()
@@ -51,7 +62,72 @@ class VirtualMachineTestCase(unittest2.TestCase):
             vm.create()
         self.assertEqual(vm.ip_addr, '192.168.0.1')
         self.assertEqual(ssh_command.call_count, 2)
-        self.assertEqual(sleep.call_count, 1)
+        # The machine was ready at the first poll
+        self.assertEqual(sleep.call_count, 0)
+        sshd_available.assert_called_once_with('192.168.0.1')
+
+    @patch('robottelo.vm.record_boot_time')
+    @patch('robottelo.vm._sshd_available', side_effect=[False, False, True])
+    @patch('time.sleep')
+    @patch('robottelo.ssh.command', side_effect=[
+        ssh.SSHCommandResult(),
+        ssh.SSHCommandResult(return_code=2),
+        ssh.SSHCommandResult(return_code=2),
+        ssh.SSHCommandResult(stdout=['(192.168.0.1)']),
+    ])
+    def test_create_polls_readiness(
+            self, ssh_command, sleep, sshd_available, record_boot_time):
+        """The IP address and sshd are polled with growing waits"""
+        self.configure_provisoning_server()
+        vm = VirtualMachine(distro='rhel71', image_dir='/opt/robottelo/images')
+        vm.create()
+        self.assertEqual(vm.ip_addr, '192.168.0.1')
+        waits = [call[0][0] for call in sleep.call_args_list]
+        self.assertEqual(len(waits), 4)
+        # The IP address polls start at 5 seconds and sshd ones at 1 second
+        self.assertTrue(3.75 <= waits[0] <= 6.25)
+        self.assertTrue(7.5 <= waits[1] <= 12.5)
+        self.assertTrue(0.75 <= waits[2] <= 1.25)
+        self.assertTrue(1.5 <= waits[3] <= 2.5)
+        self.assertEqual(record_boot_time.call_args[0][0], 'rhel71')
+
+    @patch('robottelo.ssh.command_batch')
+    @patch('robottelo.vm._sshd_available', return_value=False)
+    @patch('time.sleep')
+    @patch('robottelo.ssh.command', side_effect=[
+        ssh.SSHCommandResult(),
+        ssh.SSHCommandResult(stdout=['(192.168.0.1)']),
+    ])
+    def test_create_timeout(
+            self, ssh_command, sleep, sshd_available, command_batch):
+        """create fails when the machine is not ready before the deadline,
+        destroying the booting machine
+
+        """
+        self.configure_provisoning_server()
+        vm = VirtualMachine(image_dir='/opt/robottelo/images')
+        vm.boot_timeout = 0
+        with self.assertRaises(VirtualMachineError):
+            vm.create()
+        self.assertFalse(vm._created)
+        commands = command_batch.call_args[0][0]
+        self.assertEqual(
+            commands[0], u'virsh destroy {0}'.format(vm.hostname))
+        # Nothing is left to destroy
+        vm.destroy()
+        self.assertEqual(command_batch.call_count, 1)
+
+    def test_boot_times(self):
+        """Boot times are counted for each distro"""
+        with patch.dict('robottelo.vm._boot_times', clear=True):
+            record_boot_time('rhel71', 40)
+            record_boot_time('rhel71', 80)
+            record_boot_time('rhel67', 200)
+            boot_times = get_boot_times()
+        self.assertEqual(boot_times['rhel71']['count'], 2)
+        self.assertEqual(boot_times['rhel71']['p50'], 45)
+        self.assertEqual(boot_times['rhel71']['max'], 80)
+        self.assertEqual(boot_times['rhel67']['mean'], 200)
 
     def test_invalid_distro(self):
         """Check if an exception is raised if an invalid distro is passed"""
@@ -87,8 +163,8 @@ class VirtualMachineTestCase(unittest2.TestCase):
         with self.assertRaises(VirtualMachineError):
             vm.run('ls')
 
-    @patch('robottelo.ssh.command')
-    def test_destroy(self, ssh_command):
+    @patch('robottelo.ssh.command_batch')
+    def test_destroy(self, ssh_command_batch):
         """Check if destroy runs the required ssh commands"""
         self.configure_provisoning_server()
         image_dir = '/opt/robottelo/images'
@@ -101,15 +177,337 @@ class VirtualMachineTestCase(unittest2.TestCase):
         ):
             vm.destroy()
 
-        self.assertEqual(ssh_command.call_count, 3)
+        ssh_command_batch.assert_called_once_with(
+            [
+                'virsh destroy {0}'.format(vm.hostname),
+                'virsh undefine {0}'.format(vm.hostname),
+                'rm {0}/{1}.img'.format(image_dir, vm.hostname),
+            ],
+            hostname=self.provisioning_server
+        )
+
+
+class CreateManyTestCase(unittest2.TestCase):
+    """Tests for :meth:`robottelo.vm.VirtualMachine.create_many`."""
+
+    def setUp(self):
+        super(CreateManyTestCase, self).setUp()
+        patcher = patch('robottelo.vm.get_vm_pool', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.destroyed = []
+
+    def create(self, vm):
+        """Pretend to create ``vm``, failing on the failing server."""
+        time.sleep(0.1)
+        if vm.provisioning_server == 'failing.example.com':
+            raise VirtualMachineError('snap-guest failed')
+        vm._created = True
+
+    def destroy(self, vm):
+        """Pretend to destroy ``vm``."""
+        if vm._created:
+            self.destroyed.append(vm)
+
+    @patch('robottelo.vm.get_free_memory')
+    def test_spread_over_servers(self, get_free_memory):
+        """Virtual machines go to the servers with the most free memory"""
+        free_memory = {'a': 2048, 'b': 1024, 'c': None}
+        get_free_memory.side_effect = free_memory.get
+        self.assertEqual(
+            spread_over_servers(6, ['a', 'b', 'c'], 512),
+            ['a', 'a', 'b', 'a', 'b', 'a']
+        )
+        self.assertEqual(
+            spread_over_servers(2, ['a', 'b', 'c'], 4096), ['a', 'b'])
+        get_free_memory.reset_mock()
+        self.assertEqual(spread_over_servers(2, ['a'], 512), ['a', 'a'])
+        self.assertFalse(get_free_memory.called)
+
+    def test_create_many(self):
+        """Virtual machines are created and destroyed concurrently"""
+        with patch.object(VirtualMachine, 'create', autospec=True,
+                          side_effect=self.create), \
+                patch.object(VirtualMachine, 'destroy', autospec=True,
+                             side_effect=self.destroy):
+            started = time.time()
+            with VirtualMachine.create_many(
+                    5,
+                    provisioning_servers=['provisioning.example.com'],
+                    distro='rhel67',
+                    image_dir='/opt/robottelo/images') as vms:
+                # Creating them one after the other would take 0.5s
+                self.assertLess(time.time() - started, 0.35)
+                self.assertEqual(len(vms), 5)
+                self.assertTrue(all(vm.distro == 'rhel67' for vm in vms))
+                self.assertEqual(self.destroyed, [])
+            self.assertEqual(len(self.destroyed), 5)
 
-        ssh_command_args_list = [
-            call('virsh destroy {0}'.format(vm.hostname),
-                 hostname=self.provisioning_server),
-            call('virsh undefine {0}'.format(vm.hostname),
-                 hostname=self.provisioning_server),
-            call('rm {0}/{1}.img'.format(image_dir, vm.hostname),
-                 hostname=self.provisioning_server),
+    @patch('robottelo.vm.get_free_memory', return_value=None)
+    def test_create_many_failure(self, get_free_memory):
+        """The created virtual machines are destroyed when any fails"""
+        with patch.object(VirtualMachine, 'create', autospec=True,
+                          side_effect=self.create), \
+                patch.object(VirtualMachine, 'destroy', autospec=True,
+                             side_effect=self.destroy):
+            with self.assertRaises(VirtualMachineError) as context:
+                VirtualMachine.create_many(
+                    4,
+                    provisioning_servers=[
+                        'provisioning.example.com', 'failing.example.com'],
+                    image_dir='/opt/robottelo/images',
+                )
+        self.assertIn(u'2 of 4', u'{0}'.format(context.exception))
+        self.assertEqual(len(self.destroyed), 2)
+
+    @patch('robottelo.ssh.command_batch')
+    @patch('robottelo.ssh.command', return_value=ssh.SSHCommandResult())
+    @patch('robottelo.vm.get_free_memory', return_value=None)
+    def test_create_many_boot_timeout(
+            self, get_free_memory, ssh_command, command_batch):
+        """Virtual machines not booting in time are destroyed"""
+        with patch.object(VirtualMachine, '_get_ip_addr', return_value=None), \
+                patch.object(VirtualMachine, 'boot_timeout', 0):
+            with self.assertRaises(VirtualMachineError) as context:
+                VirtualMachine.create_many(
+                    2,
+                    provisioning_servers=['provisioning.example.com'],
+                    image_dir='/opt/robottelo/images',
+                )
+        self.assertIn(u'2 of 2', u'{0}'.format(context.exception))
+        destroyed = sorted(
+            call[0][0][0] for call in command_batch.call_args_list)
+        self.assertEqual(len(destroyed), 2)
+        self.assertTrue(all(
+            command.startswith(u'virsh destroy ') for command in destroyed))
+        self.assertEqual(len(set(destroyed)), 2)
+
+
+class VirtualMachinePoolTestCase(unittest2.TestCase):
+    """Tests for :class:`robottelo.vm.VirtualMachinePool`."""
+
+    provisioning_server = 'provisioning.example.com'
+
+    def setUp(self):
+        super(VirtualMachinePoolTestCase, self).setUp()
+        self.created = []
+        self.destroyed = []
+        # Only the virtual machines of the pool are faked
+        self.real_create = VirtualMachine.create
+        self.real_destroy = VirtualMachine.destroy
+        self.mocks = {}
+        for name, side_effect in (
+                ('create', self.create),
+                ('destroy', self.destroy),
+                ('install_katello_ca', None)):
+            patcher = patch.object(
+                VirtualMachine, name, autospec=True, side_effect=side_effect)
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pool = VirtualMachinePool(
+            size=2,
+            distros=('rhel67', 'rhel71'),
+            provisioning_server=self.provisioning_server,
+            image_dir='/opt/robottelo/images',
+        )
+        self.addCleanup(self.pool.close)
+
+    def create(self, vm):
+        """Pretend to boot ``vm``."""
+        if vm._use_pool:
+            return self.real_create(vm)
+        vm._created = True
+        vm._domain = 'example.com'
+        vm.hostname = u'{0}.example.com'.format(vm._target_image)
+        vm.ip_addr = u'192.168.0.{0}'.format(len(self.created))
+        self.created.append(vm.hostname)
+
+    def destroy(self, vm):
+        """Pretend to destroy ``vm``."""
+        if vm._use_pool:
+            return self.real_destroy(vm)
+        self.destroyed.append(vm.hostname)
+
+    def wait_ready(self, count):
+        """Wait for ``count`` virtual machines to be ready."""
+        for _ in range(100):
+            if sum(self.pool.stats()['ready'].values()) == count:
+                return
+            time.sleep(0.01)
+        self.fail(u'The pool did not get ready: {0}'.format(self.pool.stats()))
+
+    def test_lease_release(self):
+        """Leased virtual machines are replaced and destroyed"""
+        self.pool.start()
+        self.wait_ready(4)
+        vm = self.pool.lease('rhel71')
+        self.assertEqual(vm.distro, 'rhel71')
+        self.assertTrue(vm.hostname.startswith('pool'))
+        self.wait_ready(4)
+        stats = self.pool.stats()
+        self.assertEqual(stats['leased'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['created'], 5)
+        self.pool.release(vm)
+        self.pool.close()
+        self.assertIn(vm.hostname, self.destroyed)
+        self.assertEqual(len(self.destroyed), 5)
+        self.assertEqual(self.pool.stats()['destroyed'], 5)
+
+    def test_lease_miss(self):
+        """Nothing is leased when no virtual machine could be provisioned"""
+        self.mocks['install_katello_ca'].side_effect = VirtualMachineError
+        self.pool.start()
+        self.assertIsNone(self.pool.lease('rhel67'))
+        stats = self.pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertGreaterEqual(stats['failed'], 2)
+
+    @patch('robottelo.ssh.command_batch')
+    @patch('robottelo.vm.get_vm_pool')
+    def test_virtual_machine(self, get_vm_pool, command_batch):
+        """VirtualMachine leases from the matching pool"""
+        get_vm_pool.return_value = self.pool
+        self.pool.start()
+        vm = VirtualMachine(
+            distro='rhel67',
+            provisioning_server=self.provisioning_server,
+            image_dir='/opt/robottelo/images',
+        )
+        vm.create()
+        self.assertTrue(vm.hostname.startswith('pool'))
+        self.assertIsNotNone(vm.ip_addr)
+        self.assertEqual(self.pool.stats()['leased'], 1)
+        vm.destroy()
+        self.pool.close()
+        self.assertEqual(self.pool.stats()['leased'], 0)
+        command_batch.assert_called_once_with(
+            [
+                'virsh destroy {0}'.format(vm.hostname),
+                'virsh undefine {0}'.format(vm.hostname),
+                'rm /opt/robottelo/images/{0}.img'.format(vm.hostname),
+            ],
+            hostname=self.provisioning_server
+        )
+        other = VirtualMachine(
+            distro='rhel67',
+            ram=1024,
+            provisioning_server=self.provisioning_server,
+            image_dir='/opt/robottelo/images',
+        )
+        self.assertFalse(self.pool.matches(other))
+
+
+class BootstrapTestCase(unittest2.TestCase):
+    """Tests for :meth:`robottelo.vm.VirtualMachine.bootstrap`."""
+
+    def setUp(self):
+        super(BootstrapTestCase, self).setUp()
+        for module in ('robottelo.vm', 'robottelo.helpers'):
+            patcher = patch('{0}.settings'.format(module), spec=True)
+            settings = patcher.start()
+            self.addCleanup(patcher.stop)
+            settings.server.hostname = 'satellite.example.com'
+            settings.server.get_cert_rpm_url.return_value = (
+                'http://satellite.example.com/pub/katello-ca.rpm')
+        patcher = patch.dict('robottelo.vm._bootstrap_times', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_vm(self, number=1):
+        """Return a created virtual machine."""
+        vm = VirtualMachine(
+            provisioning_server='provisioning.example.com',
+            image_dir='/opt/robottelo/images',
+        )
+        vm._created = True
+        vm.ip_addr = u'192.168.0.{0}'.format(number)
+        return vm
+
+    @staticmethod
+    def command_batch(cmds, hostname=None, **kwargs):
+        """Pretend to run ``cmds``, failing on the failing host."""
+        return_code = 1 if hostname == '192.168.0.2' else 0
+        return [ssh.SSHCommandResult(return_code=return_code) for _ in cmds]
+
+    @patch('robottelo.ssh.command_batch')
+    def test_bootstrap(self, command_batch):
+        """Each stage runs its commands at once"""
+        command_batch.side_effect = self.command_batch
+        vm = self.make_vm()
+        timings = vm.bootstrap(
+            'org', activation_key='ak', puppet_rhel_repo='http://repo')
+        self.assertEqual(
+            sorted(timings), ['katello-agent', 'katello-ca', 'puppet',
+                              'register'])
+        self.assertTrue(vm._subscribed)
+        calls = command_batch.call_args_list
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(calls[0][0][0], [
+            u'rpm -Uvh http://satellite.example.com/pub/katello-ca.rpm',
+            u'rpm -q katello-ca-consumer-satellite.example.com',
+        ])
+        self.assertEqual(calls[1][0][0], [
+            u'subscription-manager register --org org --activationkey ak '
+            u'--force'
+        ])
+        self.assertEqual(calls[2][0][0], [
+            'yum install -y katello-agent',
+            'rpm -q katello-agent',
+        ])
+        self.assertEqual(calls[3][0][0][:2], [
+            u'wget -O /etc/yum.repos.d/rhel.repo http://repo',
+            u'yum install puppet -y',
+        ])
+        self.assertIn(u'server          = satellite.example.com',
+                      calls[3][0][0][2])
+        self.assertEqual(
+            [call[1]['hostname'] for call in calls],
+            ['192.168.0.1'] * 4 + ['satellite.example.com', '192.168.0.1'],
+        )
+        self.assertEqual(
+            get_bootstrap_times()['puppet']['count'], 3)
+
+    @patch('robottelo.ssh.command_batch')
+    def test_bootstrap_failure(self, command_batch):
+        """No stage runs after a failed one"""
+        command_batch.side_effect = self.command_batch
+        vm = self.make_vm(2)
+        with self.assertRaises(VirtualMachineError):
+            vm.bootstrap('org', activation_key='ak')
+        self.assertEqual(command_batch.call_count, 1)
+        self.assertFalse(vm._subscribed)
+        with self.assertRaises(VirtualMachineError):
+            VirtualMachine(
+                provisioning_server='provisioning.example.com',
+            ).bootstrap('org', activation_key='ak')
+
+    @patch('robottelo.ssh.command_batch')
+    def test_bootstrap_puppet_failure(self, command_batch):
+        """The puppet stage fails when puppet could not be installed"""
+        command_batch.side_effect = lambda cmds, **kwargs: [
+            ssh.SSHCommandResult(
+                return_code=1 if cmd == u'yum install puppet -y' else 0)
+            for cmd in cmds
         ]
+        with self.assertRaises(VirtualMachineError):
+            self.make_vm().bootstrap(
+                'org', activation_key='ak', puppet_rhel_repo='http://repo')
+        self.assertEqual(command_batch.call_count, 4)
 
-        self.assertListEqual(ssh_command.call_args_list, ssh_command_args_list)
+    @patch('robottelo.ssh.command_batch')
+    def test_group_bootstrap(self, command_batch):
+        """Every virtual machine is bootstrapped before reporting failures"""
+        command_batch.side_effect = self.command_batch
+        vms = VirtualMachineGroup(self.make_vm(number) for number in (1, 2, 3))
+        with self.assertRaises(VirtualMachineError) as context:
+            vms.bootstrap('org', activation_key='ak', katello_agent=False)
+        self.assertIn(u'1 of 3', u'{0}'.format(context.exception))
+        self.assertEqual(
+            sorted(vm.ip_addr for vm in vms if vm._subscribed),
+            ['192.168.0.1', '192.168.0.3'],
+        )
+        del vms[1]
+        timings = vms.bootstrap('org', activation_key='ak')
+        self.assertEqual(len(timings), 2)
+        self.assertIn('katello-agent', timings[0])